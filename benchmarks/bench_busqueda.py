@@ -0,0 +1,77 @@
+'''
+Benchmark de la búsqueda por nombre: LIKE '%texto%' (recorre toda la tabla)
+contra la búsqueda de la ventana con el índice de texto completo FTS5 (filtros.name_filter), y tiempo de la
+búsqueda aproximada con el índice de trigramas (fuzzy_search_clients).
+
+Uso: python benchmarks/bench_busqueda.py [filas ...]   (por defecto 100000 y 1000000)
+'''
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import (TABLA_CLIENTES, connection_manager, create_db_connection,
+                    import_clients_connection, select_clients_connection, fuzzy_search_clients)
+from filtros import name_filter
+
+NOMBRES = ("María", "José", "Juan", "Ana", "Luis", "Carmen", "Pedro", "Lucía", "Jorge", "Elena")
+APELLIDOS = ("López", "García", "Martínez", "Hernández", "González", "Pérez", "Sánchez",
+            "Ramírez", "Torres", "Flores", "Rivera", "Gómez", "Díaz", "Cruz", "Morales")
+SILABAS = ("ba", "ca", "da", "fe", "go", "la", "me", "no", "pa", "ri", "sa", "to", "ve", "zu", "mon", "tar")
+BUSQUEDAS = ("Torres", "Ana Cruz", "Pérez Gómez", "Zamudio")
+BUSQUEDAS_CON_ERRORES = ("Hernadez", "Ana Gomes Cruz", "Zamudo", "Jorje Sanches")
+REPETICIONES = 5
+
+
+def clientes(filas):
+    '''Genera clientes con nombres aleatorios (semilla fija): la mitad con apellidos comunes,
+    la otra mitad con apellidos inventados de tres sílabas, y un apellido único cada 1000'''
+    generador = random.Random(0)
+    for i in range(filas):
+        if i % 2:
+            apellido = "".join(generador.choice(SILABAS) for _ in range(3)).capitalize()
+        else:
+            apellido = generador.choice(APELLIDOS)
+        nombre = f"{generador.choice(NOMBRES)} {apellido} {generador.choice(APELLIDOS)}"
+        if i % 1000 == 0:
+            nombre += f" Zamudio{i}"
+        yield (nombre, 20 + i % 70, "", "", "", "Sin observaciones", "2024-01-01")
+
+
+def medir(funcion):
+    '''Devuelve el tiempo medio en milisegundos y el número de resultados'''
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        resultados = funcion()
+    return (time.perf_counter() - inicio) / REPETICIONES * 1000, len(resultados)
+
+
+def benchmark(filas):
+    '''Crea una base de datos de prueba y compara ambas búsquedas'''
+    with tempfile.TemporaryDirectory() as carpeta:
+        db_path = os.path.join(carpeta, "clientes.db")
+        create_db_connection(db_path)
+        import_clients_connection(clientes(filas), db_path)
+        conn = connection_manager.get(db_path)
+        print(f"--- {filas} clientes ---")
+        for texto in BUSQUEDAS:
+            like = " AND ".join("nombre LIKE ?" for _ in texto.split())
+            parametros = [f"%{palabra}%" for palabra in texto.split()]
+            ms_like, n_like = medir(lambda: conn.execute(
+                f"SELECT id FROM {TABLA_CLIENTES} WHERE {like}", parametros).fetchall())
+            filtro = name_filter(texto)
+            ms_fts, n_fts = medir(lambda: select_clients_connection(db_path, filtro.where, filtro.parameters,
+                                                                    filtro.order_by, order_parametros=filtro.order_parameters))
+            print(f"{texto:<14} LIKE {ms_like:>8.1f} ms ({n_like:>6})   FTS5 {ms_fts:>8.1f} ms ({n_fts:>6})")
+        for texto in BUSQUEDAS_CON_ERRORES:
+            ms_fuzzy, n_fuzzy = medir(lambda: fuzzy_search_clients(texto, db_path))
+            print(f"{texto:<14} aproximada {ms_fuzzy:>8.1f} ms ({n_fuzzy} resultados)")
+        connection_manager.close_all()
+
+
+if __name__ == "__main__":
+    for cantidad in [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]:
+        benchmark(cantidad)
@@ -0,0 +1,77 @@
+'''
+Benchmark de escrituras: conexión por consulta (comportamiento anterior de
+conexion.py) contra las funciones de conexion.py con la conexión persistente de ConnectionManager.
+
+Uso: python benchmarks/bench_conexion.py [numero_de_operaciones]
+'''
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import (TABLA_CLIENTES, connection_manager, create_db_connection,
+                    add_client_connection, edit_client_connection, delete_client_connection)
+
+INSERT = f'''INSERT INTO {TABLA_CLIENTES} (
+                nombre, edad, oi, od, adede, observaciones, fecha
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)'''
+UPDATE = f'''UPDATE {TABLA_CLIENTES} SET
+                nombre=?, edad=?, oi=?, od=?, adede=?, observaciones=?, fecha=?
+            WHERE id=?'''
+DELETE = f"DELETE FROM {TABLA_CLIENTES} WHERE id=?"
+
+
+def consulta_por_llamada(consulta, parametros, database_path):
+    '''Réplica del comportamiento anterior de conexion.py: abre, ejecuta, confirma y cierra'''
+    conn = sqlite3.connect(database_path)
+    try:
+        conn.execute(consulta, parametros)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def cliente(i):
+    '''Datos de prueba de un cliente'''
+    return (f"Cliente {i}", 30 + i % 50, "-1.25", "-1.00", "+2.00", "Sin observaciones", "2024-01-01")
+
+
+def medir(nombre, operaciones, funcion):
+    '''Ejecuta la función y muestra las operaciones por segundo'''
+    inicio = time.perf_counter()
+    funcion()
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<38} {operaciones / segundos:>10.0f} ops/s ({segundos:.2f} s)")
+
+
+def benchmark(operaciones):
+    '''Compara añadir, editar y eliminar clientes con ambos métodos'''
+    with tempfile.TemporaryDirectory() as carpeta:
+        antes = os.path.join(carpeta, "antes.db")
+        despues = os.path.join(carpeta, "despues.db")
+        create_db_connection(antes)
+        connection_manager.close(antes)
+        create_db_connection(despues)
+        ids = range(1, operaciones + 1)
+
+        print(f"--- {operaciones} operaciones de cada tipo ---")
+        medir("Añadir (conexión por llamada)", operaciones,
+            lambda: [consulta_por_llamada(INSERT, cliente(i), antes) for i in ids])
+        medir("Añadir (conexión persistente)", operaciones,
+            lambda: [add_client_connection(cliente(i), despues) for i in ids])
+        medir("Editar (conexión por llamada)", operaciones,
+            lambda: [consulta_por_llamada(UPDATE, cliente(i) + (i,), antes) for i in ids])
+        medir("Editar (conexión persistente)", operaciones,
+            lambda: [edit_client_connection(cliente(i) + (i,), despues) for i in ids])
+        medir("Eliminar (conexión por llamada)", operaciones,
+            lambda: [consulta_por_llamada(DELETE, (i,), antes) for i in ids])
+        medir("Eliminar (conexión persistente)", operaciones,
+            lambda: [delete_client_connection([i], despues) for i in ids])
+        connection_manager.close_all()
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
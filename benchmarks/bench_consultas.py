@@ -0,0 +1,125 @@
+'''
+Benchmark del caché de sentencias de sqlite3: búsquedas con el texto escrito dentro del SQL
+(cada búsqueda es una sentencia nueva que se compila) contra las condiciones con parámetros
+de filtros.py (la sentencia se compila una vez y las siguientes búsquedas la toman del caché).
+Las compilaciones se cuentan con el autorizador de SQLite, que solo se llama al preparar una sentencia.
+
+Uso: python benchmarks/bench_consultas.py [clientes] [búsquedas]
+'''
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import (TABLA_CLIENTES, TABLA_BUSQUEDA, connection_manager, create_db_connection,
+                    import_clients_connection, select_clients_connection, count_clients_connection,
+                    fts_match_query, search_key_range)
+from filtros import name_filter, date_filter
+from modelo_clientes import PAGE_SIZE
+
+NOMBRES = ("Ana", "José", "María", "Luis", "Carmen", "Jorge", "Lucía", "Pedro", "Brien")
+APELLIDOS = ("López", "García", "Hernández", "Martínez", "Pérez", "Sánchez", "Ramírez", "O'Brien")
+
+
+def cliente(i):
+    '''Datos de prueba de un cliente'''
+    return (f"{NOMBRES[i % 9]} {APELLIDOS[i * 7 % 8]} {i}", 20 + i % 60, "", "", "", "",
+            f"20{10 + i % 14}-{1 + i % 12:02d}-{1 + i % 28:02d}")
+
+
+def literal_name_filter(text):
+    '''Condición como la armaba antes la ventana: el texto va dentro del SQL'''
+    low, high = (key.replace("'", "''") for key in search_key_range(text))
+    match = fts_match_query(text).replace("'", "''")
+    name_prefix = f"(nombre_busqueda >= '{low}' AND nombre_busqueda < '{high}')"
+    return (f"{name_prefix} OR id IN (SELECT rowid FROM {TABLA_BUSQUEDA} WHERE {TABLA_BUSQUEDA} MATCH '{match}')",
+            f"ORDER BY {name_prefix} DESC, (SELECT rank FROM {TABLA_BUSQUEDA} "
+            f"WHERE {TABLA_BUSQUEDA} MATCH '{match}' AND rowid = {TABLA_CLIENTES}.id)")
+
+
+class PrepareCounter:
+    '''Cuenta las ejecuciones que tuvieron que compilar su sentencia (sin caché)'''
+    def __init__(self, conn):
+        self.prepared = False
+        self.misses = 0
+        self.executions = 0
+        conn.set_authorizer(self._authorize)
+
+    def _authorize(self, *args): # pylint: disable=unused-argument
+        self.prepared = True
+        return sqlite3.SQLITE_OK
+
+    def run(self, function):
+        '''Ejecuta una consulta y anota si se compiló'''
+        self.prepared = False
+        function()
+        self.executions += 1
+        self.misses += self.prepared
+
+
+def medir(db_path, conn, busquedas, consulta):
+    '''Ejecuta consulta(texto) por cada búsqueda y devuelve (ms por búsqueda, ejecuciones, compilaciones)'''
+    counter = PrepareCounter(conn)
+    inicio = time.perf_counter()
+    for texto in busquedas:
+        for function in consulta(db_path, texto):
+            counter.run(function)
+    tiempo = (time.perf_counter() - inicio) / len(busquedas) * 1000
+    conn.set_authorizer(None)
+    return tiempo, counter.executions, counter.misses
+
+
+def literal(db_path, texto):
+    '''Cuenta y primera página con el texto dentro del SQL'''
+    where, order_by = literal_name_filter(texto)
+    return (lambda: count_clients_connection(db_path, where),
+            lambda: select_clients_connection(db_path, where, (), order_by, PAGE_SIZE, 0))
+
+
+def parametrizada(db_path, texto):
+    '''Cuenta y primera página con la condición de filtros.py'''
+    client_filter = name_filter(texto)
+    return (lambda: count_clients_connection(db_path, client_filter.where, client_filter.parameters),
+            lambda: select_clients_connection(db_path, client_filter.where, client_filter.parameters,
+                                            client_filter.order_by, PAGE_SIZE, 0, client_filter.order_parameters))
+
+
+def literal_fecha(db_path, fecha):
+    '''Búsqueda por fecha con la fecha dentro del SQL'''
+    return (lambda: select_clients_connection(db_path, f"fecha = '{fecha}'", (), None, PAGE_SIZE, 0),)
+
+
+def parametrizada_fecha(db_path, fecha):
+    '''Búsqueda por fecha con date_filter'''
+    client_filter = date_filter(fecha)
+    return (lambda: select_clients_connection(db_path, client_filter.where, client_filter.parameters,
+                                            None, PAGE_SIZE, 0),)
+
+
+def benchmark(total, cantidad):
+    '''Repite búsquedas distintas por nombre y por fecha con ambas formas de armar la consulta'''
+    with tempfile.TemporaryDirectory() as carpeta:
+        db_path = os.path.join(carpeta, "consultas.db")
+        create_db_connection(db_path)
+        import_clients_connection((cliente(i) for i in range(total)), db_path)
+        conn = connection_manager.get(db_path)
+        nombres = [f"{NOMBRES[i % 9]} {APELLIDOS[i % 8]} {i}" for i in range(cantidad)]
+        fechas = [f"20{10 + i % 14}-{1 + i % 12:02d}-{1 + i % 28:02d}" for i in range(cantidad)]
+        print(f"--- {total} clientes, {cantidad} búsquedas distintas ---")
+        for etiqueta, busquedas, consulta in (("nombre, texto en el SQL", nombres, literal),
+                                            ("nombre, parámetros", nombres, parametrizada),
+                                            ("fecha, texto en el SQL", fechas, literal_fecha),
+                                            ("fecha, parámetros", fechas, parametrizada_fecha)):
+            tiempo, ejecuciones, compilaciones = medir(db_path, conn, busquedas, consulta)
+            aciertos = ejecuciones - compilaciones
+            print(f"{etiqueta:<24} {tiempo:7.3f} ms/búsqueda   caché: {aciertos}/{ejecuciones} aciertos "
+                f"({compilaciones} compilaciones)")
+        connection_manager.close(db_path)
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 500)
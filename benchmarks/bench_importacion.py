@@ -0,0 +1,41 @@
+'''
+Benchmark de la importación masiva: genera un CSV de clientes y lo importa
+con import_clients_connection usando bloques de IMPORT_BATCH_SIZE.
+
+Uso: python benchmarks/bench_importacion.py [numero_de_filas]
+'''
+import os
+import sys
+import csv
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import connection_manager, create_db_connection, import_clients_connection
+from importacion import IMPORT_COLUMNS, read_clients
+
+
+def benchmark(filas):
+    '''Genera el CSV, lo importa y muestra las filas por segundo'''
+    with tempfile.TemporaryDirectory() as carpeta:
+        csv_path = os.path.join(carpeta, "clientes.csv")
+        db_path = os.path.join(carpeta, "clientes.db")
+        with open(csv_path, "w", encoding="utf-8", newline="") as archivo:
+            writer = csv.writer(archivo)
+            writer.writerow(IMPORT_COLUMNS)
+            for i in range(filas):
+                writer.writerow((f"Cliente {i}", 20 + i % 70, "-1.25", "-1.00", "+2.00",
+                                "Sin observaciones", f"2023-{1 + i % 12:02d}-{1 + i % 28:02d}"))
+        create_db_connection(db_path)
+        errors = []
+        inicio = time.perf_counter()
+        importados = import_clients_connection(read_clients(csv_path, errors), db_path)
+        segundos = time.perf_counter() - inicio
+        connection_manager.close_all()
+        print(f"{importados} clientes importados en {segundos:.2f} s "
+            f"({importados / segundos:.0f} filas/s, {len(errors)} errores)")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,60 @@
+'''
+Benchmark de la lectura por páginas de la tabla: página leída con OFFSET (cuenta todas las filas
+anteriores) contra página leída por clave (select_clients_page_connection salta con el índice
+a la fila donde empieza la página), a distintas profundidades de la tabla.
+
+Uso: python benchmarks/bench_paginacion.py [clientes]
+'''
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import (connection_manager, create_db_connection, import_clients_connection,
+                    select_clients_connection, select_clients_page_connection)
+from modelo_clientes import PAGE_SIZE
+
+NOMBRES = ("Ana", "José", "María", "Luis", "Carmen", "Jorge", "Lucía", "Pedro")
+APELLIDOS = ("López", "García", "Hernández", "Martínez", "Pérez", "Sánchez", "Ramírez", "Cruz")
+
+
+def cliente(i):
+    '''Datos de prueba de un cliente'''
+    return (f"{NOMBRES[i % 8]} {APELLIDOS[i * 7 % 8]} {i}", 20 + i % 60, "", "", "", "",
+            f"20{10 + i % 14}-{1 + i % 12:02d}-{1 + i % 28:02d}")
+
+
+def medir(funcion, repeticiones=5):
+    '''Tiempo promedio en milisegundos'''
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def benchmark(total):
+    '''Lee la página de distintas posiciones ordenando por id, nombre y fecha'''
+    with tempfile.TemporaryDirectory() as carpeta:
+        db_path = os.path.join(carpeta, "paginacion.db")
+        create_db_connection(db_path)
+        import_clients_connection((cliente(i) for i in range(total)), db_path)
+        print(f"--- {total} clientes, páginas de {PAGE_SIZE} filas ---")
+        for columna, clave in (("id", "id"), ("nombre", "nombre_busqueda"), ("fecha", "fecha")):
+            orden = f"ORDER BY {clave} ASC" if clave == "id" else f"ORDER BY {clave} ASC, id ASC"
+            for fraccion in (0.01, 0.5, 0.99):
+                offset = int(total * fraccion) // PAGE_SIZE * PAGE_SIZE
+                # La página anterior ya leída da la fila donde empieza la siguiente
+                anterior = select_clients_page_connection(db_path, None, (), columna, False, None,
+                                                        1, offset - 1)[0]
+                seek = (False, anterior[-1], anterior[0])
+                tiempo_offset = medir(lambda: select_clients_connection(db_path, None, (), orden, PAGE_SIZE, offset))
+                tiempo_clave = medir(lambda: select_clients_page_connection(db_path, None, (), columna, False,
+                                                                            seek, PAGE_SIZE, 0))
+                print(f"{columna:<8} fila {offset:>9}   OFFSET {tiempo_offset:8.2f} ms   clave {tiempo_clave:6.2f} ms")
+        connection_manager.close(db_path)
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,44 @@
+'''
+Benchmark de los perfiles de PRAGMA (PRAGMA_PROFILES): clientes añadidos uno por uno
+(una transacción por cliente) e importación por bloques con cada perfil.
+
+Uso: python benchmarks/bench_pragmas.py [clientes_uno_por_uno] [clientes_importados]
+'''
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import (PRAGMA_PROFILES, connection_manager, create_db_connection,
+                    add_client_connection, import_clients_connection)
+
+
+def cliente(i):
+    '''Datos de prueba de un cliente'''
+    return (f"Cliente {i}", 30 + i % 50, "-1.25", "-1.00", "+2.00", "Sin observaciones", "2024-01-01")
+
+
+def benchmark(individuales, importados):
+    '''Mide ambos tipos de escritura con cada perfil en una base de datos nueva'''
+    print(f"{'Perfil':<12} {'Añadir (ops/s)':>15} {'Importar (filas/s)':>20}")
+    with tempfile.TemporaryDirectory() as carpeta:
+        for perfil in PRAGMA_PROFILES:
+            connection_manager.set_profile(perfil)
+            db_path = os.path.join(carpeta, f"{perfil}.db")
+            create_db_connection(db_path)
+            inicio = time.perf_counter()
+            for i in range(individuales):
+                add_client_connection(cliente(i), db_path)
+            ops = individuales / (time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            import_clients_connection((cliente(i) for i in range(importados)), db_path)
+            filas = importados / (time.perf_counter() - inicio)
+            print(f"{perfil:<12} {ops:>15.0f} {filas:>20.0f}")
+            connection_manager.close(db_path)
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 200_000)
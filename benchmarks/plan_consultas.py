@@ -0,0 +1,53 @@
+'''
+Diagnóstico de índices: muestra el plan de ejecución (EXPLAIN QUERY PLAN) de las
+consultas que ejecuta la tabla de la ventana principal (páginas con salto por clave en cada
+orden, conteos y las búsquedas) y marca las que ordenan sin índice (USE TEMP B-TREE).
+
+Uso: python benchmarks/plan_consultas.py ruta/base_de_datos.db
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import connection_manager, create_db_connection, explain_query_plans, temp_btree_queries
+from filtros import (name_filter, live_name_filter, date_filter, ids_filter, name_prefix_filter,
+                    observaciones_filter, date_range_filter, age_range_filter, combine_filters)
+
+LIVE_SEARCH_LIMIT = 500 # Igual que en main.py
+
+# Búsquedas de la ventana principal con valores de ejemplo
+FILTERS = {
+    "Búsqueda mientras se escribe": live_name_filter("maria lo", LIVE_SEARCH_LIMIT),
+    "Búsqueda: Nombre": name_filter("maria lo"),
+    "Búsqueda: Fecha": date_filter("2024-01-01"),
+    "Búsqueda avanzada: nombre y fechas": combine_filters(name_prefix_filter("maria"),
+                                                        date_range_filter("2024-01-01", "2024-12-31")),
+    "Búsqueda avanzada: fechas y edades": combine_filters(date_range_filter("2024-01-01", "2024-12-31"),
+                                                        age_range_filter(20, 40)),
+    "Búsqueda avanzada: observaciones y edades": combine_filters(observaciones_filter("lentes"),
+                                                                age_range_filter(20, None)),
+    "Nombres parecidos": ids_filter([3, 1, 2]),
+}
+
+
+def main(database_path):
+    '''Aplica las migraciones pendientes, muestra el plan de cada consulta y al final las que
+    ordenan en una tabla temporal'''
+    create_db_connection(database_path)
+    plans = explain_query_plans(database_path, FILTERS)
+    flagged = temp_btree_queries(plans)
+    for name, plan in plans.items():
+        print(f"{name}:{'  <-- USE TEMP B-TREE' if name in flagged else ''}")
+        for step in plan:
+            print(f"    {step}")
+    print(f"\nConsultas que ordenan sin índice (USE TEMP B-TREE): {len(flagged)} de {len(plans)}")
+    for name in flagged:
+        print(f"    {name}")
+    connection_manager.close_all()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    main(sys.argv[1])
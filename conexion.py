@@ -1,63 +1,1191 @@
 '''
 Codigo creado por: Gustavo López P.
 '''
+import os
+import sys
+import time
 import sqlite3
+import datetime
+import threading
+import unicodedata
+from contextlib import contextmanager, nullcontext
+from difflib import SequenceMatcher
+from itertools import islice
 
 TABLA_CLIENTES = "clientes"
+TABLA_BUSQUEDA = f"{TABLA_CLIENTES}_fts" # Índice de texto completo (FTS5) de nombre y observaciones
+TABLA_TRIGRAMAS = f"{TABLA_CLIENTES}_trigramas" # Índice FTS5 de trigramas de nombre_busqueda
+TABLA_CAMBIOS = f"{TABLA_CLIENTES}_cambios" # Última versión en que cambió cada cliente
+TABLA_PAPELERA = f"{TABLA_CLIENTES}_papelera" # Clientes eliminados que aún se pueden restaurar
+FUZZY_LIMIT = 10 # Número de clientes devueltos por la búsqueda aproximada
+FUZZY_CANDIDATES = 200 # Candidatos leídos del índice de trigramas antes de calcular la similitud
+FUZZY_MIN_SIMILARITY = 0.7 # Similitud mínima (0 a 1) para considerar que un nombre se parece
+DELETE_CHUNK_SIZE = 500 # Número de ids por sentencia DELETE ... IN (...) o SELECT ... IN (...)
+IMPORT_BATCH_SIZE = 5000 # Número de clientes insertados por transacción al importar
+ANALYSIS_LIMIT = 1000 # Filas revisadas por índice al actualizar las estadísticas con PRAGMA optimize
+BACKUP_PAGES = 1024 # Páginas copiadas en cada paso de la copia de la base de datos
+EXPORT_PROGRESS_STEPS = 100000 # Instrucciones de SQLite entre cada aviso de progreso de la exportación
+FETCH_ROWS = 1000 # Filas leídas del cursor por vez al recorrer todo un resultado (iter_clients_connection)
+TRASH_LIST_LIMIT = 1000 # Clientes eliminados más recientes mostrados en la papelera
+TRASH_DAYS = 30 # Días que se conserva un cliente en la papelera antes de eliminarlo definitivamente
+PURGE_BATCH_SIZE = 500 # Clientes eliminados definitivamente por transacción al vaciar la papelera
+PURGE_PAUSE = 0.01 # Segundos entre transacciones al vaciar la papelera (deja escribir a los demás)
+ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]" # Fecha guardada como yyyy-MM-dd
+EXTERNAL_CHANGES_LIMIT = 1000 # Cambios externos aplicados uno por uno (con más se vuelve a leer la tabla)
+# Columnas de la tabla clientes mostradas en la ventana (nombre_busqueda es de uso interno)
+CLIENT_COLUMNS = ("id", "nombre", "edad", "oi", "od", "adede", "observaciones", "fecha")
+# Columna usada para ordenar cada columna mostrada (el nombre se ordena sin acentos ni mayúsculas)
+SORT_KEYS = {column: column for column in CLIENT_COLUMNS} | {"nombre": "nombre_busqueda"}
+# Columnas de las filas que llevan los avisos de cambio (incluye las claves de orden)
+CHANGE_COLUMNS = CLIENT_COLUMNS + ("nombre_busqueda",)
+RETURNING_COLUMNS = f"RETURNING {', '.join(CHANGE_COLUMNS)}"
+# Tipos de cambio avisados por ConnectionManager.notify
+CHANGE_INSERT = "insert"
+CHANGE_UPDATE = "update"
+CHANGE_DELETE = "delete"
+CHANGE_RESET = "reset"
 
-def create_db_connection(database_path=None):
+
+def search_key(text):
+    '''Clave de búsqueda del nombre: sin acentos, en minúsculas y con espacios simples
+    ("  María   López" -> "maria lopez")'''
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.casefold().split())
+
+
+def search_key_range(text):
+    '''Límites (inferior, superior) de las claves que empiezan por el texto indicado,
+    usados para buscar por prefijo con el índice de nombre_busqueda'''
+    key = search_key(text)
+    return key, key + "\U0010ffff"
+
+
+# Configuraciones (PRAGMA) aplicadas a cada conexión, seleccionables con la clave
+# "pragma_profile" del archivo config.json:
+#   - "seguro": diario clásico y escritura completa a disco en cada cambio. Es el único
+#     recomendado si la base de datos está en una carpeta compartida de red, donde WAL no funciona
+#     (la memoria compartida del archivo -shm no se comparte entre computadoras y la base de datos
+#     se puede corromper). En esas rutas (is_network_path) se usa siempre, aunque se elija otro.
+#   - "equilibrado" (predeterminado): WAL, las lecturas no esperan a las escrituras y solo
+#     se sincroniza el disco en los puntos de control. Un corte de luz puede perder la última
+#     transacción pero nunca corrompe la base de datos.
+#   - "rapido": WAL sin sincronizar el disco. Un corte de luz puede perder varias transacciones.
+PRAGMA_PROFILES = {
+    "seguro": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -8000, # Negativo = KiB (8 MB)
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 10000, # Milisegundos de espera si otro programa bloquea la base de datos
+    },
+    "equilibrado": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -32000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "rapido": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+DEFAULT_PRAGMA_PROFILE = "equilibrado"
+NETWORK_PRAGMA_PROFILE = "seguro" # Perfil usado en carpetas compartidas de red
+# Sistemas de archivos de red en Linux (tipo de montaje de /proc/mounts)
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smbfs", "smb3", "9p", "afs", "fuse.sshfs"}
+
+
+def pragma_statements(profile=DEFAULT_PRAGMA_PROFILE):
+    '''Devuelve las sentencias PRAGMA del perfil indicado (usadas también por la conexión de Qt)'''
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"El perfil '{profile}' no existe. Perfiles disponibles: {', '.join(PRAGMA_PROFILES)}.")
+    return [f"PRAGMA {name} = {value}" for name, value in PRAGMA_PROFILES[profile].items()]
+
+
+def is_network_path(database_path):
+    '''True si la base de datos está en una carpeta compartida de red: ruta UNC ("\\\\servidor\\carpeta"),
+    unidad de red de Windows o montaje NFS/SMB en Linux. Si no se puede saber se supone que es local.'''
+    path = os.path.abspath(database_path)
+    if path.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes # pylint: disable=import-outside-toplevel
+        drive = os.path.splitdrive(path)[0]
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4 # DRIVE_REMOTE
+    try:
+        with open("/proc/mounts", encoding="utf-8") as mounts:
+            # El punto de montaje más largo que contiene la ruta es el de su sistema de archivos
+            filesystem = max(((len(point), kind) for _, point, kind, *_ in (line.split() for line in mounts)
+                            if path == point or path.startswith(point.rstrip("/") + "/")), default=(0, ""))[1]
+    except OSError:
+        return False
+    return filesystem in NETWORK_FILESYSTEMS
+
+
+class ConnectionManager:
+    '''Mantiene abierta una única conexión sqlite3 por cada ruta de base de datos (y por hilo)
+    para no abrir, leer el esquema y cerrar el archivo en cada consulta. Todas las lecturas
+    y escrituras del programa (incluida la tabla de la ventana) usan estas conexiones, y los
+    cambios se avisan a los oyentes registrados para que no tengan que volver a consultar.
+    El hilo de la interfaz y el hilo de la base de datos (trabajador_bd.py) tienen cada uno
+    su conexión; con WAL las lecturas de uno no esperan a las escrituras del otro.'''
+    def __init__(self):
+        self._connections = {} # {(ruta absoluta, id del hilo): sqlite3.Connection}
+        self._lock = threading.Lock() # Protege el diccionario de conexiones entre hilos
+        self._listeners = [] # Funciones llamadas como listener(ruta absoluta, cambio, ids)
+        self._own_changes = {} # {ruta absoluta: [(desde, hasta)]} versiones de TABLA_CAMBIOS escritas por este programa
+        self.profile = DEFAULT_PRAGMA_PROFILE # Perfil de PRAGMA elegido (ver profile_for)
+
+    @staticmethod
+    def _key(database_path):
+        '''Normaliza la ruta para que "a.db" y "/ruta/a.db" compartan conexión'''
+        return os.path.abspath(database_path)
+
+    def get(self, database_path):
+        '''Devuelve la conexión abierta de la base de datos para el hilo actual (la abre si no existe)'''
+        if not database_path:
+            raise RuntimeError("No se especificó la ruta de la base de datos.")
+        key = (self._key(database_path), threading.get_ident())
+        with self._lock:
+            conn = self._connections.get(key)
+        if conn is None:
+            # check_same_thread=False solo para poder cerrarla o interrumpirla desde otro hilo,
+            # cada hilo ejecuta sus consultas únicamente en su propia conexión
+            conn = sqlite3.connect(key[0], check_same_thread=False)
+            self._configure(conn, key[0])
+            with self._lock:
+                self._connections[key] = conn
+        return conn
+
+    def profile_for(self, database_path):
+        '''Perfil de PRAGMA aplicado a la base de datos: el elegido, salvo que use WAL y la base
+        de datos esté en una carpeta de red (en ese caso NETWORK_PRAGMA_PROFILE)'''
+        if PRAGMA_PROFILES[self.profile]["journal_mode"] == "WAL" and is_network_path(database_path):
+            return NETWORK_PRAGMA_PROFILE
+        return self.profile
+
+    def _configure(self, conn, database_path):
+        '''Aplica a la conexión el perfil de PRAGMA de su base de datos'''
+        for statement in pragma_statements(self.profile_for(database_path)):
+            conn.execute(statement)
+
+    def set_profile(self, profile):
+        '''Cambia el perfil de PRAGMA y lo aplica también a las conexiones ya abiertas'''
+        pragma_statements(profile) # Lanza ValueError si el perfil no existe
+        self.profile = profile
+        with self._lock:
+            connections = list(self._connections.items())
+        for (path, _), conn in connections:
+            self._configure(conn, path)
+
+    def interrupt(self, thread_id):
+        '''Interrumpe la consulta que esté ejecutando el hilo indicado (la consulta lanza
+        sqlite3.OperationalError "interrupted")'''
+        with self._lock:
+            for (_, conn_thread), conn in self._connections.items():
+                if conn_thread == thread_id:
+                    conn.interrupt()
+
+    def close(self, database_path):
+        '''Cierra las conexiones de la base de datos indicada (si estaban abiertas)'''
+        if not database_path:
+            return
+        path = self._key(database_path)
+        with self._lock:
+            keys = [key for key in self._connections if key[0] == path]
+            connections = [self._connections.pop(key) for key in keys]
+        for conn in connections:
+            self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        '''Actualiza las estadísticas que usa SQLite para elegir índices (si hace falta y
+        revisando solo una muestra de cada índice) y cierra la conexión'''
+        try:
+            conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass # Las estadísticas son solo una ayuda, no deben impedir cerrar
+        conn.close()
+
+    def add_listener(self, listener):
+        '''Registra una función que recibe los cambios hechos en las bases de datos'''
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        '''Deja de avisar los cambios a la función indicada'''
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def notify(self, database_path, change, rows=()):
+        '''Avisa a los oyentes de un cambio en la tabla clientes. "change" es uno de
+        CHANGE_INSERT, CHANGE_UPDATE, CHANGE_DELETE (con las filas afectadas, columnas de
+        CHANGE_COLUMNS, tal como quedaron o como estaban antes de eliminarse) o CHANGE_RESET
+        cuando cambiaron demasiadas filas y se debe volver a leer la tabla.'''
+        key = self._key(database_path)
+        for listener in list(self._listeners):
+            listener(key, change, list(rows))
+
+    def record_own_changes(self, database_path, first, last):
+        '''Anota que las versiones de TABLA_CAMBIOS mayores que "first" y hasta "last" las escribió
+        este programa (sus cambios ya se avisaron con notify y no se deben aplicar otra vez)'''
+        if last > first:
+            with self._lock:
+                self._own_changes.setdefault(self._key(database_path), []).append((first, last))
+
+    def own_changes(self, database_path, since):
+        '''Rangos (desde, hasta) de versiones escritas por este programa mayores que "since"
+        (los anteriores ya no se necesitan y se descartan)'''
+        key = self._key(database_path)
+        with self._lock:
+            ranges = [(first, last) for first, last in self._own_changes.get(key, []) if last > since]
+            self._own_changes[key] = ranges
+            return list(ranges)
+
+    def close_all(self):
+        '''Cierra todas las conexiones abiertas (usado al salir del programa)'''
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            self._close(conn)
+
+
+# Instancia compartida por todo el programa
+connection_manager = ConnectionManager()
+
+
+def _create_clients_table(conn):
+    '''Crea la tabla clientes'''
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {TABLA_CLIENTES} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT,
+                    edad INTEGER,
+                    oi TEXT,
+                    od TEXT,
+                    adede TEXT,
+                    observaciones TEXT,
+                    fecha DATE
+                    )''')
+
+
+def _convert_dates(conn):
+    '''Convierte las fechas d/M/yyyy (día y mes de 1 o 2 dígitos) a ISO-8601 (yyyy-MM-dd)'''
+    digits = ("[0-9]", "[0-9][0-9]")
+    patterns = [f"{day}/{month}/[0-9][0-9][0-9][0-9]" for day in digits for month in digits]
+    # Día: hasta la primera "/"; mes: hasta la segunda "/"; año: el resto
+    day = "substr(fecha, 1, instr(fecha, '/') - 1)"
+    rest = "substr(fecha, instr(fecha, '/') + 1)"
+    month = f"substr({rest}, 1, instr({rest}, '/') - 1)"
+    year = f"substr({rest}, instr({rest}, '/') + 1)"
+    conn.execute(f'''UPDATE {TABLA_CLIENTES}
+                    SET fecha = printf('%s-%02d-%02d', {year}, {month}, {day})
+                    WHERE {" OR ".join("fecha GLOB ?" for _ in patterns)}
+                    ''', patterns)
+
+
+def _iso_dates(conn):
+    '''Las bases de datos anteriores guardaban la fecha como dd/MM/yyyy, que no se ordena
+    correctamente como texto. Se convierte a ISO-8601 (yyyy-MM-dd) y se indexa.'''
+    _convert_dates(conn)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLA_CLIENTES}_fecha ON {TABLA_CLIENTES} (fecha)")
+
+
+def _name_index(conn):
+    '''Índice para ordenar y buscar por nombre. El orden por defecto (id descendente)
+    no necesita índice porque id es el rowid de la tabla.'''
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLA_CLIENTES}_nombre ON {TABLA_CLIENTES} (nombre)")
+
+
+def _full_text_search(conn):
+    '''Crea el índice de texto completo FTS5 sobre nombre y observaciones, los triggers
+    que lo mantienen sincronizado con la tabla clientes y lo llena con los datos existentes.'''
+    conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_BUSQUEDA} USING fts5(
+                    nombre, observaciones,
+                    content='{TABLA_CLIENTES}', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                    )''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CLIENTES}_fts_insert AFTER INSERT ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_BUSQUEDA} (rowid, nombre, observaciones)
+                    VALUES (new.id, new.nombre, new.observaciones);
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CLIENTES}_fts_delete AFTER DELETE ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_BUSQUEDA} ({TABLA_BUSQUEDA}, rowid, nombre, observaciones)
+                    VALUES ('delete', old.id, old.nombre, old.observaciones);
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CLIENTES}_fts_update
+                    AFTER UPDATE OF nombre, observaciones ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_BUSQUEDA} ({TABLA_BUSQUEDA}, rowid, nombre, observaciones)
+                    VALUES ('delete', old.id, old.nombre, old.observaciones);
+                    INSERT INTO {TABLA_BUSQUEDA} (rowid, nombre, observaciones)
+                    VALUES (new.id, new.nombre, new.observaciones);
+                    END''')
+    conn.execute(f"INSERT INTO {TABLA_BUSQUEDA} ({TABLA_BUSQUEDA}) VALUES ('rebuild')")
+
+
+def _name_search_key(conn):
+    '''Agrega la columna nombre_busqueda (nombre sin acentos ni mayúsculas) con su índice,
+    usada para buscar por nombre exacto o por prefijo y para ordenar alfabéticamente'''
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLA_CLIENTES})")]
+    if "nombre_busqueda" not in columns:
+        conn.execute(f"ALTER TABLE {TABLA_CLIENTES} ADD COLUMN nombre_busqueda TEXT")
+    conn.create_function("search_key", 1, search_key, deterministic=True)
+    conn.execute(f"UPDATE {TABLA_CLIENTES} SET nombre_busqueda = search_key(nombre)")
+    conn.execute(f'''CREATE INDEX IF NOT EXISTS idx_{TABLA_CLIENTES}_nombre_busqueda
+                    ON {TABLA_CLIENTES} (nombre_busqueda)''')
+    # El orden por nombre ahora usa nombre_busqueda, el índice anterior solo haría más lentas las escrituras
+    conn.execute(f"DROP INDEX IF EXISTS idx_{TABLA_CLIENTES}_nombre")
+
+
+def _trigram_index(conn):
+    '''Crea el índice de trigramas de nombre_busqueda usado por la búsqueda aproximada
+    (tolerante a errores de escritura) y los triggers que lo mantienen sincronizado'''
+    conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_TRIGRAMAS} USING fts5(
+                    nombre_busqueda,
+                    content='{TABLA_CLIENTES}', content_rowid='id',
+                    tokenize='trigram'
+                    )''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CLIENTES}_trigramas_insert
+                    AFTER INSERT ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_TRIGRAMAS} (rowid, nombre_busqueda) VALUES (new.id, new.nombre_busqueda);
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CLIENTES}_trigramas_delete
+                    AFTER DELETE ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_TRIGRAMAS} ({TABLA_TRIGRAMAS}, rowid, nombre_busqueda)
+                    VALUES ('delete', old.id, old.nombre_busqueda);
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CLIENTES}_trigramas_update
+                    AFTER UPDATE OF nombre_busqueda ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_TRIGRAMAS} ({TABLA_TRIGRAMAS}, rowid, nombre_busqueda)
+                    VALUES ('delete', old.id, old.nombre_busqueda);
+                    INSERT INTO {TABLA_TRIGRAMAS} (rowid, nombre_busqueda) VALUES (new.id, new.nombre_busqueda);
+                    END''')
+    conn.execute(f"INSERT INTO {TABLA_TRIGRAMAS} ({TABLA_TRIGRAMAS}) VALUES ('rebuild')")
+
+
+def _fts_prefix_index(conn):
+    '''Vuelve a crear el índice de texto completo con índices de prefijos de 1 a 3 letras.
+    La búsqueda mientras se escribe busca las palabras cortas como prefijo ("l*") y sin
+    estos índices FTS5 recorre todos los términos que empiezan así.
+    Los triggers de _full_text_search usan el nombre de la tabla y siguen funcionando.'''
+    conn.execute(f"DROP TABLE IF EXISTS {TABLA_BUSQUEDA}")
+    conn.execute(f'''CREATE VIRTUAL TABLE {TABLA_BUSQUEDA} USING fts5(
+                    nombre, observaciones,
+                    content='{TABLA_CLIENTES}', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='1 2 3'
+                    )''')
+    conn.execute(f"INSERT INTO {TABLA_BUSQUEDA} ({TABLA_BUSQUEDA}) VALUES ('rebuild')")
+
+
+def _composite_indexes(conn):
+    '''Índices compuestos de la búsqueda avanzada: (fecha, edad) para un rango de fechas con o sin
+    rango de edad y (edad, fecha) para un rango de edades. Cada uno contiene toda la condición, así
+    las filas se descartan en el índice sin leer la tabla. El índice de fecha se conserva: el orden
+    por fecha de la tabla (fecha, id) solo sale de un índice cuya última columna es el id.
+    ANALYZE guarda las estadísticas con las que SQLite elige el índice más selectivo.'''
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLA_CLIENTES}_fecha_edad ON {TABLA_CLIENTES} (fecha, edad)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLA_CLIENTES}_edad_fecha ON {TABLA_CLIENTES} (edad, fecha)")
+    conn.execute(f"ANALYZE {TABLA_CLIENTES}")
+
+
+def _change_log(conn):
+    '''Crea la tabla con la última versión en que cambió cada cliente (la versión aumenta con cada
+    cambio de cualquier programa) y los triggers que la mantienen. Con ella otra computadora que usa
+    la misma base de datos lee solo los clientes cambiados desde la versión que ya muestra.
+    "creado" es la versión en que se agregó (0 si ya existía) y "eliminado" indica si se eliminó.
+    Se usa una versión en lugar de la hora porque los relojes de las computadoras no coinciden y
+    SQLite escribe una transacción a la vez, así una versión nunca se confirma después de una mayor.'''
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {TABLA_CAMBIOS} (
+                    id INTEGER PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    creado INTEGER NOT NULL DEFAULT 0,
+                    eliminado INTEGER NOT NULL DEFAULT 0
+                    )''')
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLA_CAMBIOS}_version ON {TABLA_CAMBIOS} (version)")
+    next_version = f"(SELECT coalesce(max(version), 0) + 1 FROM {TABLA_CAMBIOS})"
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CAMBIOS}_insert AFTER INSERT ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_CAMBIOS} (id, version, creado) VALUES (new.id, {next_version}, {next_version})
+                    ON CONFLICT (id) DO UPDATE SET version = excluded.version, creado = excluded.creado, eliminado = 0;
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CAMBIOS}_update AFTER UPDATE ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_CAMBIOS} (id, version) VALUES (new.id, {next_version})
+                    ON CONFLICT (id) DO UPDATE SET version = excluded.version;
+                    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {TABLA_CAMBIOS}_delete AFTER DELETE ON {TABLA_CLIENTES} BEGIN
+                    INSERT INTO {TABLA_CAMBIOS} (id, version, eliminado) VALUES (old.id, {next_version}, 1)
+                    ON CONFLICT (id) DO UPDATE SET version = excluded.version, eliminado = 1;
+                    END''')
+
+
+def _trash_table(conn):
+    '''Crea la papelera: los clientes eliminados se mueven a esta tabla (con la fecha y hora en que se
+    eliminaron) en lugar de borrarse, así se pueden restaurar con el mismo id. La tabla clientes y sus
+    índices solo tienen los clientes activos y las consultas de la ventana no cambian.
+    El índice de "eliminado" se usa para mostrar la papelera y vaciarla de los más antiguos a los más recientes.'''
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {TABLA_PAPELERA} (
+                    id INTEGER PRIMARY KEY,
+                    nombre TEXT,
+                    edad INTEGER,
+                    oi TEXT,
+                    od TEXT,
+                    adede TEXT,
+                    observaciones TEXT,
+                    fecha DATE,
+                    nombre_busqueda TEXT,
+                    eliminado TEXT NOT NULL
+                    )''')
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLA_PAPELERA}_eliminado ON {TABLA_PAPELERA} (eliminado)")
+
+
+def _date_order_index(conn):
+    '''Vuelve a crear el índice de fecha en las bases de datos donde la migración de los índices de la
+    búsqueda avanzada lo eliminaba. El índice (fecha) incluye el id al final, así el orden por fecha
+    (fecha, id) y la paginación por clave (fecha, id) < (?, ?) se leen del índice sin ordenar en una
+    tabla temporal; (fecha, edad) no sirve para eso porque después de la fecha ordena por edad.'''
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLA_CLIENTES}_fecha ON {TABLA_CLIENTES} (fecha)")
+    conn.execute(f"ANALYZE {TABLA_CLIENTES}")
+
+
+def _unpadded_dates(conn):
+    '''La conversión de _iso_dates solo aceptaba dd/MM/yyyy y dejaba sin convertir las fechas sin
+    ceros (1/2/2023). Se convierten en las bases de datos que ya tenían aplicada esa migración.'''
+    _convert_dates(conn)
+
+
+# Migraciones del esquema en orden. La versión de cada base de datos se guarda en
+# PRAGMA user_version: la versión N indica que ya se aplicaron las N primeras migraciones.
+# Nunca se deben modificar ni reordenar las migraciones existentes, solo agregar nuevas al final.
+MIGRATIONS = (
+    ("Creando la tabla de clientes", _create_clients_table),
+    ("Convirtiendo las fechas a formato ISO", _iso_dates),
+    ("Creando el índice de nombres", _name_index),
+    ("Creando el índice de búsqueda de texto", _full_text_search),
+    ("Creando la clave de búsqueda de nombres", _name_search_key),
+    ("Creando el índice de búsqueda aproximada", _trigram_index),
+    ("Creando el índice de prefijos de la búsqueda de texto", _fts_prefix_index),
+    ("Creando los índices de la búsqueda avanzada", _composite_indexes),
+    ("Creando el registro de cambios", _change_log),
+    ("Creando la papelera de clientes", _trash_table),
+    ("Restaurando el índice del orden por fecha", _date_order_index),
+    ("Convirtiendo las fechas sin ceros a formato ISO", _unpadded_dates),
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+MIGRATION_PROGRESS_STEPS = 100000 # Instrucciones de SQLite entre cada aviso de progreso
+
+
+def get_schema_version(conn):
+    '''Devuelve la versión del esquema guardada en la base de datos'''
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending_migrations(database_path=None):
+    '''Devuelve el número de migraciones que faltan por aplicar a la base de datos'''
+    try:
+        return max(SCHEMA_VERSION - get_schema_version(connection_manager.get(database_path)), 0)
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+
+def migrate(conn, progress=None):
+    '''Aplica en una sola transacción las migraciones pendientes.
+    "progress(aplicadas, total, descripcion)" se llama antes de cada migración y
+    periódicamente mientras se ejecuta, para que la interfaz pueda mostrar el avance.'''
+    version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise sqlite3.DatabaseError(f"La base de datos (versión {version}) fue creada con una versión más "
+                                    f"reciente del programa (versión {SCHEMA_VERSION}).")
+    pending = MIGRATIONS[version:]
+    if not pending:
+        return
+    current = {"done": 0, "description": ""} # Migración en curso (usada por el manejador de progreso)
+
+    def progress_handler():
+        progress(current["done"], len(pending), current["description"])
+        return 0 # Cualquier otro valor interrumpe la consulta
+
+    if progress is not None:
+        conn.set_progress_handler(progress_handler, MIGRATION_PROGRESS_STEPS)
+    conn.execute("BEGIN IMMEDIATE") # Las sentencias CREATE no abren una transacción por sí solas
+    try:
+        for done, (description, migration) in enumerate(pending):
+            current.update(done=done, description=description)
+            if progress is not None:
+                progress(done, len(pending), description)
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version + done + 1}")
+        conn.commit()
+    except BaseException:
+        conn.rollback() # Ninguna migración queda aplicada a medias
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+    if progress is not None:
+        progress(len(pending), len(pending), "Base de datos actualizada")
+
+
+def invalid_dates_connection(database_path=None):
+    '''Cuenta los clientes cuya fecha no está en formato ISO-8601 (las que las migraciones no pudieron
+    convertir). Esas fechas no se ordenan ni se encuentran correctamente en las búsquedas por fecha.'''
+    try:
+        conn = connection_manager.get(database_path)
+        return conn.execute(f'''SELECT count(*) FROM {TABLA_CLIENTES}
+                            WHERE fecha != '' AND fecha NOT GLOB ?''', (ISO_DATE_GLOB,)).fetchone()[0]
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+
+def create_db_connection(database_path=None, progress=None):
     '''Conecta a la base de datos (o la crea en caso de no existir) 
-    mediante sqlite3 y crea la tabla clientes'''
-    try:
-        conn = sqlite3.connect(database_path)
-        cursor = conn.cursor()
-        cursor.execute(f'''CREATE TABLE IF NOT EXISTS {TABLA_CLIENTES} (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        nombre TEXT,
-                        edad INTEGER,
-                        oi TEXT,
-                        od TEXT,
-                        adede TEXT,
-                        observaciones TEXT,
-                        fecha DATE
-                        )''')
-        conn.commit() # Guarda los cambios
+    mediante sqlite3 y aplica las migraciones pendientes del esquema'''
+    try:
+        migrate(connection_manager.get(database_path), progress)
     except (sqlite3.OperationalError, sqlite3.IntegrityError, sqlite3.Error) as e:
         raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+
+def fts_match_query(text, column="nombre"):
+    '''Convierte el texto escrito por el usuario en una expresión MATCH de FTS5.
+    Cada palabra se busca como prefijo ("lop" encuentra "López") y deben aparecer todas.'''
+    words = [word.replace('"', "") for word in str(text).split()]
+    words = [f'"{word}"*' for word in words if word]
+    if not words:
+        return None
+    return f"{column} : ({' '.join(words)})" if column else " ".join(words)
+
+
+def _fuzzy_pieces(key):
+    '''Fragmentos de cada palabra buscados en el índice de trigramas. Con un error de
+    escritura en una palabra, al menos una de sus mitades (o uno de sus trigramas
+    si la palabra es corta) sigue intacta.'''
+    words = []
+    for word in key.split():
+        if len(word) >= 6:
+            half = len(word) // 2
+            pieces = {word[:half], word[-half:]}
+        elif len(word) >= 3:
+            pieces = {word[i:i + 3] for i in range(len(word) - 2)}
+        else: # El tokenizador trigram no puede buscar fragmentos de menos de 3 letras
+            continue
+        words.append(['"' + piece.replace('"', '""') + '"' for piece in sorted(pieces)]) # Texto literal de FTS5
+    return words
+
+
+def name_similarity(key, candidate_key):
+    '''Similitud entre 0 y 1 de dos claves de nombre: promedio, para cada palabra buscada,
+    de su mejor parecido con alguna palabra del nombre del cliente'''
+    words = key.split()
+    candidate_words = candidate_key.split()
+    if not words or not candidate_words:
+        return 0.0
+    return sum(max(SequenceMatcher(None, word, candidate).ratio() for candidate in candidate_words)
+            for word in words) / len(words)
+
+
+def fuzzy_search_clients(text, database_path=None, limit=FUZZY_LIMIT):
+    '''Búsqueda aproximada por nombre. Devuelve hasta "limit" tuplas (id, similitud) de los
+    clientes con el nombre más parecido al texto, de mayor a menor similitud.'''
+    key = search_key(text)
+    words = _fuzzy_pieces(key)
+    if not words:
+        return []
+    # De la búsqueda más estricta a la más flexible: todos los fragmentos, al menos un fragmento
+    # de cada palabra y cualquier fragmento. Sin ORDER BY rank FTS5 se detiene al llegar al LIMIT,
+    # así el tiempo no depende de cuántos clientes comparten un apellido común.
+    matches = [" AND ".join(piece for pieces in words for piece in pieces),
+            " AND ".join(f"({' OR '.join(pieces)})" for pieces in words),
+            " OR ".join(piece for pieces in words for piece in pieces)]
+    candidates = {}
+    try:
+        conn = connection_manager.get(database_path)
+        for match in dict.fromkeys(matches): # Sin repetir búsquedas iguales
+            candidates.update(conn.execute(f'''SELECT rowid, nombre_busqueda FROM {TABLA_TRIGRAMAS}
+                                            WHERE {TABLA_TRIGRAMAS} MATCH ? LIMIT ?''',
+                                            (match, FUZZY_CANDIDATES)))
+            if len(candidates) >= FUZZY_CANDIDATES:
+                break
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+    similarities = {} # Muchos clientes comparten el mismo nombre, se calcula una vez por nombre
+    for candidate_key in set(candidates.values()):
+        similarities[candidate_key] = name_similarity(key, candidate_key or "")
+    scored = sorted(((similarities[candidate_key], client_id)
+                    for client_id, candidate_key in candidates.items()), reverse=True)
+    scored = [item for item in scored if item[0] >= FUZZY_MIN_SIMILARITY]
+    return [(client_id, similarity) for similarity, client_id in scored[:limit]]
+
+
+def ui_queries(filters=None):
+    '''Consultas que ejecuta la tabla de la ventana principal, construidas igual que en
+    select_clients_page_connection, select_clients_connection y count_clients_connection:
+    {nombre: (consulta, parámetros)}. Para cada columna de orden (ascendente y descendente) la
+    primera página y el salto por clave (valor de orden, id) a una página siguiente; para cada filtro
+    de "filters" ({nombre: (where, parámetros, order_by, order_parámetros)}, como los ClientFilter
+    de filtros.py) el conteo y la primera página con su orden propio o con el de cada columna.'''
+    queries = {}
+    for column in CLIENT_COLUMNS:
+        for descending in (True, False):
+            name = f"Orden: {column} {'DESC' if descending else 'ASC'}"
+            queries[name] = _page_query(None, (), column, descending, None)
+            queries[f"{name} (salto por clave)"] = _page_query(None, (), column, descending, (False, 0, 0))
+    queries["Conteo: todos"] = _count_query(None, ())
+    for name, (where, parametros, order_by, order_parametros) in (filters or {}).items():
+        queries[f"Conteo: {name}"] = _count_query(where, parametros)
+        if order_by:
+            queries[name] = _clients_query(where, parametros, order_by, order_parametros)
+            continue
+        for column in CLIENT_COLUMNS:
+            queries[f"{name}, orden: {column} DESC"] = _page_query(where, parametros, column, True, None)
+    return queries
+
+
+def explain_query_plans(database_path=None, filters=None):
+    '''Devuelve el plan de ejecución (EXPLAIN QUERY PLAN) de cada consulta de ui_queries(filters).
+    Sirve para comprobar qué consultas usan índices y cuáles recorren u ordenan la tabla completa.'''
+    try:
+        conn = connection_manager.get(database_path)
+        # LIMIT 1 OFFSET 0 en las consultas de páginas (no cambia el plan)
+        return {name: [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}",
+                                                    (*parameters, 1, 0) if query.endswith("LIMIT ? OFFSET ?")
+                                                    else parameters)]
+                for name, (query, parameters) in ui_queries(filters).items()}
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+
+def temp_btree_queries(plans):
+    '''Nombres de las consultas de explain_query_plans que ordenan o agrupan en una tabla
+    temporal (USE TEMP B-TREE) porque ningún índice da el orden pedido'''
+    return [name for name, plan in plans.items() if any("USE TEMP B-TREE" in step for step in plan)]
+
+
+class _CopyCanceled(Exception):
+    '''Lanzada desde el progreso de la copia para detener la API de respaldo'''
+
+
+def copy_db_connection(database_path, destination_path, progress=None, pages=BACKUP_PAGES):
+    '''Copia la base de datos con la API de respaldo de SQLite por pasos de "pages" páginas.
+    A diferencia de copiar el archivo, incluye los cambios que aún están en el archivo -wal y
+    obtiene una copia consistente. En modo WAL se copia dentro de una transacción de lectura: la
+    copia es la base de datos del momento en que empezó y los demás pueden seguir escribiendo.
+    En los otros modos, si otra conexión escribe durante la copia SQLite la vuelve a empezar.
+    "progress(copiadas, total)" se llama después de cada paso y si devuelve False se cancela la
+    copia y se elimina el archivo incompleto. Devuelve True si la copia terminó.'''
+    def step(_status, remaining, total):
+        if progress is not None and progress(total - remaining, total) is False:
+            raise _CopyCanceled()
+    try:
+        source = connection_manager.get(database_path)
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        destination = sqlite3.connect(destination_path)
+        try:
+            with snapshot_connection(database_path) if wal else nullcontext():
+                if wal: # La transacción ve la base de datos desde la primera lectura
+                    source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+                source.backup(destination, pages=pages, progress=step)
+        finally:
+            destination.close()
+    except (_CopyCanceled, sqlite3.Error, RuntimeError) as e:
+        _remove_db_files(destination_path)
+        if isinstance(e, _CopyCanceled):
+            return False
+        raise RuntimeError(f"Error operativo al copiar la base de datos: {e}") from e
+    return True
+
+
+def _remove_db_files(database_path):
+    '''Elimina el archivo de la base de datos y sus archivos de diario (si existen)'''
+    for file_path in (database_path, f"{database_path}-journal", f"{database_path}-wal", f"{database_path}-shm"):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def export_db_connection(database_path, destination_path, where=None, parametros=(), progress=None):
+    '''Exporta la base de datos a un archivo nuevo sin páginas libres (desfragmentado) y devuelve
+    el número de clientes exportados, o None si se canceló (el archivo incompleto se elimina).
+    Sin condición "where" se copia completa con VACUUM INTO. Con condición se crea el archivo con
+    el esquema de create_db_connection y se copian solo los clientes que la cumplen (con sus ids),
+    todos con un solo INSERT ... SELECT: es una copia consistente aunque otros estén escribiendo.
+    "progress()" se llama periódicamente y si devuelve False se cancela la exportación.'''
+    if os.path.abspath(destination_path) == os.path.abspath(database_path):
+        raise RuntimeError("No se puede exportar la base de datos sobre sí misma.")
+    source = connection_manager.get(database_path)
+    def progress_handler():
+        return 0 if progress is None or progress() is not False else 1 # Otro valor que 0 interrumpe
+    try:
+        connection_manager.close(destination_path)
+        _remove_db_files(destination_path) # VACUUM INTO necesita que el archivo no exista
+        source.set_progress_handler(progress_handler, EXPORT_PROGRESS_STEPS)
+        try:
+            if where is None:
+                source.execute("VACUUM INTO ?", (destination_path,))
+                return source.execute(f"SELECT count(*) FROM {TABLA_CLIENTES}").fetchone()[0]
+            return _export_clients(source, destination_path, where, parametros)
+        finally:
+            source.set_progress_handler(None, 0)
+            connection_manager.close(destination_path)
+    except (sqlite3.Error, RuntimeError) as e:
+        _remove_db_files(destination_path)
+        if isinstance(e, sqlite3.OperationalError) and str(e) == "interrupted":
+            return None
+        if isinstance(e, RuntimeError):
+            raise
+        raise RuntimeError(f"Error operativo al exportar la base de datos: {e}") from e
+
+def _export_clients(source, destination_path, where, parametros):
+    '''Copia los clientes que cumplen "where" a una base de datos nueva (ver export_db_connection)'''
+    create_db_connection(destination_path)
+    destination = connection_manager.get(destination_path)
+    # Igual que al importar, los índices FTS5 se llenan una sola vez en lugar de fila por fila. La base
+    # de datos nueva no tiene cambios anteriores, su registro de cambios empieza vacío.
+    triggers = destination.execute(f'''SELECT name, sql FROM sqlite_master WHERE type = 'trigger'
+                                AND name IN ('{TABLA_CLIENTES}_fts_insert', '{TABLA_CLIENTES}_trigramas_insert',
+                                            '{TABLA_CAMBIOS}_insert')''').fetchall()
+    for name, _ in triggers:
+        destination.execute(f"DROP TRIGGER {name}")
+    columns = ", ".join(CHANGE_COLUMNS)
+    source.execute("ATTACH DATABASE ? AS destino", (destination_path,))
+    try:
+        with source:
+            # Las tablas sin esquema de la condición (incluido el índice FTS5) son las de la base de datos original
+            exported = source.execute(f'''INSERT INTO destino.{TABLA_CLIENTES} ({columns})
+                                    SELECT {columns} FROM main.{TABLA_CLIENTES} WHERE {where}''',
+                                    tuple(parametros)).rowcount
+            for table in (TABLA_BUSQUEDA, TABLA_TRIGRAMAS):
+                source.execute(f"INSERT INTO destino.{table} ({table}) VALUES ('rebuild')")
+    finally:
+        source.execute("DETACH DATABASE destino")
+    for _, sql in triggers:
+        destination.execute(sql)
+    destination.execute("VACUUM") # Quita las páginas libres que dejan los índices FTS5 al reconstruirse
+    return exported
+
+def data_version_connection(database_path=None):
+    '''Devuelve PRAGMA data_version de la conexión de este hilo. El valor cambia cuando otra
+    conexión (de este u otro programa) confirma cambios en la base de datos, pero no con
+    los cambios hechos por la misma conexión.'''
+    try:
+        return connection_manager.get(database_path).execute("PRAGMA data_version").fetchone()[0]
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+@contextmanager
+def snapshot_connection(database_path=None):
+    '''Las lecturas hechas dentro del bloque (en este hilo) ven la base de datos en un mismo
+    momento, aunque otro programa la cambie entre una y otra'''
+    conn = connection_manager.get(database_path)
+    try:
+        conn.execute("BEGIN")
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+    try:
+        yield conn
     finally:
-        if conn:
-            conn.close()
+        conn.rollback() # Solo hubo lecturas
+
+def _change_version(conn):
+    '''Versión del último cambio de la tabla clientes'''
+    return conn.execute(f"SELECT coalesce(max(version), 0) FROM {TABLA_CAMBIOS}").fetchone()[0]
 
+def change_version_connection(database_path=None):
+    '''Devuelve la versión del último cambio de la tabla clientes (TABLA_CAMBIOS)'''
+    try:
+        return _change_version(connection_manager.get(database_path))
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
 
-def run_query(consulta, parametros=None, database_path=None):
-    '''Ejecuta una consulta en la base de datos.'''
+def changes_since_connection(since, database_path=None, limit=EXTERNAL_CHANGES_LIMIT):
+    '''Devuelve (versión, cambios) con los cambios de clientes hechos por otros programas después
+    de la versión "since". "cambios" es {CHANGE_INSERT: filas, CHANGE_UPDATE: filas, CHANGE_DELETE:
+    filas} con las columnas de CHANGE_COLUMNS (de las eliminadas solo se conoce el id), o None si
+    son más de "limit" y conviene volver a leer la tabla.'''
+    own = connection_manager.own_changes(database_path, since)
+    columns = ", ".join(f"{TABLA_CLIENTES}.{column}" for column in CHANGE_COLUMNS)
     try:
-        conn = sqlite3.connect(database_path)
-        cursor = conn.cursor()
-        if parametros:
-            cursor.execute(consulta, parametros)
+        with snapshot_connection(database_path) as conn:
+            version = _change_version(conn)
+            rows = conn.execute(f'''SELECT c.version, c.id, c.creado, c.eliminado, {columns}
+                                FROM {TABLA_CAMBIOS} AS c LEFT JOIN {TABLA_CLIENTES} ON {TABLA_CLIENTES}.id = c.id
+                                WHERE c.version > ? ORDER BY c.version LIMIT ?''', (since, limit + 1)).fetchall()
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+    if len(rows) > limit:
+        return version, None
+    def is_own(change_version):
+        return any(first < change_version <= last for first, last in own)
+    changes = {CHANGE_INSERT: [], CHANGE_UPDATE: [], CHANGE_DELETE: []}
+    for change_version, client_id, created, deleted, *row in rows:
+        # Los cambios propios ya se aplicaron, salvo que el cliente lo haya agregado otro programa
+        # después de "since" (el aviso propio no lo pudo agregar porque no se conocía)
+        if is_own(change_version) and (created <= since or is_own(created)):
+            continue
+        if deleted:
+            if created <= since: # Los agregados y eliminados después de "since" nunca se mostraron
+                changes[CHANGE_DELETE].append((client_id,) + (None,) * (len(CHANGE_COLUMNS) - 1))
         else:
-            cursor.execute(consulta)
-        conn.commit()
+            changes[CHANGE_INSERT if created > since else CHANGE_UPDATE].append(tuple(row))
+    return version, changes
+
+def validate_client(nombre, edad):
+    '''Valida y normaliza el nombre y la edad de un cliente.
+    Devuelve la tupla (nombre, edad) o lanza ValueError con el mensaje para el usuario.'''
+    nombre = str(nombre or "").strip()
+    if not nombre: # Nombre obligatorio
+        raise ValueError("El nombre es obligatorio.")
+    edad = str(edad if edad is not None else "").replace(",", "").strip() # Elimina las comas en caso haberlas
+    if edad.lstrip("-").isdigit():
+        edad = int(edad)
+        if edad < 0:
+            raise ValueError("La edad no puede ser un número negativo.")
+    elif edad: # Texto que no es un número entero
+        raise ValueError(f"La edad '{edad}' no es un número entero.")
+    return nombre, edad
+
+def select_clients_connection(database_path=None, where=None, parametros=(), order_by=None, limit=-1, offset=0,
+                            order_parametros=()):
+    '''Devuelve las filas (con las columnas de CLIENT_COLUMNS) que cumplen la condición "where",
+    en el orden de la cláusula "order_by" y a partir de la fila "offset" (limit -1 = sin límite).
+    "parametros" y "order_parametros" son los valores de los "?" de "where" y de "order_by".'''
+    query, parameters = _clients_query(where, parametros, order_by, order_parametros)
+    try:
+        conn = connection_manager.get(database_path)
+        return conn.execute(query, (*parameters, limit, offset)).fetchall()
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+def _clients_query(where, parametros, order_by, order_parametros):
+    '''(consulta, parámetros) de select_clients_connection sin los valores de LIMIT y OFFSET'''
+    query = f"SELECT {', '.join(CLIENT_COLUMNS)} FROM {TABLA_CLIENTES}"
+    if where:
+        query += f" WHERE {where}"
+    if order_by:
+        query += f" {order_by}"
+    return f"{query} LIMIT ? OFFSET ?", (*parametros, *(order_parametros if order_by else ()))
+
+def count_clients_connection(database_path=None, where=None, parametros=()):
+    '''Devuelve el número de clientes que cumplen la condición "where"'''
+    query, parameters = _count_query(where, parametros)
+    try:
+        conn = connection_manager.get(database_path)
+        return conn.execute(query, parameters).fetchone()[0]
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+def _count_query(where, parametros):
+    '''(consulta, parámetros) de count_clients_connection'''
+    query = f"SELECT count(*) FROM {TABLA_CLIENTES}"
+    if where:
+        query += f" WHERE {where}"
+    return query, tuple(parametros)
+
+def _sort_key(sort_column):
+    '''Columna de la tabla usada para ordenar por la columna mostrada indicada'''
+    if sort_column not in SORT_KEYS:
+        raise ValueError(f"No se puede ordenar por la columna '{sort_column}'.")
+    return SORT_KEYS[sort_column]
+
+def _order_by(key, descending):
+    '''Cláusula ORDER BY por la columna de orden con el id como desempate'''
+    direction = "DESC" if descending else "ASC"
+    return f"ORDER BY id {direction}" if key == "id" else f"ORDER BY {key} {direction}, id {direction}"
+
+def select_clients_page_connection(database_path=None, where=None, parametros=(), sort_column="id",
+                                descending=True, seek=None, limit=-1, offset=0):
+    '''Lee una página de clientes con paginación por clave (keyset): en lugar de contar
+    "offset" filas desde el principio, el índice de la columna de orden salta directo a la fila
+    "seek" = (incluida, valor de orden, id) y la página empieza ahí (offset filas después).
+    Cada fila tiene las columnas de CLIENT_COLUMNS y al final su valor de orden.'''
+    query, parameters = _page_query(where, parametros, sort_column, descending, seek)
+    try:
+        conn = connection_manager.get(database_path)
+        return conn.execute(query, (*parameters, limit, offset)).fetchall()
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+def _page_query(where, parametros, sort_column, descending, seek):
+    '''(consulta, parámetros) de select_clients_page_connection sin los valores de LIMIT y OFFSET'''
+    key = _sort_key(sort_column)
+    conditions = [f"({where})"] if where else []
+    parameters = list(parametros)
+    if seek is not None:
+        inclusive, value, client_id = seek
+        operator = ("<" if descending else ">") + ("=" if inclusive else "")
+        if key == "id":
+            conditions.append(f"id {operator} ?")
+            parameters.append(client_id)
+        else: # Comparación de filas (valor, id): usa el índice de la columna y el id desempata
+            conditions.append(f"({key}, id) {operator} (?, ?)")
+            parameters += [value, client_id]
+    query = f"SELECT {', '.join(CLIENT_COLUMNS)}, {key} FROM {TABLA_CLIENTES}"
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    return f"{query} {_order_by(key, descending)} LIMIT ? OFFSET ?", tuple(parameters)
+
+def iter_clients_connection(database_path=None, where=None, parametros=(), sort_column="id", descending=True,
+                            order_by=None, order_parametros=(), fetch_rows=FETCH_ROWS):
+    '''Genera una por una todas las filas (columnas de CLIENT_COLUMNS) que cumplen la condición
+    "where", en el mismo orden que la tabla: la cláusula "order_by" propia o la columna de orden.
+    El cursor se lee de "fetch_rows" en "fetch_rows" filas, así la memoria usada no depende del
+    número de clientes. Toda la lectura ve la base de datos del momento en que empezó.'''
+    query = f"SELECT {', '.join(CLIENT_COLUMNS)} FROM {TABLA_CLIENTES}"
+    if where:
+        query += f" WHERE {where}"
+    query += f" {order_by or _order_by(_sort_key(sort_column), descending)}"
+    try:
+        conn = connection_manager.get(database_path)
+        cursor = conn.execute(query, (*parametros, *(order_parametros if order_by else ())))
+        try:
+            while rows := cursor.fetchmany(fetch_rows):
+                yield from rows
+        finally:
+            cursor.close()
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+
+def select_client_ids_connection(ranges, database_path=None, where=None, parametros=(), sort_column="id",
+                                descending=True, order_by=None, order_parametros=()):
+    '''Devuelve los ids de las filas en las posiciones indicadas del resultado (mismo filtro y
+    orden que la tabla). "ranges" es una lista de (primera posición, número de filas); sirve
+    para selecciones que incluyen filas cuyas páginas no están en memoria.'''
+    query = f"SELECT id FROM {TABLA_CLIENTES}"
+    if where:
+        query += f" WHERE {where}"
+    query += f" {order_by or _order_by(_sort_key(sort_column), descending)} LIMIT ? OFFSET ?"
+    parameters = (*parametros, *(order_parametros if order_by else ()))
+    ids = []
+    try:
+        conn = connection_manager.get(database_path)
+        for first, count in ranges:
+            ids += [row[0] for row in conn.execute(query, (*parameters, count, first))]
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+    return ids
+
+def get_clients_connection(id_client, database_path=None, where=None, parametros=()):
+    '''Devuelve un diccionario {id: fila} de los clientes indicados que cumplen la
+    condición "where" (usado para saber si las filas que cambiaron siguen en el filtro).'''
+    id_client = list(id_client)
+    rows = {}
+    condition = f" AND ({where})" if where else ""
+    columns = ", ".join(CLIENT_COLUMNS)
+    try:
+        conn = connection_manager.get(database_path)
+        for start in range(0, len(id_client), DELETE_CHUNK_SIZE):
+            chunk = id_client[start:start + DELETE_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in conn.execute(f'''SELECT {columns} FROM {TABLA_CLIENTES}
+                                    WHERE id IN ({placeholders}){condition}''', (*chunk, *parametros)):
+                rows[row[0]] = row
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+    return rows
+
+def run_returning(query, parametros=(), database_path=None):
+    '''Ejecuta una sentencia INSERT, UPDATE o DELETE con "RETURNING" en una transacción
+    y devuelve las filas afectadas (se leen antes de confirmar la transacción).'''
+    try:
+        conn = connection_manager.get(database_path)
+        with conn:
+            # Con la transacción abierta desde antes de leer la versión, ningún otro programa puede
+            # escribir entre las dos lecturas y todas las versiones intermedias son de este cambio
+            conn.execute("BEGIN IMMEDIATE")
+            first = _change_version(conn)
+            rows = conn.execute(query, parametros).fetchall()
+            last = _change_version(conn)
     except (sqlite3.OperationalError, sqlite3.IntegrityError, sqlite3.Error) as e:
         raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
-    finally:
-        if conn:
-            conn.close()
+    connection_manager.record_own_changes(database_path, first, last)
+    return rows
 
 def add_client_connection(cliente, database_path=None):
-    '''Añade un cliente a la base de datos.'''
-    run_query(f'''INSERT INTO {TABLA_CLIENTES} (
-                            nombre, edad, oi, od, adede, observaciones, fecha
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?)''', cliente, database_path)
+    '''Añade un cliente a la base de datos y devuelve su fila (columnas de CHANGE_COLUMNS).'''
+    rows = run_returning(f'''INSERT INTO {TABLA_CLIENTES} (
+                            nombre, edad, oi, od, adede, observaciones, fecha, nombre_busqueda
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?) {RETURNING_COLUMNS}''',
+                        (*cliente, search_key(cliente[0])), database_path)
+    connection_manager.notify(database_path, CHANGE_INSERT, rows)
+    return rows[0]
 
 def edit_client_connection(cliente, database_path=None):
-    '''Edita un cliente de la base de datos.'''
-    run_query(f'''UPDATE {TABLA_CLIENTES} SET
-                            nombre=?, edad=?, oi=?, od=?, adede=?, observaciones=?, fecha=?
-                            WHERE id=?''', cliente, database_path)
+    '''Edita un cliente de la base de datos y devuelve su fila editada (None si ya no existe).'''
+    rows = run_returning(f'''UPDATE {TABLA_CLIENTES} SET
+                            nombre=?, edad=?, oi=?, od=?, adede=?, observaciones=?, fecha=?, nombre_busqueda=?
+                            WHERE id=? {RETURNING_COLUMNS}''',
+                        (*cliente[:7], search_key(cliente[0]), cliente[7]), database_path)
+    if rows:
+        connection_manager.notify(database_path, CHANGE_UPDATE, rows)
+    return rows[0] if rows else None
+
+def edit_client_field_connection(id_client, column, value, database_path=None):
+    '''Edita una sola columna de un cliente (edición directa en la tabla) y devuelve su
+    fila editada (None si ya no existe). Al cambiar el nombre también actualiza su clave de búsqueda.'''
+    if column not in CLIENT_COLUMNS[1:]:
+        raise ValueError(f"La columna '{column}' no se puede editar.")
+    if column == "nombre":
+        rows = run_returning(f"UPDATE {TABLA_CLIENTES} SET nombre=?, nombre_busqueda=? WHERE id=? {RETURNING_COLUMNS}",
+                            (value, search_key(value), id_client), database_path)
+    else:
+        rows = run_returning(f"UPDATE {TABLA_CLIENTES} SET {column}=? WHERE id=? {RETURNING_COLUMNS}",
+                            (value, id_client), database_path)
+    if rows:
+        connection_manager.notify(database_path, CHANGE_UPDATE, rows)
+    return rows[0] if rows else None
 
 def delete_client_connection(id_client, database_path=None):
-    '''Elimina un cliente de la base de datos.'''
-    for each_client in id_client:
-        run_query(f"DELETE FROM {TABLA_CLIENTES} WHERE id=?", (each_client,), database_path)
+    '''Mueve a la papelera los clientes indicados en una sola transacción y devuelve
+    el número de filas eliminadas.'''
+    id_client = list(id_client)
+    deleted = []
+    eliminado = datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
+    try:
+        conn = connection_manager.get(database_path)
+        with conn: # Si falla algún bloque no se elimina ningún cliente
+            conn.execute("BEGIN IMMEDIATE") # Igual que en run_returning
+            first = _change_version(conn)
+            # Bloques de DELETE_CHUNK_SIZE ids para no superar el límite de parámetros de SQLite
+            for start in range(0, len(id_client), DELETE_CHUNK_SIZE):
+                chunk = id_client[start:start + DELETE_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                conn.execute(f'''INSERT INTO {TABLA_PAPELERA} ({', '.join(CHANGE_COLUMNS)}, eliminado)
+                            SELECT {', '.join(CHANGE_COLUMNS)}, ? FROM {TABLA_CLIENTES} WHERE id IN ({placeholders})''',
+                            (eliminado, *chunk))
+                deleted += conn.execute(f"DELETE FROM {TABLA_CLIENTES} WHERE id IN ({placeholders}) "
+                                        f"{RETURNING_COLUMNS}", chunk).fetchall()
+            last = _change_version(conn)
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, sqlite3.Error) as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+    connection_manager.record_own_changes(database_path, first, last)
+    if deleted:
+        connection_manager.notify(database_path, CHANGE_DELETE, deleted)
+    return len(deleted)
+
+def list_trash_connection(database_path=None, limit=TRASH_LIST_LIMIT):
+    '''Devuelve (total, filas) de la papelera: el número de clientes eliminados y los "limit" más
+    recientes con las columnas (id, nombre, edad, fecha, eliminado)'''
+    try:
+        conn = connection_manager.get(database_path)
+        total = conn.execute(f"SELECT count(*) FROM {TABLA_PAPELERA}").fetchone()[0]
+        rows = conn.execute(f'''SELECT id, nombre, edad, fecha, eliminado FROM {TABLA_PAPELERA}
+                            ORDER BY eliminado DESC, id DESC LIMIT ?''', (limit,)).fetchall()
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al hacer la consulta: {e}") from e
+    return total, rows
+
+def restore_clients_connection(id_client, database_path=None):
+    '''Devuelve a la tabla clientes (con su mismo id) los clientes indicados de la papelera en una
+    sola transacción y devuelve el número de clientes restaurados.'''
+    id_client = list(id_client)
+    restored = []
+    try:
+        conn = connection_manager.get(database_path)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE") # Igual que en run_returning
+            first = _change_version(conn)
+            for start in range(0, len(id_client), DELETE_CHUNK_SIZE):
+                chunk = id_client[start:start + DELETE_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                # Los triggers de inserción actualizan los índices de búsqueda y el registro de cambios
+                restored += conn.execute(f'''INSERT INTO {TABLA_CLIENTES} ({', '.join(CHANGE_COLUMNS)})
+                                        SELECT {', '.join(CHANGE_COLUMNS)} FROM {TABLA_PAPELERA}
+                                        WHERE id IN ({placeholders}) {RETURNING_COLUMNS}''', chunk).fetchall()
+                conn.execute(f"DELETE FROM {TABLA_PAPELERA} WHERE id IN ({placeholders})", chunk)
+            last = _change_version(conn)
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, sqlite3.Error) as e:
+        raise RuntimeError(f"Error operativo al restaurar los clientes: {e}") from e
+    connection_manager.record_own_changes(database_path, first, last)
+    if restored:
+        connection_manager.notify(database_path, CHANGE_INSERT, restored)
+    return len(restored)
+
+def purge_trash_connection(database_path=None, older_than=None, batch_size=PURGE_BATCH_SIZE, progress=None):
+    '''Elimina definitivamente los clientes de la papelera eliminados antes de "older_than" (datetime;
+    None = todos). Se eliminan por bloques de "batch_size", cada uno en su propia transacción de pocos
+    milisegundos, con una pausa entre bloques para que los demás puedan escribir mientras tanto.
+    "progress(eliminados)" se llama después de cada bloque y si devuelve False se detiene.
+    Devuelve el número de clientes eliminados.'''
+    condition, parameters = "", ()
+    if older_than is not None:
+        condition, parameters = "WHERE eliminado < ?", (older_than.isoformat(sep=" ", timespec="seconds"),)
+    purged = 0
+    try:
+        conn = connection_manager.get(database_path)
+        while True:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                deleted = conn.execute(f'''DELETE FROM {TABLA_PAPELERA} WHERE id IN (
+                                    SELECT id FROM {TABLA_PAPELERA} {condition} ORDER BY eliminado LIMIT ?)''',
+                                    (*parameters, batch_size)).rowcount
+            purged += deleted
+            if deleted < batch_size or (progress is not None and progress(purged) is False):
+                break
+            time.sleep(PURGE_PAUSE)
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al vaciar la papelera: {e}") from e
+    return purged
+
+def import_clients_connection(clientes, database_path=None, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    '''Inserta clientes por bloques de "batch_size" con executemany, cada bloque en su
+    propia transacción. "progress(importados)" se llama después de cada bloque y si
+    devuelve False se cancela la importación (los bloques anteriores se conservan).
+    Devuelve el número de clientes insertados.'''
+    clientes = iter(clientes)
+    imported = 0
+    try:
+        conn = connection_manager.get(database_path)
+        # Los triggers de inserción actualizan los índices FTS5 y el registro de cambios fila por
+        # fila, lo que hace la importación varias veces más lenta. Dentro de cada bloque se quitan,
+        # las tablas se actualizan con un solo INSERT ... SELECT y se vuelven a crear antes de
+        # confirmar, así ninguna otra conexión llega a ver la tabla sin ellos.
+        triggers = conn.execute(f'''SELECT name, sql FROM sqlite_master WHERE type = 'trigger'
+                                AND name IN ('{TABLA_CLIENTES}_fts_insert', '{TABLA_CLIENTES}_trigramas_insert',
+                                            '{TABLA_CAMBIOS}_insert')''').fetchall()
+        trigger_names = {name for name, _ in triggers}
+        while True:
+            batch = [(*cliente, search_key(cliente[0])) for cliente in islice(clientes, batch_size)]
+            if not batch:
+                break
+            conn.execute("BEGIN IMMEDIATE") # Un bloque completo o nada (incluidos los triggers)
+            try:
+                last_id = conn.execute(f"SELECT coalesce(max(id), 0) FROM {TABLA_CLIENTES}").fetchone()[0]
+                first = _change_version(conn) if f"{TABLA_CAMBIOS}_insert" in trigger_names else 0
+                for name, _ in triggers:
+                    conn.execute(f"DROP TRIGGER {name}")
+                conn.executemany(f'''INSERT INTO {TABLA_CLIENTES} (
+                            nombre, edad, oi, od, adede, observaciones, fecha, nombre_busqueda
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', batch)
+                if f"{TABLA_CLIENTES}_fts_insert" in trigger_names:
+                    conn.execute(f'''INSERT INTO {TABLA_BUSQUEDA} (rowid, nombre, observaciones)
+                                SELECT id, nombre, observaciones FROM {TABLA_CLIENTES} WHERE id > ?''', (last_id,))
+                if f"{TABLA_CLIENTES}_trigramas_insert" in trigger_names:
+                    conn.execute(f'''INSERT INTO {TABLA_TRIGRAMAS} (rowid, nombre_busqueda)
+                                SELECT id, nombre_busqueda FROM {TABLA_CLIENTES} WHERE id > ?''', (last_id,))
+                if f"{TABLA_CAMBIOS}_insert" in trigger_names:
+                    # Versiones consecutivas a partir de la última, en el orden de los ids nuevos
+                    conn.execute(f'''INSERT INTO {TABLA_CAMBIOS} (id, version, creado)
+                                SELECT id, ? + id - ?, ? + id - ? FROM {TABLA_CLIENTES} WHERE id > ?''',
+                                (first, last_id, first, last_id, last_id))
+                last = _change_version(conn) if f"{TABLA_CAMBIOS}_insert" in trigger_names else 0
+                for _, sql in triggers:
+                    conn.execute(sql)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            connection_manager.record_own_changes(database_path, first, last)
+            imported += len(batch)
+            if progress is not None and progress(imported) is False:
+                break
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, sqlite3.Error) as e:
+        raise RuntimeError(f"Error operativo al importar los clientes: {e}") from e
+    finally:
+        if imported: # Demasiadas filas para avisarlas una por una, la tabla se vuelve a leer
+            connection_manager.notify(database_path, CHANGE_RESET)
+    return imported
@@ -0,0 +1,82 @@
+'''
+Escritura de archivos CSV, JSON Lines y XLSX para exportar los clientes de la tabla.
+Las filas se escriben una por una conforme se leen de la base de datos, así la memoria usada
+no depende del número de clientes exportados.
+'''
+import os
+import csv
+import json
+
+from conexion import CLIENT_COLUMNS
+
+EXPORT_FORMATS = (".csv", ".jsonl", ".xlsx") # Extensiones de los formatos de exportación
+EXPORT_PROGRESS_ROWS = 5000 # Filas escritas entre cada aviso de progreso
+
+
+class _ExportCanceled(Exception):
+    '''Se lanza dentro de write_clients para detener la escritura al cancelar'''
+
+
+def _write_csv(file_path, rows):
+    '''Escribe el CSV con encabezado (utf-8 con BOM para que Excel muestre bien los acentos)'''
+    with open(file_path, "w", encoding="utf-8-sig", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CLIENT_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            yield
+
+
+def _write_jsonl(file_path, rows):
+    '''Escribe un objeto JSON por línea con los nombres de las columnas como claves'''
+    with open(file_path, "w", encoding="utf-8") as file:
+        for row in rows:
+            file.write(json.dumps(dict(zip(CLIENT_COLUMNS, row)), ensure_ascii=False))
+            file.write("\n")
+            yield
+
+
+def _write_xlsx(file_path, rows):
+    '''Escribe la primera hoja del libro en modo de solo escritura (streaming)'''
+    try:
+        # pylint: disable=import-outside-toplevel (openpyxl solo es necesario para exportar XLSX)
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise RuntimeError("Para exportar archivos XLSX es necesario instalar 'openpyxl' (pip install openpyxl).") from e
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Clientes")
+    sheet.append(CLIENT_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+        yield
+    workbook.save(file_path)
+
+
+def write_clients(file_path, rows, total=0, progress=None):
+    '''Escribe las filas (columnas de CLIENT_COLUMNS) en el archivo; el formato se elige por la
+    extensión (EXPORT_FORMATS). Cada EXPORT_PROGRESS_ROWS filas se llama "progress(escritas, total)"
+    y si devuelve False se cancela y se elimina el archivo incompleto.
+    Devuelve el número de filas escritas o None si se canceló.'''
+    extension = os.path.splitext(file_path)[1].lower()
+    writers = {".csv": _write_csv, ".jsonl": _write_jsonl, ".xlsx": _write_xlsx}
+    if extension not in writers:
+        raise RuntimeError(f"El formato '{extension}' no se puede exportar. Formatos disponibles: {', '.join(EXPORT_FORMATS)}.")
+    written = 0
+    writer = writers[extension](file_path, rows)
+    try:
+        for _ in writer:
+            written += 1
+            if progress is not None and written % EXPORT_PROGRESS_ROWS == 0 and progress(written, total) is False:
+                raise _ExportCanceled()
+    except (_ExportCanceled, OSError, RuntimeError) as e:
+        writer.close() # Cierra el archivo antes de eliminarlo
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        if isinstance(e, _ExportCanceled):
+            return None
+        if isinstance(e, RuntimeError):
+            raise
+        raise RuntimeError(f"Error operativo al exportar los clientes: {e}") from e
+    if progress is not None:
+        progress(written, total)
+    return written
@@ -0,0 +1,119 @@
+'''
+Condiciones de búsqueda de la tabla clientes.
+Cada función devuelve un ClientFilter con el SQL escrito con marcadores "?" y los valores
+por separado: el texto del usuario nunca forma parte de la consulta (un nombre como O'Brien
+no la rompe) y el texto SQL es siempre el mismo, así sqlite3 reutiliza la sentencia ya
+preparada de su caché en lugar de compilar una nueva en cada búsqueda.
+'''
+from collections import namedtuple
+
+from conexion import TABLA_CLIENTES, TABLA_BUSQUEDA, fts_match_query, search_key_range
+
+# where / parameters: condición WHERE y sus valores (where None = todos los clientes)
+# order_by / order_parameters: cláusula ORDER BY propia y sus valores (None = orden de la tabla)
+ClientFilter = namedtuple("ClientFilter", ("where", "parameters", "order_by", "order_parameters"))
+
+NO_FILTER = ClientFilter(None, (), None, ())
+
+_NAME_PREFIX = "(nombre_busqueda >= ? AND nombre_busqueda < ?)"
+
+
+def name_filter(text):
+    '''Clientes cuyo nombre empieza por el texto (índice de nombre_busqueda) o que contienen
+    todas sus palabras como prefijo (índice de texto completo). Se ordenan primero los que
+    empiezan por el texto y después los más recientes. Devuelve None si el texto no tiene palabras.'''
+    match = fts_match_query(text)
+    if match is None:
+        return None
+    low, high = search_key_range(text)
+    # No se ordena por "rank" de FTS5: calcularlo fila por fila en el ORDER BY repite la búsqueda
+    # de texto completo por cada cliente encontrado (segundos con un nombre común)
+    return ClientFilter(f"{_NAME_PREFIX} OR id IN (SELECT rowid FROM {TABLA_BUSQUEDA} WHERE {TABLA_BUSQUEDA} MATCH ?)",
+                        (low, high, match), f"ORDER BY {_NAME_PREFIX} DESC, id DESC", (low, high))
+
+
+def live_name_filter(text, limit):
+    '''Igual que name_filter pero solo con los "limit" clientes más recientes que contienen las
+    palabras (búsqueda mientras se escribe). FTS5 entrega las coincidencias por rowid y se detiene
+    al llegar al límite, así el tiempo no depende de cuántos clientes tienen un nombre común.'''
+    match = fts_match_query(text)
+    if match is None:
+        return None
+    low, high = search_key_range(text)
+    return ClientFilter(f"id IN (SELECT rowid FROM {TABLA_BUSQUEDA} WHERE {TABLA_BUSQUEDA} MATCH ? "
+                        "ORDER BY rowid DESC LIMIT ?)",
+                        (match, limit), f"ORDER BY {_NAME_PREFIX} DESC, id DESC", (low, high))
+
+
+def name_prefix_filter(text):
+    '''Clientes cuyo nombre empieza por el texto (sin importar acentos ni mayúsculas).
+    Devuelve None si el texto está vacío.'''
+    low, high = search_key_range(text)
+    if not low:
+        return None
+    return ClientFilter(_NAME_PREFIX, (low, high), None, ())
+
+
+def observaciones_filter(text):
+    '''Clientes cuyas observaciones contienen todas las palabras del texto como prefijo
+    (índice de texto completo). Devuelve None si el texto no tiene palabras.'''
+    match = fts_match_query(text, "observaciones")
+    if match is None:
+        return None
+    return ClientFilter(f"id IN (SELECT rowid FROM {TABLA_BUSQUEDA} WHERE {TABLA_BUSQUEDA} MATCH ?)",
+                        (match,), None, ())
+
+
+def date_filter(fecha):
+    '''Clientes con la fecha indicada (yyyy-MM-dd)'''
+    return ClientFilter("fecha = ?", (fecha,), None, ())
+
+
+def date_range_filter(start=None, end=None):
+    '''Clientes con fecha entre "start" y "end" (yyyy-MM-dd, incluidas). Un límite None no se aplica.'''
+    return _range_filter("fecha", start, end)
+
+
+def age_range_filter(minimum=None, maximum=None):
+    '''Clientes con edad entre "minimum" y "maximum" (incluidas). Un límite None no se aplica.
+    Junto con date_range_filter usa el índice (fecha, edad) o (edad, fecha).
+    Solo se comparan las edades numéricas: la edad vacía se guarda como '' y en SQLite un texto
+    va después de cualquier número, así "edad >= ?" la incluiría.'''
+    client_filter = _range_filter("edad", minimum, maximum)
+    if not client_filter.where:
+        return client_filter
+    return client_filter._replace(where=f"{client_filter.where} AND typeof(edad) = 'integer'")
+
+
+def _range_filter(column, low, high):
+    '''Condición de rango sobre una columna indexable'''
+    if low is not None and high is not None:
+        return ClientFilter(f"{column} BETWEEN ? AND ?", (low, high), None, ())
+    if low is not None:
+        return ClientFilter(f"{column} >= ?", (low,), None, ())
+    if high is not None:
+        return ClientFilter(f"{column} <= ?", (high,), None, ())
+    return NO_FILTER
+
+
+def ids_filter(ids):
+    '''Clientes con los ids indicados, en el mismo orden de la lista. Los ids van en un solo
+    valor JSON para que la sentencia sea la misma sin importar cuántos sean.'''
+    ids_json = "[" + ", ".join(str(int(client_id)) for client_id in ids) + "]"
+    return ClientFilter("id IN (SELECT value FROM json_each(?))", (ids_json,),
+                        f"ORDER BY (SELECT key FROM json_each(?) WHERE value = {TABLA_CLIENTES}.id)", (ids_json,))
+
+
+def combine_filters(*filters):
+    '''Une las condiciones con AND. El orden propio es el del primer filtro que lo tenga.'''
+    wheres, parameters = [], []
+    order_by, order_parameters = None, ()
+    for client_filter in filters:
+        if client_filter is None:
+            continue
+        if client_filter.where:
+            wheres.append(f"({client_filter.where})")
+            parameters.extend(client_filter.parameters)
+        if order_by is None and client_filter.order_by:
+            order_by, order_parameters = client_filter.order_by, client_filter.order_parameters
+    return ClientFilter(" AND ".join(wheres) or None, tuple(parameters), order_by, tuple(order_parameters))
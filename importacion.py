@@ -0,0 +1,105 @@
+'''
+Lectura de archivos CSV y XLSX para la importación masiva de clientes.
+Los archivos se leen fila por fila para no cargar el archivo completo en memoria.
+'''
+import csv
+import datetime
+from contextlib import contextmanager
+
+from conexion import validate_client
+
+# Orden de las columnas de la tabla clientes (sin el id)
+IMPORT_COLUMNS = ("nombre", "edad", "oi", "od", "adede", "observaciones", "fecha")
+
+
+def normalize_fecha(fecha):
+    '''Convierte la fecha leída del archivo al formato ISO-8601 (yyyy-MM-dd) usado en la tabla'''
+    if isinstance(fecha, (datetime.date, datetime.datetime)):
+        return fecha.strftime("%Y-%m-%d")
+    fecha = str(fecha or "").strip()
+    if not fecha: # Sin fecha se usa la fecha actual, igual que en el formulario
+        return datetime.date.today().isoformat()
+    # Acepta dd/mm/aaaa, dd-mm-aaaa y aaaa-mm-dd (más rápido que strptime en millones de filas)
+    parts = fecha.split(" ")[0].replace("-", "/").split("/")
+    try:
+        if len(parts) != 3:
+            raise ValueError
+        if len(parts[0]) == 4:
+            parts.reverse()
+        day, month, year = (int(part) for part in parts)
+        date = datetime.date(year, month, day) # Comprueba que la fecha exista
+    except ValueError:
+        raise ValueError(f"La fecha '{fecha}' no tiene un formato válido (dd/mm/aaaa).") from None
+    return date.isoformat()
+
+
+def count_rows(file_path):
+    '''Cuenta de forma aproximada las filas del archivo (usado para la barra de progreso)'''
+    if file_path.lower().endswith(".xlsx"):
+        with _open_xlsx(file_path) as sheet:
+            return sheet.max_row or 0
+    lines = 0
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""): # Bloques de 1 MB
+            lines += block.count(b"\n")
+    return lines
+
+
+@contextmanager
+def _open_xlsx(file_path):
+    '''Abre la primera hoja del libro en modo de solo lectura (streaming). En ese modo el
+    archivo queda abierto hasta cerrar el libro, lo que se hace al salir del bloque "with".'''
+    try:
+        # pylint: disable=import-outside-toplevel (openpyxl solo es necesario para importar XLSX)
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise RuntimeError("Para importar archivos XLSX es necesario instalar 'openpyxl' (pip install openpyxl).") from e
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        yield workbook.worksheets[0]
+    finally:
+        workbook.close()
+
+
+def _read_csv(file_path):
+    '''Devuelve las filas del CSV detectando el separador (",", ";" o tabulador)'''
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as file:
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(file, dialect)
+
+
+def _read_xlsx(file_path):
+    '''Devuelve las filas de la primera hoja del XLSX'''
+    with _open_xlsx(file_path) as sheet:
+        yield from sheet.iter_rows(values_only=True)
+
+
+def read_clients(file_path, errors):
+    '''Genera las tuplas de clientes válidos listas para insertar.
+    Si la primera fila contiene la columna "nombre" se usa como encabezado,
+    de lo contrario las columnas se leen en el orden de IMPORT_COLUMNS.
+    Las filas inválidas se omiten y se agregan a "errors" como (fila, mensaje).'''
+    rows = _read_xlsx(file_path) if file_path.lower().endswith(".xlsx") else _read_csv(file_path)
+    positions = list(range(len(IMPORT_COLUMNS)))
+    for line, row in enumerate(rows, start=1):
+        if not row or all(value in (None, "") for value in row): # Filas vacías
+            continue
+        if line == 1:
+            header = [str(value or "").strip().lower() for value in row]
+            if "nombre" in header:
+                positions = [header.index(column) if column in header else None for column in IMPORT_COLUMNS]
+                continue
+        values = [row[pos] if pos is not None and pos < len(row) else None for pos in positions]
+        try:
+            nombre, edad = validate_client(values[0], values[1])
+            fecha = normalize_fecha(values[6])
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        oi, od, adede, observaciones = (str(value).strip() if value is not None else "" for value in values[2:6])
+        yield (nombre, edad, oi, od, adede, observaciones, fecha)
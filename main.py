@@ -12,16 +12,64 @@ import os
 import sys
 import json
 import shutil
+import datetime
+import threading
 # pylint: disable=no-name-in-module (Linea añadida para eviatar un falso error dado por pylint en la importacion de modulos)
-from PyQt5.QtCore import QDate, Qt, QPropertyAnimation, QSequentialAnimationGroup, QPauseAnimation
+from PyQt5.QtCore import QDate, QDateTime, Qt, QTimer, QPropertyAnimation, QSequentialAnimationGroup, QPauseAnimation
 from PyQt5.QtGui import QIntValidator, QIcon
-from PyQt5.QtSql import QSqlDatabase, QSqlTableModel
-from PyQt5.QtWidgets import (QMainWindow, QApplication, QDialog, QMessageBox,
-                            QAbstractItemView, QFileDialog, QHeaderView, QGraphicsOpacityEffect)
+from PyQt5.QtWidgets import (QMainWindow, QApplication, QDialog, QMessageBox, QPushButton, QProgressDialog, QProgressBar, QLabel,
+                            QStyledItemDelegate, QDateEdit, QAbstractItemView, QFileDialog, QHeaderView, QGraphicsOpacityEffect,
+                            QFormLayout, QHBoxLayout, QVBoxLayout, QLineEdit, QCheckBox, QSpinBox, QDialogButtonBox,
+                            QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem)
 from VentanaPrincipal import Ui_MainWindow
 from VentanaEdicion import Ui_Dialog
-from conexion import (create_db_connection, add_client_connection,
-                    edit_client_connection, delete_client_connection)
+from conexion import (DEFAULT_PRAGMA_PROFILE, connection_manager, copy_db_connection, export_db_connection,
+                    fuzzy_search_clients, create_db_connection, validate_client, add_client_connection,
+                    edit_client_connection, delete_client_connection, import_clients_connection, list_trash_connection,
+                    restore_clients_connection, purge_trash_connection, invalid_dates_connection, TRASH_DAYS,
+                    PURGE_BATCH_SIZE)
+from importacion import read_clients, count_rows
+from exportacion import EXPORT_FORMATS, write_clients
+from modelo_clientes import ClientTableModel, CLIENT_HEADERS
+from respaldos import BACKUP_INTERVAL, scheduled_backup, create_backup, list_backups, restore_backup
+from filtros import (NO_FILTER, name_filter, live_name_filter, date_filter, ids_filter, name_prefix_filter,
+                    observaciones_filter, date_range_filter, age_range_filter, combine_filters)
+from trabajador_bd import DatabaseWorker
+
+COLUMN_SAMPLE_ROWS = 200 # Filas medidas para calcular el ancho de las columnas
+COLUMN_PADDING = 24 # Espacio extra (márgenes de la celda) sumado al texto más ancho
+MAX_COLUMN_WIDTH = 400 # Ancho máximo calculado (un texto muy largo no ocupa toda la tabla)
+SEARCH_DEBOUNCE_MS = 150 # Espera después de la última tecla antes de buscar mientras se escribe
+LIVE_SEARCH_LIMIT = 500 # Clientes más recientes mostrados al buscar mientras se escribe
+MIGRATION_DIALOG_MS = 500 # El avance de las migraciones solo se muestra si tardan más que esto
+EXTERNAL_CHANGES_MS = 2000 # Intervalo para buscar cambios hechos por otra computadora en la misma base de datos
+TRASH_FOLDER = "Papelera" # Carpeta (junto a la base de datos) donde se mueven las bases de datos eliminadas
+DELETE_NAMES_SHOWN = 10 # Nombres de clientes mostrados al confirmar una eliminación (los demás solo se cuentan)
+BACKUP_CHECK_MS = 5 * 60 * 1000 # Intervalo para revisar si ya toca el respaldo automático (ver respaldos.BACKUP_INTERVAL)
+
+class DateDelegate(QStyledItemDelegate):
+    '''Muestra y edita como dd/MM/yyyy las fechas guardadas como yyyy-MM-dd'''
+    def displayText(self, value, locale): # pylint: disable=invalid-name
+        '''Texto mostrado en la celda'''
+        date = QDate.fromString(str(value), Qt.ISODate)
+        return date.toString("dd/MM/yyyy") if date.isValid() else super().displayText(value, locale)
+
+    def createEditor(self, parent, option, index): # pylint: disable=invalid-name,unused-argument
+        '''Editor de fecha usado al editar directamente en la tabla'''
+        editor = QDateEdit(parent)
+        editor.setDisplayFormat("dd/MM/yyyy")
+        editor.setCalendarPopup(True)
+        return editor
+
+    def setEditorData(self, editor, index): # pylint: disable=invalid-name
+        '''Carga la fecha de la celda en el editor'''
+        date = QDate.fromString(str(index.data()), Qt.ISODate)
+        editor.setDate(date if date.isValid() else QDate.currentDate())
+
+    def setModelData(self, editor, model, index): # pylint: disable=invalid-name
+        '''Guarda la fecha del editor en formato ISO'''
+        model.setData(index, editor.date().toString(Qt.ISODate))
+
 
 class MainWindow(QMainWindow):
     """
@@ -42,13 +90,47 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Óptica León")
 
         # Inicializa valores predeterminados de las instancias
-        self.db = QSqlDatabase.addDatabase("QSQLITE")
+        self.database_path = None # Ruta de la base de datos abierta (la conexión la maneja connection_manager)
         self.state = True
-        self.model = QSqlTableModel() # Al crear esta instancia se abre una conexión no requerida
-        self.db.close() # Cierra la conexion no requerida abierta anteriormente
+        # Hilo donde se ejecutan las consultas para que la ventana no se congele
+        self.worker = DatabaseWorker(self)
+        self.worker.start()
+        self.model = ClientTableModel(self.worker) # Lee y escribe con las conexiones de conexion.py
+        # Hilo para las tareas largas en segundo plano (respaldos y vaciado de la papelera),
+        # así no detienen las consultas de la tabla
+        self.background_worker = DatabaseWorker(self)
+        self.background_worker.start()
+        # Se activa para cancelar las tareas de background_worker pendientes o en curso (ver background_progress)
+        self.background_canceled = threading.Event()
+        # Indicador de la barra de estado mientras hay consultas en curso
+        self.busy_label = QLabel()
+        self.busy_indicator = QProgressBar()
+        self.cache_label = QLabel() # Aciertos y memoria del caché de resultados del modelo
         self.effect = QGraphicsOpacityEffect()
         self.animation_group = QSequentialAnimationGroup()
         self.current_order = Qt.DescendingOrder # Variable con el orden actual de la tabla
+        self.date_delegate = DateDelegate()
+        self.fitting_columns = False # Los anchos los está poniendo fit_columns (no el usuario)
+        self.columns_resized = False # El usuario cambió el ancho de alguna columna
+        self.ui.tableView.horizontalHeader().sectionResized.connect(self.column_resized)
+        # La búsqueda mientras se escribe espera a que se deje de escribir SEARCH_DEBOUNCE_MS
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.live_search)
+        self.advanced_search_dialog = AdvancedSearchDialog(self) # Conserva los criterios entre búsquedas
+        # Los clientes agregados o editados en otra computadora aparecen sin restablecer la tabla.
+        # Compartir la base de datos entre computadoras significa tenerla en una carpeta de red, donde
+        # WAL no es seguro: ahí connection_manager usa el perfil NETWORK_PRAGMA_PROFILE (diario clásico)
+        # aunque config.json indique otro, y database_opened() lo avisa en la barra de estado
+        self.external_changes_timer = QTimer(self)
+        self.external_changes_timer.setInterval(EXTERNAL_CHANGES_MS)
+        self.external_changes_timer.timeout.connect(self.model.check_external_changes)
+        self.external_changes_timer.start()
+        self.backup_timer = QTimer(self)
+        self.backup_timer.setInterval(BACKUP_CHECK_MS)
+        self.backup_timer.timeout.connect(self.auto_backup)
+        self.backup_timer.start()
 
         # Configura la ruta según el entorno
         if getattr(sys, 'frozen', False):
@@ -59,15 +141,87 @@ class MainWindow(QMainWindow):
         self.json_folder_path = os.path.join(self.script_directory, "json_folder")
         self.json_file_path = os.path.join(self.json_folder_path, "config.json")
         self.db_folder_path = os.path.join(self.script_directory, "BasesDeDatos")
+        self.backup_store_path = os.path.join(self.script_directory, "Respaldos", "respaldos.db")
 
         # Carga las primeras funciones vitales para el programa
+        self.setup_extra_buttons()
+        self.setup_statusbar()
         self.setup_actions()
-        self.setup_database()
-        if not self.db.isOpen():
-            self.btns_state(False)
+        # Los botones se activan cuando la base de datos termina de abrirse en el hilo de la base de datos
+        self.btns_state(False)
+        self.setup_database(self.database_opened)
+
+
+    def add_menu_button(self, text, tooltip, icon_path):
+        '''Crea un botón en el menu de base de datos con el mismo estilo que los demás'''
+        button = QPushButton(text, self.ui.frame_DB)
+        button.setSizePolicy(self.ui.btn_copy_DB.sizePolicy())
+        button.setMinimumSize(self.ui.btn_copy_DB.minimumSize())
+        button.setFont(self.ui.btn_copy_DB.font())
+        button.setCursor(Qt.PointingHandCursor)
+        button.setToolTip(tooltip)
+        button.setIcon(QIcon(icon_path))
+        self.ui.verticalLayout_3.addWidget(button)
+        return button
+
+
+    def setup_extra_buttons(self):
+        '''Agrega los botones que no forman parte de VentanaPrincipal.py'''
+        self.btn_import_clients = self.add_menu_button("Importar", "Importa clientes desde un archivo CSV o XLSX",
+                                                    ":/imagenes-monk/images/svg/user-add.svg")
+        self.btn_export_DB = self.add_menu_button("Exportar", "Exporta la base de datos o los clientes de la búsqueda "
+                                                "actual a un archivo nuevo sin espacio libre",
+                                                ":/imagenes-monk/images/png/database-copy.png")
+        self.btn_export_table = self.add_menu_button("Exportar tabla", "Exporta los clientes de la tabla (con la búsqueda "
+                                                    "y el orden actuales) a CSV, JSON Lines o XLSX",
+                                                    ":/imagenes-monk/images/png/database-copy.png")
+        self.btn_trash = self.add_menu_button("Papelera", "Clientes eliminados: restaurarlos o eliminarlos definitivamente",
+                                            ":/imagenes-monk/images/svg/user-delete.svg")
+        self.btn_backups = self.add_menu_button("Respaldos", "Respaldos automáticos de la base de datos: "
+                                                "respaldar ahora o restaurar un respaldo",
+                                                ":/imagenes-monk/images/svg/database-select.svg")
+        # Botón de búsqueda avanzada debajo de la búsqueda por fecha y con su mismo estilo
+        self.btn_advanced_search = QPushButton("Búsqueda avanzada", self.ui.frame_busqueda)
+        self.btn_advanced_search.setSizePolicy(self.ui.btn_search_date.sizePolicy())
+        self.btn_advanced_search.setMinimumSize(self.ui.btn_search_date.minimumSize())
+        self.btn_advanced_search.setFont(self.ui.btn_search_date.font())
+        self.btn_advanced_search.setCursor(Qt.PointingHandCursor)
+        self.btn_advanced_search.setToolTip("Combina nombre, observaciones, rango de fechas y rango de edades")
+        self.btn_advanced_search.setIcon(QIcon(":/imagenes-monk/images/svg/user-search.svg"))
+        self.ui.verticalLayout_2.addWidget(self.btn_advanced_search)
+
+
+    def setup_statusbar(self):
+        '''Muestra en la barra de estado cuando el hilo de la base de datos está ocupado'''
+        self.busy_indicator.setRange(0, 0) # Barra en movimiento sin porcentaje
+        self.busy_indicator.setMaximumWidth(120)
+        self.busy_indicator.setMaximumHeight(14)
+        self.busy_indicator.setTextVisible(False)
+        self.busy_indicator.hide()
+        # Widgets permanentes para no reemplazar los avisos de showMessage (por ejemplo, del perfil de PRAGMA)
+        self.ui.statusbar.addPermanentWidget(self.cache_label)
+        self.ui.statusbar.addPermanentWidget(self.busy_label)
+        self.ui.statusbar.addPermanentWidget(self.busy_indicator)
+        self.worker.busy_changed.connect(self.show_busy)
+        self.model.cache_changed.connect(self.show_cache)
+        self.model.edit_failed.connect(lambda error: QMessageBox.warning(self, "Error al editar cliente", error))
+        self.worker.failed.connect(lambda error: QMessageBox.warning(self, "Error en la base de datos", error))
+
+
+    def show_busy(self, description):
+        '''Muestra la tarea en curso del hilo de la base de datos ("" cuando termina)'''
+        self.busy_indicator.setVisible(bool(description))
+        self.busy_label.setText(f"{description}..." if description else "")
+
+
+    def show_cache(self):
+        '''Muestra el porcentaje de aciertos y la memoria usada por el caché de resultados'''
+        cache = self.model.cache
+        if not cache.lookups:
+            self.cache_label.setText("")
             return
-        self.setup_model()
-        self.setup_table()
+        self.cache_label.setText(f"Caché: {cache.hit_rate():.0f}% aciertos ({cache.hits}/{cache.lookups}), "
+                                f"{cache.memory() / 1024 / 1024:.1f} MB")
 
 
     def setup_actions(self):
@@ -77,6 +231,11 @@ class MainWindow(QMainWindow):
         self.ui.btn_select_DB.clicked.connect(self.select_db)
         self.ui.btn_copy_DB.clicked.connect(self.copy_db)
         self.ui.btn_delete_DB.clicked.connect(self.delete_db)
+        self.btn_import_clients.clicked.connect(self.import_clients)
+        self.btn_export_DB.clicked.connect(self.export_db)
+        self.btn_export_table.clicked.connect(self.export_table)
+        self.btn_trash.clicked.connect(self.show_trash)
+        self.btn_backups.clicked.connect(self.show_backups)
         # Acciones cliente
         self.ui.btn_add_client.clicked.connect(self.add_client)
         self.ui.in_nombre.returnPressed.connect(self.add_client)
@@ -87,7 +246,9 @@ class MainWindow(QMainWindow):
         # Acciones de busqueda
         self.ui.btn_search_name.clicked.connect(lambda: self.search("name"))
         self.ui.in_search_name.returnPressed.connect(lambda: self.search("name"))
+        self.ui.in_search_name.textEdited.connect(lambda: self.search_timer.start()) # Reinicia la espera
         self.ui.btn_search_date.clicked.connect(lambda: self.search("date"))
+        self.btn_advanced_search.clicked.connect(self.advanced_search)
         # Acciones de la tabla
         self.ui.btn_reset_table.clicked.connect(self.reset_table)
         self.ui.comboBox_order.currentIndexChanged.connect(lambda: self.sort_box("order"))
@@ -113,13 +274,20 @@ class MainWindow(QMainWindow):
 
         self.ui.btn_copy_DB.setEnabled(state)
         self.ui.btn_delete_DB.setEnabled(state)
+        self.btn_import_clients.setEnabled(state)
+        self.btn_export_DB.setEnabled(state)
+        self.btn_export_table.setEnabled(state)
+        self.btn_trash.setEnabled(state)
+        self.btn_backups.setEnabled(state)
 
 
-    def setup_database(self):
-        ''' Configurar la conexión a la base de datos'''
+    def setup_database(self, callback=None, error_callback=None):
+        ''' Configurar la conexión a la base de datos. Las migraciones se aplican en el hilo de la
+        base de datos: "callback()" se llama cuando ya se puede usar y "error_callback(excepción)" si
+        no se pudo actualizar. Devuelve False si config.json no indica una base de datos válida.'''
         if not os.path.exists(self.json_file_path): # Verifica si la ruta en "json_file_path" existe
             self.ui.lbl_db_path.setText('<span style="color: red;"><b>Crea o selecciona una base de datos para continuar.</b></span>')
-            return
+            return False
         try:
             # Intenta abrir el archivo "json_file_path" en modo lectura ("r" de read)
             with open(self.json_file_path, "r", encoding="utf-8") as json_read:
@@ -127,45 +295,161 @@ class MainWindow(QMainWindow):
         except json.decoder.JSONDecodeError:
             # Manejar la excepción cuando el archivo JSON existe pero su lectura es invalida
             self.ui.lbl_db_path.setText("El archivo JSON está vacío o corrompido.")
-            return
-        # Verificar si el JSON tiene la clave "last_selected_db"
-        if not "last_selected_db" in json_file:
-            self.ui.lbl_db_path.setText("El archivo JSON no contiene la palabra clave 'last_selected_db'.")
-            return
+            return False
+        # Perfil de PRAGMA (journal_mode, synchronous, etc.) usado por todas las conexiones
+        self.apply_pragma_profile(json_file.get("pragma_profile", DEFAULT_PRAGMA_PROFILE))
+        # Verificar si el JSON tiene la clave "last_selected_db" (se quita al eliminar la base de datos)
+        if not json_file.get("last_selected_db"):
+            self.ui.lbl_db_path.setText('<span style="color: red;"><b>Crea o selecciona una base de datos para continuar.</b></span>')
+            return False
         last_selected_db = json_file["last_selected_db"] # Se guarda la ruta actual de la base de datos en el archivo JSON
         # Comprueba que la base de datos especificada en el archivo JSON exista y sea una base de datos valida
         if not last_selected_db or not os.path.exists(last_selected_db) or not last_selected_db.endswith(".db"):
             self.ui.lbl_db_path.setText("Error al cargar la base de datos, verifica que la ruta y la base de datos sea valida.<br> <b>Ruta actual:</b><br>" + last_selected_db)
-            return
-        # Se establece la conexión con la base de datos
-        self.db.setDatabaseName(last_selected_db) # Establece el nombre de la base de datos
-        self.db.open() # Abre la conexion de la base de datos
-        # Se establecen las etiquetas de la base de datos y la tabla
-        self.ui.lbl_db_path.setText(os.path.basename(self.db.databaseName()).replace(".db", ""))
-        self.ui.lbl_table_order.setText("<b>Orden de la tabla:  </b>Añadido (\u2193)")
-        self.ui.lbl_table_filter.setText(" ")
+            return False
+
+        def migrated():
+            # La conexión ya quedó abierta (y configurada con el perfil de PRAGMA) al aplicar las migraciones
+            self.database_path = last_selected_db
+            # Se establecen las etiquetas de la base de datos y la tabla
+            self.ui.lbl_db_path.setText(os.path.basename(self.database_path).replace(".db", ""))
+            self.ui.lbl_table_order.setText("<b>Orden de la tabla:  </b>Añadido (\u2193)")
+            self.ui.lbl_table_filter.setText(" ")
+            if callback is not None:
+                callback()
+
+        def failed(error):
+            self.ui.lbl_db_path.setText(f"Error al actualizar la base de datos: {error}")
+            if error_callback is not None:
+                error_callback(error)
+
+        # Crea la tabla si no existe y aplica las migraciones pendientes del esquema
+        self.ui.lbl_db_path.setText("Abriendo la base de datos...")
+        self.migrate_database(last_selected_db, migrated, failed)
+        return True
+
+
+    def database_opened(self):
+        '''Muestra la tabla de la base de datos que se acaba de abrir y activa los botones'''
+        self.setup_model()
+        self.setup_table()
+        self.btns_state(True)
+        profile = connection_manager.profile_for(self.database_path)
+        if profile != connection_manager.profile:
+            self.ui.statusbar.showMessage(f"La base de datos está en una carpeta de red, donde el perfil "
+                                        f"'{connection_manager.profile}' (WAL) no es seguro. Se usa el perfil '{profile}'.")
+
+
+    def read_config(self):
+        '''Lee el archivo config.json (devuelve un diccionario vacío si no existe o está dañado)'''
+        try:
+            with open(self.json_file_path, "r", encoding="utf-8") as json_read:
+                json_file = json.load(json_read)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+        return json_file if isinstance(json_file, dict) else {}
+
+
+    def write_config(self, json_config):
+        '''Guarda el diccionario en el archivo config.json'''
+        # Crear el folder JSON si no existe
+        if not os.path.exists(self.json_folder_path):
+            os.makedirs(self.json_folder_path)
+        with open(self.json_file_path, "w", encoding="utf-8") as json_write:
+            json.dump(json_config, json_write, indent=4) # json.dump(que, donde)
+
+
+    def apply_pragma_profile(self, profile):
+        '''Aplica el perfil de PRAGMA de config.json (o el predeterminado si no es válido)'''
+        try:
+            connection_manager.set_profile(profile)
+        except ValueError as e:
+            connection_manager.set_profile(DEFAULT_PRAGMA_PROFILE)
+            self.ui.statusbar.showMessage(f"{e} Se usa el perfil '{DEFAULT_PRAGMA_PROFILE}'.")
+
+
+    def migrate_database(self, database_path, callback, error_callback):
+        '''Actualiza el esquema de la base de datos en el hilo de la base de datos mostrando el avance
+        si hay migraciones pendientes. Al terminar se llama "callback()" o "error_callback(excepción)".'''
+        texts = {} # {migraciones aplicadas: texto de la migración en curso} (lo escribe el hilo de la base de datos)
+
+        def migrate(progress):
+            def migration_progress(done, total, description):
+                # migrate() también la llama periódicamente durante cada migración, solo se avisan los cambios
+                if done not in texts:
+                    texts[done] = f"{description} ({done + 1}/{total})" if done < total else description
+                    progress(done, total)
+            return create_db_connection(database_path, migration_progress)
+
+        def finished(_, error, __):
+            if error is not None:
+                error_callback(error)
+                return
+            callback()
+            if texts: # Se aplicaron migraciones: se avisa si quedaron fechas que no se pudieron convertir
+                self.worker.submit(invalid_dates_connection, database_path, callback=show_invalid_dates,
+                                error_callback=lambda e: self.ui.statusbar.showMessage(str(e), 10000))
+
+        def show_invalid_dates(invalid):
+            if invalid:
+                QMessageBox.warning(self, "Fechas no convertidas",
+                                    f"<b>{invalid}</b> cliente(s) tienen una fecha que no se pudo reconocer "
+                                    "(se esperaba dd/mm/aaaa).<br><br>Esos clientes no aparecen en las búsquedas por fecha ni se "
+                                    "ordenan correctamente hasta corregir su fecha.")
+
+        # Sin migraciones pendientes termina antes de MIGRATION_DIALOG_MS y el diálogo no se llega a mostrar
+        self.run_with_progress("Actualizar base de datos", "Actualizando la base de datos", migrate, finished,
+                            cancelable=False, minimum_duration=MIGRATION_DIALOG_MS, label=texts.get)
+
+
+    def run_with_progress(self, title, description, task, on_done, cancelable=True, minimum_duration=0, label=None):
+        '''Ejecuta "task(progress)" en el hilo de la base de datos mostrando su avance en un QProgressDialog.
+        La tarea llama progress(hechos, total), que actualiza la barra y devuelve False si se canceló.
+        Al terminar se cierra el diálogo y se llama on_done(resultado, error, cancelada) (error None si no
+        falló). "label(hechos)" devuelve el texto del diálogo para cada avance (None conserva el anterior).'''
+        progress_dialog = QProgressDialog(f"{description}...", "Cancelar" if cancelable else None, 0, 1, self)
+        progress_dialog.setWindowTitle(title)
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(minimum_duration)
+        canceled = threading.Event()
+        progress_dialog.canceled.connect(canceled.set)
+
+        def progress(done, total):
+            # Se ejecuta en el hilo de la base de datos, la barra se actualiza con la señal del hilo
+            self.worker.report_progress(done, total)
+            return not canceled.is_set()
+
+        def show_progress(done, total):
+            text = label(done) if label is not None else None
+            if text is not None:
+                progress_dialog.setLabelText(text)
+            progress_dialog.setMaximum(max(total, done, 1))
+            progress_dialog.setValue(done)
+
+        def finished(result=None, error=None):
+            self.worker.progress_changed.disconnect(show_progress)
+            was_canceled = canceled.is_set() # Antes de cerrar el diálogo (al cerrarse emite "canceled")
+            progress_dialog.close()
+            on_done(result, error, was_canceled)
+
+        self.worker.progress_changed.connect(show_progress)
+        self.worker.submit(task, progress, description=description,
+                        callback=finished, error_callback=lambda e: finished(error=e))
 
 
     def setup_model(self):
         '''Establece el modelo'''
-        # Selecciona la tabla a usar
-        self.model.setTable("clientes")
+        # Selecciona la base de datos a usar (sin filtro ni orden de búsqueda)
+        self.model.set_database(self.database_path)
         # Establece  en el modelo la columna 0 (id) como orden descendente
         self.model.setSort(0, Qt.DescendingOrder)
         self.current_order = Qt.DescendingOrder
         # Establece la etiqueta del filtro en Añadido (id)
         self.ui.comboBox_order.setCurrentText("Añadido")
-        # Establece el titulo de las columnas
-        self.model.setHeaderData(0, Qt.Horizontal, "ID")
-        self.model.setHeaderData(1, Qt.Horizontal, "Nombre")
-        self.model.setHeaderData(2, Qt.Horizontal, "Edad")
-        self.model.setHeaderData(3, Qt.Horizontal, "OI")
-        self.model.setHeaderData(4, Qt.Horizontal, "OD")
-        self.model.setHeaderData(5, Qt.Horizontal, "ADD")
-        self.model.setHeaderData(6, Qt.Horizontal, "Observs")
-        self.model.setHeaderData(7, Qt.Horizontal, "Fecha")
-        # Establece la configuración previa del modelo
-        self.model.select()
+        # Establece la configuración previa del modelo (los títulos de las columnas los define el modelo)
+        # y ajusta el ancho de las columnas cuando se lee la primera página
+        self.model.select(self.fit_columns)
+        self.purge_old_trash()
 
 
     def setup_table(self):
@@ -176,45 +460,104 @@ class MainWindow(QMainWindow):
         self.ui.tableView.raise_()
         # Establece el modo de selección de la tabla para permitir seleccion de multiples filas y columnas
         self.ui.tableView.setSelectionMode(QAbstractItemView.ExtendedSelection)
-        # Para las demás columnas, define un ajuste de contenido
+        # Para las demás columnas el ancho lo pone fit_columns y el usuario lo puede cambiar
+        # (ResizeToContents mediría el texto de todas las filas cada vez que cambia el modelo)
         for col in range(1, 7):
-            self.ui.tableView.horizontalHeader().setSectionResizeMode(col, QHeaderView.ResizeToContents)
+            self.ui.tableView.horizontalHeader().setSectionResizeMode(col, QHeaderView.Interactive)
         self.ui.tableView.horizontalHeader().setSectionResizeMode(7, QHeaderView.Stretch)
+        # Todas las filas tienen la misma altura, así la tabla no mide cada fila para acomodarlas
+        self.ui.tableView.setWordWrap(False)
+        self.ui.tableView.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.ui.tableView.verticalHeader().setDefaultSectionSize(self.ui.tableView.fontMetrics().height() + 8)
+        # La fecha se guarda como yyyy-MM-dd pero se muestra como dd/MM/yyyy
+        self.ui.tableView.setItemDelegateForColumn(7, self.date_delegate)
         # Ocultar la columna 0 (columna del id)
         self.ui.tableView.setColumnHidden(0, True)
 
 
-    def switch_to_new_db(self, new_db, message="Conectar"):
-        '''Hace las configuraciones necesarias para conectar a una nueva base de datos'''
+    def fit_columns(self):
+        '''Ajusta el ancho de las columnas 1 a 6 con los anchos guardados en config.json para
+        esta base de datos o, si no hay, con el texto más ancho de las primeras
+        COLUMN_SAMPLE_ROWS filas ya leídas (no se leen filas nuevas para medirlas)'''
+        if self.database_path is None:
+            return
+        saved = self.read_config().get("column_widths", {}).get(os.path.abspath(self.database_path), {})
+        self.fitting_columns = True
         try:
-            # Crear el folder JSON si no existe
-            if not os.path.exists(self.json_folder_path):
-                os.makedirs(self.json_folder_path)
+            if saved:
+                for col, width in saved.items():
+                    if 1 <= int(col) <= 6:
+                        self.ui.tableView.setColumnWidth(int(col), int(width))
+                return
+            rows = self.model.loaded_rows(COLUMN_SAMPLE_ROWS)
+            header_metrics = self.ui.tableView.horizontalHeader().fontMetrics()
+            metrics = self.ui.tableView.fontMetrics()
+            for col in range(1, 7):
+                width = max([header_metrics.horizontalAdvance(CLIENT_HEADERS[col])] +
+                            [metrics.horizontalAdvance(str(row[col])) for row in rows if row[col] is not None])
+                self.ui.tableView.setColumnWidth(col, min(width + COLUMN_PADDING, MAX_COLUMN_WIDTH))
+        finally:
+            self.fitting_columns = False
 
-            # Guardar el último nombre de la base de datos en el archivo JSON
-            with open(self.json_file_path, "w", encoding="utf-8") as json_write:
-                json_config = {"last_selected_db": new_db}
-                json.dump(json_config, json_write) # json.dump(que, donde)
 
-            # Operaciones críticas que podrían fallar
-            self.db.close()
-            self.setup_database()
-            self.setup_model()
-            self.setup_table()
-            if not self.db.isOpen():
-                raise RuntimeError(f"Error al intentar abrir la base de datos: {new_db}")
-            return True
+    def column_resized(self, column, old_width, new_width): # pylint: disable=unused-argument
+        '''Anota que el usuario cambió el ancho de una columna (se guarda con save_column_widths)'''
+        if not self.fitting_columns and 1 <= column <= 6:
+            self.columns_resized = True
 
-        except (AttributeError, TypeError, FileNotFoundError, PermissionError, OSError, RuntimeError) as ex:
+
+    def save_column_widths(self):
+        '''Guarda en config.json los anchos de columna que cambió el usuario para la base de datos abierta'''
+        if not self.columns_resized or self.database_path is None:
+            return
+        self.columns_resized = False
+        json_config = self.read_config()
+        widths = json_config.get("column_widths")
+        if not isinstance(widths, dict):
+            widths = json_config["column_widths"] = {}
+        widths[os.path.abspath(self.database_path)] = {str(col): self.ui.tableView.columnWidth(col)
+                                                        for col in range(1, 7)}
+        self.write_config(json_config)
+
+
+    def switch_to_new_db(self, new_db, message="Conectar", callback=None):
+        '''Hace las configuraciones necesarias para conectar a una nueva base de datos.
+        La base de datos se abre en el hilo de la base de datos, "callback()" se llama cuando ya se usa.'''
+        def failed(ex):
             # Manejo de excepciones
             QMessageBox.warning(self, f"Error al {message} la base de datos",
                                 f"Ocurrió un error al {message} la base de datos.\n\nError: '{type(ex).__name__} - {ex}'")
-            return False
+
+        def opened():
+            self.database_opened()
+            if callback is not None:
+                callback()
+
+        try:
+            self.save_column_widths() # Anchos de columna de la base de datos anterior
+            # Guardar el último nombre de la base de datos en el archivo JSON (conservando las demás opciones)
+            json_config = self.read_config()
+            json_config["last_selected_db"] = new_db
+            self.write_config(json_config)
+
+            # Operaciones críticas que podrían fallar
+            self.worker.cancel() # Cancela las lecturas de la base de datos anterior
+            self.worker.wait_idle() # y espera las escrituras antes de cerrar su conexión
+            self.cancel_background_tasks() # Un respaldo o vaciado de la papelera en curso también usa la conexión
+            connection_manager.close(self.database_path) # Cierra las conexiones persistentes anteriores
+            self.database_path = None
+            self.model.clear()
+            self.btns_state(False)
+            if not self.setup_database(opened, failed):
+                raise RuntimeError(f"Error al intentar abrir la base de datos: {new_db}")
+
+        except (AttributeError, TypeError, FileNotFoundError, PermissionError, OSError, RuntimeError) as ex:
+            failed(ex)
 
 
     def create_db(self):
         '''Establece la conexion, modelo, tabla y etiqueta de la nueva base de datos'''
-        actual_db_dir = os.path.dirname(self.db.databaseName())
+        actual_db_dir = os.path.dirname(self.database_path or "")
         # comprueba en que carpeta se encuentra la base de datos actual
         if actual_db_dir:
             destination_folder = actual_db_dir
@@ -236,17 +579,13 @@ class MainWindow(QMainWindow):
         if not new_db_name.lower().endswith(".db"):
             # Se agrega al final la extensión ".db" en caso de no existir
             new_db_name += ".db"
-        try:
-            # Llamar a la función dentro del archivo conexion.py para crear la nueva base de datos 
-            create_db_connection(new_db_name)
-        except RuntimeError as e:
-            QMessageBox.warning(self, "Error al crear base de datos", str(e))
-            return
-        if not self.switch_to_new_db(new_db_name, message="crear"):
-            return
-        self.btns_state(True)
-        QMessageBox.information(self, "Éxito al crear",
-                                f"La nueva base de datos fue creada con éxito.<br><br>Ahora trabajas con la base de datos: <b>{os.path.basename(self.db.databaseName()).replace(".db", "")}</b>")
+        # Llamar a la función dentro del archivo conexion.py para crear la nueva base de datos
+        # (en el hilo de la base de datos) y después conectarse a ella
+        self.worker.submit(create_db_connection, new_db_name, description="Creando la base de datos",
+                        callback=lambda _: self.switch_to_new_db(new_db_name, message="crear", callback=lambda:
+                            QMessageBox.information(self, "Éxito al crear",
+                                f"La nueva base de datos fue creada con éxito.<br><br>Ahora trabajas con la base de datos: <b>{os.path.basename(self.database_path).replace(".db", "")}</b>")),
+                        error_callback=lambda e: QMessageBox.warning(self, "Error al crear base de datos", str(e)))
 
 
     def select_db(self):
@@ -254,7 +593,7 @@ class MainWindow(QMainWindow):
         options_config = QFileDialog.Options()
         # Operador "bitwise OR" indica que el cuadro de diálogo debe abrirse en modo de solo lectura
         options_config |= QFileDialog.ReadOnly
-        actual_db_dir = os.path.dirname(self.db.databaseName())
+        actual_db_dir = os.path.dirname(self.database_path or "")
         destination_folder = actual_db_dir if actual_db_dir else self.db_folder_path
         selected_db, _ = QFileDialog.getOpenFileName(self,
                                                     "Seleccionar base de datos",
@@ -267,11 +606,9 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Error al seleccionar",
                                     "Error al seleccionar, verifique que el archivo seleccionado sea una base de datos valida.")
             return
-        if not self.switch_to_new_db(selected_db, message="seleccionar"):
-            return
-        self.btns_state(True)
-        QMessageBox.information(self, "Éxito al seleccionar",
-                                f"La nueva base de datos fue seleccionada con éxito.<br><br>Ahora trabajas con la base de datos: <b>{os.path.basename(self.db.databaseName()).replace(".db", "")}</b>")
+        self.switch_to_new_db(selected_db, message="seleccionar", callback=lambda:
+            QMessageBox.information(self, "Éxito al seleccionar",
+                                    f"La nueva base de datos fue seleccionada con éxito.<br><br>Ahora trabajas con la base de datos: <b>{os.path.basename(self.database_path).replace(".db", "")}</b>"))
 
 
     def show_confirmation_dialog(self, title="titulo_SCD", message="mensaje_SCD", yes_text="Sí", no_text="No"):
@@ -291,7 +628,7 @@ class MainWindow(QMainWindow):
 
     def copy_db(self):
         '''Función usada para copiar la base de datos actual'''
-        if not self.db.isOpen() or not os.path.exists(self.db.databaseName()):
+        if self.database_path is None or not os.path.exists(self.database_path):
             QMessageBox.warning(self, "Error de conexión",
                                 "No hay ninguna base de datos abierta para copiar.")
             return
@@ -299,7 +636,7 @@ class MainWindow(QMainWindow):
         options_config |= QFileDialog.ReadOnly
         original_name = self.ui.lbl_db_path.text() # Obtiene el nombre actual de la base de datos
         copy_name = f"{original_name}-copia.db"
-        actual_db_dir = os.path.dirname(self.db.databaseName())
+        actual_db_dir = os.path.dirname(self.database_path or "")
         destination_folder = actual_db_dir if actual_db_dir else self.db_folder_path
         new_db, _ = QFileDialog.getSaveFileName(self,
                                                 "Guardar copia de la base de datos",
@@ -309,15 +646,26 @@ class MainWindow(QMainWindow):
         if not new_db:
             return
         # Verifica si el usuario está intentando guardar la copia con el mismo nombre que la base de datos original
-        if os.path.abspath(new_db) == os.path.abspath(self.db.databaseName()):
+        if os.path.abspath(new_db) == os.path.abspath(self.database_path):
             QMessageBox.warning(self, "Error al copiar", "No se puede reemplazar la base de datos original con una copia idéntica.")
             return
-        try:
-            # Realizar la copia de la base de datos en la nueva ubicación
-            shutil.copy2(self.db.databaseName(), new_db) # shutil.copy2 copia tambien los metadatos
-        except (FileNotFoundError, PermissionError, IsADirectoryError, OSError) as ex:
-            QMessageBox.warning(self, "Error al copiar la base de datos", f"Ocurrió un error al copiar la base de datos.\n\nError: '{type(ex).__name__} - {ex}'")
-            return
+        # La copia se hace por pasos en el hilo de la base de datos (incluye los cambios del archivo -wal)
+        database_path = self.database_path
+
+        def finished(completed, error, _):
+            if error is not None:
+                QMessageBox.warning(self, "Error al copiar la base de datos", f"Ocurrió un error al copiar la base de datos.\n\nError: '{type(error).__name__} - {error}'")
+            elif not completed:
+                QMessageBox.information(self, "Copia cancelada", "La copia fue cancelada, no se creó ningún archivo.")
+            else:
+                self.copy_finished(new_db, original_name)
+
+        self.run_with_progress("Copiar base de datos", "Copiando la base de datos",
+                            lambda progress: copy_db_connection(database_path, new_db, progress), finished)
+
+
+    def copy_finished(self, new_db, original_name):
+        '''Pregunta si se continúa con la copia recién creada o con la base de datos original'''
         new_db_name = os.path.basename(new_db).replace(".db", "")
         if not self.show_confirmation_dialog(title="Copia exitosa",
                                     message=f"Copia creada exitosamente.<br><br> ¿Deseas cambiar la conexion a la nueva copia creada <b>{new_db_name}</b> o seguir trabajando con la base de datos actual <b>{original_name}</b>?",
@@ -325,16 +673,224 @@ class MainWindow(QMainWindow):
                                     no_text="Original"):
             QMessageBox.information(self, "Correcto", "Sigues trabajando con la base de datos original.")
             return
-        self.switch_to_new_db(new_db, "seleccionar")
-        QMessageBox.information(self, "Correcto", f"Ahora trabajas con la nueva copia creada: <b>{new_db_name}</b>.")
+        self.switch_to_new_db(new_db, "seleccionar", callback=lambda:
+            QMessageBox.information(self, "Correcto", f"Ahora trabajas con la nueva copia creada: <b>{new_db_name}</b>."))
+
+
+    def export_db(self):
+        '''Exporta a un archivo nuevo y desfragmentado la base de datos completa o, si hay una
+        búsqueda activa, solo los clientes encontrados (por ejemplo, los de un rango de fechas)'''
+        if self.database_path is None or not os.path.exists(self.database_path):
+            QMessageBox.warning(self, "Error de conexión",
+                                "No hay ninguna base de datos abierta para exportar.")
+            return
+        where, parameters = None, ()
+        if self.model.filter is not None and self.show_confirmation_dialog(
+                title="Exportar base de datos",
+                message=f"¿Deseas exportar solo los <b>{self.model.rowCount()}</b> cliente(s) de la búsqueda "
+                        "actual o la base de datos completa?",
+                yes_text="Búsqueda actual",
+                no_text="Base de datos completa"):
+            where, parameters = self.model.filter, self.model.filter_parameters
+        original_name = self.ui.lbl_db_path.text()
+        new_db, _ = QFileDialog.getSaveFileName(self,
+                                                "Exportar base de datos",
+                                                os.path.join(os.path.dirname(self.database_path),
+                                                            f"{original_name}-exportada.db"),
+                                                "Archivos de base de datos (*.db);;Todos los archivos (*)")
+        if not new_db:
+            return
+        if os.path.abspath(new_db) == os.path.abspath(self.database_path):
+            QMessageBox.warning(self, "Error al exportar", "No se puede reemplazar la base de datos abierta con la exportación.")
+            return
+        # VACUUM INTO no informa cuánto falta, la barra solo indica que sigue trabajando
+        progress_dialog = QProgressDialog("Exportando la base de datos...", "Cancelar", 0, 0, self)
+        progress_dialog.setWindowTitle("Exportar base de datos")
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.show() # Sin llamadas a setValue no se mostraría
+        canceled = threading.Event()
+        progress_dialog.canceled.connect(canceled.set)
+
+        def finished(exported=None, error=None):
+            progress_dialog.close()
+            if error is not None:
+                QMessageBox.warning(self, "Error al exportar la base de datos", str(error))
+            elif exported is None:
+                QMessageBox.information(self, "Exportación cancelada", "La exportación fue cancelada, no se creó ningún archivo.")
+            else:
+                size = os.path.getsize(new_db) / 1024 / 1024
+                QMessageBox.information(self, "Exportación terminada",
+                                        f"Se exportaron <b>{exported}</b> cliente(s) a "
+                                        f"<b>{os.path.basename(new_db)}</b> ({size:.1f} MB).")
+
+        self.worker.submit(export_db_connection, self.database_path, new_db, where, parameters,
+                        lambda: not canceled.is_set(), description="Exportando la base de datos",
+                        callback=finished, error_callback=lambda e: finished(error=e))
+
+
+    def export_table(self):
+        '''Exporta los clientes de la tabla, con la búsqueda y el orden actuales, a CSV, JSON Lines o XLSX.
+        Las filas se leen y se escriben por partes en el hilo de la base de datos.'''
+        if self.database_path is None or not os.path.exists(self.database_path):
+            QMessageBox.warning(self, "Error de conexión",
+                                "No hay ninguna base de datos abierta para exportar.")
+            return
+        file_types = dict(zip(("CSV (*.csv)", "JSON Lines (*.jsonl)", "Excel (*.xlsx)"), EXPORT_FORMATS))
+        file_path, selected_type = QFileDialog.getSaveFileName(self,
+                                                "Exportar tabla",
+                                                os.path.join(os.path.dirname(self.database_path),
+                                                            f"{self.ui.lbl_db_path.text()}-clientes.csv"),
+                                                ";;".join(file_types))
+        if not file_path:
+            return
+        if os.path.splitext(file_path)[1].lower() not in EXPORT_FORMATS:
+            file_path += file_types.get(selected_type, ".csv") # Sin extensión se usa la del tipo de archivo elegido
+        total, rows = self.model.rowCount(), self.model.iter_rows()
+
+        def finished(exported, error, _):
+            if error is not None:
+                QMessageBox.warning(self, "Error al exportar la tabla", str(error))
+            elif exported is None:
+                QMessageBox.information(self, "Exportación cancelada", "La exportación fue cancelada, no se creó ningún archivo.")
+            else:
+                QMessageBox.information(self, "Exportación terminada",
+                                        f"Se exportaron <b>{exported}</b> cliente(s) a <b>{os.path.basename(file_path)}</b>.")
+
+        self.run_with_progress("Exportar tabla", "Exportando la tabla",
+                            lambda progress: write_clients(file_path, rows, total, progress), finished)
+
+
+    def show_trash(self):
+        '''Muestra los clientes eliminados para restaurarlos o vaciar la papelera'''
+        if self.database_path is None:
+            return
+        def show(trash):
+            dialog = TrashDialog(*trash, self)
+            choice = dialog.exec()
+            if choice == TrashDialog.EMPTY:
+                self.empty_trash()
+            elif choice == QDialog.Accepted and dialog.selected_ids():
+                ids_clients = dialog.selected_ids()
+                # El modelo agrega las filas restauradas con el aviso de cambio de connection_manager
+                self.worker.submit(restore_clients_connection, ids_clients, self.database_path,
+                                description="Restaurando cliente(s)",
+                                callback=lambda restored: QMessageBox.information(self, "Cliente(s) restaurado(s)",
+                                    f"{restored} cliente(s) restaurado(s) correctamente."),
+                                error_callback=lambda e: QMessageBox.warning(self, "Error al restaurar cliente(s)", str(e)))
+        self.worker.submit(list_trash_connection, self.database_path, description="Leyendo la papelera",
+                        callback=show, error_callback=lambda e: QMessageBox.warning(self, "Error en la papelera", str(e)))
+
+
+    def empty_trash(self):
+        '''Elimina definitivamente todos los clientes de la papelera (por bloques en segundo plano)'''
+        if not self.show_confirmation_dialog(title="Vaciar papelera",
+                                    message="Los clientes de la papelera se eliminarán definitivamente.<br><br>¿Deseas continuar?",
+                                    yes_text="Vaciar",
+                                    no_text="Cancelar"):
+            return
+        self.background_worker.submit(purge_trash_connection, self.database_path, None, PURGE_BATCH_SIZE,
+                                    self.background_progress, description="Vaciando la papelera",
+                                    callback=lambda purged: self.ui.statusbar.showMessage(
+                                        f"Papelera vaciada: {purged} cliente(s) eliminado(s) definitivamente.", 5000),
+                                    error_callback=lambda e: QMessageBox.warning(self, "Error al vaciar la papelera", str(e)))
+
+
+    def purge_old_trash(self):
+        '''Elimina definitivamente en segundo plano los clientes que llevan más de TRASH_DAYS días en la papelera'''
+        if self.database_path is None:
+            return
+        self.background_worker.submit(purge_trash_connection, self.database_path,
+                                    datetime.datetime.now() - datetime.timedelta(days=TRASH_DAYS), PURGE_BATCH_SIZE,
+                                    self.background_progress, description="Vaciando la papelera",
+                                    error_callback=lambda e: self.ui.statusbar.showMessage(f"Error al vaciar la papelera: {e}", 10000))
+
+
+    def background_progress(self, *_):
+        '''Función de progreso de las tareas de background_worker (respaldos y vaciado de la papelera).
+        Se ejecuta en ese hilo y devuelve False para detenerlas después de cancel_background_tasks.'''
+        return not self.background_canceled.is_set()
+
+
+    def cancel_background_tasks(self):
+        '''Cancela los respaldos y vaciados de la papelera pendientes o en curso y espera a que
+        background_worker quede libre (se usa antes de cerrar la conexión de la base de datos)'''
+        self.background_canceled.set()
+        self.background_worker.wait_idle()
+        self.background_canceled.clear()
+
+
+    def auto_backup(self):
+        '''Respaldo automático de la base de datos abierta si pasó BACKUP_INTERVAL desde el último'''
+        if self.database_path is None or not self.background_worker.is_idle():
+            return
+        database_name = os.path.basename(self.database_path)
+        def finished(backup_id):
+            if backup_id is not None:
+                self.ui.statusbar.showMessage(f"Respaldo automático de {database_name} guardado.", 5000)
+        self.background_worker.submit(scheduled_backup, self.backup_store_path, self.database_path,
+                                None, BACKUP_INTERVAL, self.background_progress,
+                                description="Respaldando la base de datos", callback=finished,
+                                error_callback=lambda e: self.ui.statusbar.showMessage(f"Error en el respaldo automático: {e}", 10000))
+
+
+    def show_backups(self):
+        '''Muestra los respaldos de la base de datos abierta para respaldar ahora o restaurar uno'''
+        if self.database_path is None or not os.path.exists(self.database_path):
+            QMessageBox.warning(self, "Error de conexión", "No hay ninguna base de datos abierta.")
+            return
+        database_path = self.database_path
+        def show(backups):
+            dialog = BackupDialog(backups, self)
+            choice = dialog.exec()
+            if choice == BackupDialog.BACKUP_NOW:
+                self.backup_now(database_path)
+            elif choice == QDialog.Accepted:
+                self.restore(dialog.selected_backup())
+        self.background_worker.submit(list_backups, self.backup_store_path, database_path,
+                                description="Leyendo los respaldos", callback=show,
+                                error_callback=lambda e: QMessageBox.warning(self, "Error en los respaldos", str(e)))
+
+
+    def backup_now(self, database_path):
+        '''Respalda la base de datos sin esperar al respaldo automático'''
+        def finished(backup_id):
+            if backup_id is None and self.database_path != database_path: # Cancelado por cancel_background_tasks
+                QMessageBox.information(self, "Respaldos", "El respaldo se canceló al cerrar la base de datos.")
+            elif backup_id is None:
+                QMessageBox.information(self, "Respaldos", "La base de datos no cambió desde el último respaldo.")
+            else:
+                QMessageBox.information(self, "Respaldos", "Respaldo guardado correctamente.")
+        self.background_worker.submit(create_backup, self.backup_store_path, database_path, None,
+                                self.background_progress, description="Respaldando la base de datos", callback=finished,
+                                error_callback=lambda e: QMessageBox.warning(self, "Error al respaldar", str(e)))
+
+
+    def restore(self, backup):
+        '''Restaura el respaldo en un archivo nuevo (la base de datos abierta no se modifica)'''
+        backup_id, fecha = backup
+        original_name = self.ui.lbl_db_path.text()
+        new_db, _ = QFileDialog.getSaveFileName(self,
+                                                "Restaurar respaldo",
+                                                os.path.join(os.path.dirname(self.database_path),
+                                                            f"{original_name}-respaldo-{fecha[:13].replace('T', '-')}.db"),
+                                                "Archivos de base de datos (*.db);;Todos los archivos (*)")
+        if not new_db:
+            return
+        if os.path.abspath(new_db) == os.path.abspath(self.database_path):
+            QMessageBox.warning(self, "Error al restaurar", "No se puede reemplazar la base de datos abierta con un respaldo.")
+            return
+        self.background_worker.submit(restore_backup, self.backup_store_path, backup_id, new_db,
+                                description="Restaurando el respaldo",
+                                callback=lambda _: self.copy_finished(new_db, original_name),
+                                error_callback=lambda e: QMessageBox.warning(self, "Error al restaurar", str(e)))
 
 
     def delete_db(self):
         '''Función usada para eliminar la base de datos actual'''
-        if not self.db.isOpen() or not os.path.exists(self.db.databaseName()):
+        if self.database_path is None or not os.path.exists(self.database_path):
             QMessageBox.warning(self, "Advertencia", "No hay ninguna base de datos abierta para eliminar.")
             return
-        current_db_path = self.db.databaseName()
+        current_db_path = self.database_path
         current_db_name = os.path.basename(current_db_path).replace(".db", "")
 
         if not self.show_confirmation_dialog(title="Eliminar base de datos",
@@ -342,24 +898,38 @@ class MainWindow(QMainWindow):
                                     yes_text="Sí",
                                     no_text="No"):
             return
-        self.db.close()
+        self.worker.cancel()
+        self.worker.wait_idle()
+        self.cancel_background_tasks()
+        connection_manager.close(current_db_path) # Libera el archivo antes de eliminarlo
+        self.database_path = None
+        # Limpiar el modelo antes de mover el archivo: aunque falle, el modelo (y la búsqueda periódica de
+        # cambios externos) ya no debe usar esa ruta, o volvería a crear una base de datos vacía
+        self.model.clear()
+        self.btns_state(False)
+        self.ui.lbl_db_path.setText('<span style="color: red;"><b>No existe conexión con ninguna base de datos<br>Crea o selecciona una base de datos para continuar.</b></span>')
+        # La base de datos se mueve a la carpeta TRASH_FOLDER (se puede volver a abrir con "Seleccionar")
+        trash_folder = os.path.join(os.path.dirname(current_db_path), TRASH_FOLDER)
+        trash_path = os.path.join(trash_folder, f"{current_db_name}-{datetime.datetime.now():%Y%m%d-%H%M%S}.db")
         try:
-            # Elimina el archivo de la base de datos si existe
-            if os.path.exists(current_db_path):
-                os.remove(current_db_path)
-            if os.path.exists(self.json_file_path):
-                os.remove(self.json_file_path) # Elimina el archivo JSON
+            os.makedirs(trash_folder, exist_ok=True)
+            # Mueve el archivo de la base de datos y sus archivos temporales (modo WAL) si existen
+            for file_path, suffix in ((current_db_path, ""), (f"{current_db_path}-wal", "-wal"), (f"{current_db_path}-shm", "-shm")):
+                if os.path.exists(file_path):
+                    shutil.move(file_path, trash_path + suffix)
+            # Quita la base de datos eliminada del archivo JSON (conservando las demás opciones)
+            json_config = self.read_config()
+            json_config.pop("last_selected_db", None)
+            json_config.get("column_widths", {}).pop(os.path.abspath(current_db_path), None)
+            self.write_config(json_config)
         except (PermissionError, FileNotFoundError, OSError) as ex:
             QMessageBox.warning(self, 
                                 "Error al eliminar", 
                                 f"Ocurrió un error al tratar de eliminar la base de datos.\n\nError: '{type(ex).__name__} - {ex}'")
             return
-        # Limpiar el modelo
-        self.model.clear()
-        self.btns_state(False)
-        self.ui.lbl_db_path.setText('<span style="color: red;"><b>No existe conexión con ninguna base de datos<br>Crea o selecciona una base de datos para continuar.</b></span>')
         QMessageBox.information(self, "Eliminacion exitosa",
-                                f"La base de datos <b>{current_db_name}</b> se eliminó correctamente.")
+                                f"La base de datos <b>{current_db_name}</b> se eliminó correctamente.<br><br>"
+                                f"Se movió a la carpeta <b>{trash_folder}</b>, desde donde se puede recuperar.")
 
 
     def clear_boxes(self):
@@ -376,7 +946,7 @@ class MainWindow(QMainWindow):
     def add_client(self):
         '''Función usada para agrear un cliente'''
         # No se ha seleccionado ni creado una base de datos.
-        if not self.db.isOpen() or not os.path.exists(self.db.databaseName()):
+        if self.database_path is None or not os.path.exists(self.database_path):
             QMessageBox.information(self, "No existe conexion con una base de datos",
                                     "Debes crear o seleccionar una base de datos para agregar un cliente")
             return
@@ -387,48 +957,86 @@ class MainWindow(QMainWindow):
         od = self.ui.in_od.text()
         adede = self.ui.in_adede.text()
         observaciones = self.ui.in_observaciones.text()
-        fecha = self.ui.in_fecha.date().toString("dd/MM/yyyy")
-        edad = edad.replace(",", "") # Elimina las comas en caso haberlas
-        if not nombre: # Nombre obligatorio
-            QMessageBox.information(self, "Advertencia", "Introduzca un nombre para agregar al cliente.")
-            return
-        if nombre and edad.isdigit(): # Verifica que el campo de edad sea un numero entero sin espacios
-            edad = int(edad)
-        if edad and int(edad) < 0: # Seguridad extra: La edad tiene un rango establecido en el init de 0 a 999
-            QMessageBox.information(self, "Advertencia", "La edad no puede ser un número negativo.")
-            return
-        cliente = (nombre, edad, oi, od, adede, observaciones, fecha)
+        fecha = self.ui.in_fecha.date().toString(Qt.ISODate) # yyyy-MM-dd, ordenable como texto
         try:
-            # Crear una lista con los datos del cliente
-            add_client_connection(cliente, self.db.databaseName())
-        except RuntimeError as e:
-            QMessageBox.warning(self, "Error al agregar cliente", str(e))
+            # Misma validación usada al importar clientes (nombre obligatorio y edad entera positiva)
+            nombre, edad = validate_client(nombre, edad)
+        except ValueError as e:
+            QMessageBox.information(self, "Advertencia", str(e))
             return
-        self.model.select()
+        cliente = (nombre, edad, oi, od, adede, observaciones, fecha)
+        # El modelo recibe el nuevo cliente por el aviso de cambio de connection_manager
+        self.worker.submit(add_client_connection, cliente, self.database_path,
+                        description="Agregando cliente",
+                        callback=lambda _: self.client_added(nombre),
+                        error_callback=lambda e: QMessageBox.warning(self, "Error al agregar cliente", str(e)))
+
+
+    def client_added(self, nombre):
+        '''Limpia el formulario después de guardar el cliente en el hilo de la base de datos'''
         self.clear_boxes()
         QMessageBox.information(self, "Éxito al agregar",
                                 f"El cliente '<b>{nombre}</b>' fue agregado con éxito.")
 
 
+    def import_clients(self):
+        '''Importa clientes desde un archivo CSV o XLSX por bloques mostrando el progreso'''
+        if self.database_path is None or not os.path.exists(self.database_path):
+            QMessageBox.information(self, "No existe conexion con una base de datos",
+                                    "Debes crear o seleccionar una base de datos para importar clientes")
+            return
+        file_path, _ = QFileDialog.getOpenFileName(self,
+                                                "Importar clientes",
+                                                os.path.dirname(self.database_path or ""),
+                                                "Archivos de clientes (*.csv *.xlsx);;CSV (*.csv);;Excel (*.xlsx)")
+        if not file_path:
+            return
+        errors = [] # Filas omitidas por no pasar la validación (se llena en el hilo de la base de datos)
+        database_path = self.database_path
+        # El archivo se cuenta, se lee y se importa por bloques en el hilo de la base de datos
+        def import_file(progress):
+            total_rows = count_rows(file_path) # Aproximado, la barra crece si el archivo tiene más filas
+            progress(0, total_rows)
+            return import_clients_connection(read_clients(file_path, errors), database_path,
+                                            progress=lambda imported: progress(imported + len(errors), total_rows))
+
+        def finished(imported, error, was_canceled):
+            if error is not None:
+                QMessageBox.warning(self, "Error al importar clientes", str(error))
+                return
+            message = f"Se importaron <b>{imported}</b> cliente(s)."
+            if was_canceled:
+                message += "<br>La importación fue cancelada, los clientes anteriores a la cancelación se conservaron."
+            if errors:
+                details = "<br>".join(f"Fila {line}: {error}" for line, error in errors[:10])
+                message += f"<br><br>Se omitieron {len(errors)} fila(s) inválida(s):<br>{details}"
+            QMessageBox.information(self, "Importación terminada", message)
+
+        self.run_with_progress("Importar clientes", "Importando clientes", import_file, finished)
+
+
     def edit_client(self):
         '''Función usada para editar un cliente'''
-        if not self.db.databaseName():
+        if self.database_path is None:
             QMessageBox.warning(self, "Advertencia", "Seleccione una base de datos antes de editar un cliente.")
             return
-        # Obtener los índices de las filas seleccionadas en la tabla
-        selected_indexes = self.ui.tableView.selectionModel().selectedIndexes()
-        if not selected_indexes:
+        # Obtener los rangos de filas seleccionadas en la tabla (sin crear un índice por cada celda)
+        selection = self.ui.tableView.selectionModel().selection()
+        if selection.isEmpty():
             QMessageBox.information(self, "Advertencia", "Selecciona un cliente en la tabla para editarlo.<br><br>También puedes editar los datos directamente en la tabla.")
             return
         # Obtener filas unicas, crea un conjunto de las filas donde no permite duplicados (set() es lo mismo que usar {})
-        unique_selected_rows = {index.row() for index in selected_indexes} # {} crea un conjunto unico de las filas
-        if len(unique_selected_rows) > 1: # Si se selecciona mas de una fila (cliente)
+        unique_selected_rows = {(selection_range.top(), selection_range.bottom()) for selection_range in selection}
+        if len(unique_selected_rows) > 1 or selection[0].top() != selection[0].bottom(): # Si se selecciona mas de una fila (cliente)
             QMessageBox.information(self, "Advertencia", "Solo se puede editar un cliente a la vez.<br><br>También puedes editar los datos directamente en la tabla.")
             return
         # Obtener la fila seleccionada (sabemos que hay solo una fila)
-        selected_row = unique_selected_rows.pop()
+        selected_row = selection[0].top()
         # Obtener los datos del clientes seleccionado
         id_cliente = self.model.index(selected_row, 0).data()
+        if id_cliente is None: # Su página ya no está en memoria, se acaba de pedir al hilo de la base de datos
+            QMessageBox.information(self, "Advertencia", "El cliente seleccionado aún se está cargando, inténtalo de nuevo en un momento.")
+            return
         nombre = self.model.index(selected_row, 1).data()
         edad = self.model.index(selected_row, 2).data()
         oi = self.model.index(selected_row, 3).data()
@@ -438,29 +1046,48 @@ class MainWindow(QMainWindow):
         fecha = self.model.index(selected_row, 7).data()
         client_data = (id_cliente, nombre, edad, oi, od, adede, observaciones, fecha)
         # Crear una instancia del diálogo de edición y pasar la instancia de MainWindow
-        dialog = EditDialog(self, client_data, self.db.databaseName())
-        try:
-            if dialog.exec_() == QDialog.Accepted:
-                # Actualizar el modelo de la tabla para reflejar los cambios
-                self.model.select()
-                QMessageBox.information(self, "Edición exitosa", f"Los cambios realizados en el cliente '<b>{dialog.updated_name}</b>' fueros realizados correctamente.")
-        except RuntimeError as e:
-            QMessageBox.warning(self, "Error al agregar cliente", str(e))
-            return
+        dialog = EditDialog(self, client_data, self.database_path)
+        if dialog.exec_() == QDialog.Accepted:
+            # El modelo actualiza la fila editada con el aviso de cambio de connection_manager
+            QMessageBox.information(self, "Edición exitosa", f"Los cambios realizados en el cliente '<b>{dialog.updated_name}</b>' fueros realizados correctamente.")
 
     def delete_client(self):
         '''Función usada para eliminar un cliente'''
-        if not self.db.databaseName():
+        if self.database_path is None:
             QMessageBox.warning(self, "Advertencia", "Seleccione una base de datos antes de eliminar un cliente.")
             return
-        selected_indexes = self.ui.tableView.selectionModel().selectedIndexes()
-        if not selected_indexes:
+        # hasSelection() no crea un índice por cada celda seleccionada (pueden ser millones)
+        if not self.ui.tableView.selectionModel().hasSelection():
             QMessageBox.information(self, "Advertencia", "Selecciona uno o más clientes de la tabla para eliminarlos.")
             return
-        
-        unique_selected_rows = {index.row() for index in selected_indexes}
-        selected_client_names = ", ".join(self.model.index(row, 1).data() for row in unique_selected_rows)
-        num_selected_clients = len(unique_selected_rows)
+        # Los ids se leen en el hilo de la base de datos con el filtro y orden de la tabla: una selección
+        # muy grande incluye filas cuyas páginas ya no están en memoria (o que nunca se leyeron)
+        ranges = sorted((selection_range.top(), selection_range.bottom())
+                        for selection_range in self.ui.tableView.selectionModel().selection())
+        # Para el mensaje solo se usan los nombres de las primeras filas que están en memoria
+        names = {}
+        for first, last in ranges:
+            for position in range(first, min(last, first + DELETE_NAMES_SHOWN - 1) + 1):
+                row = self.model.loaded_row(position)
+                if row is not None:
+                    names[position] = row[1]
+        names = [names[position] for position in sorted(names)][:DELETE_NAMES_SHOWN]
+        self.model.select_ids(ranges, lambda ids_clients: self.confirm_delete(ids_clients, names),
+                            error_callback=lambda e: QMessageBox.warning(self, "Error al eliminar cliente(s)", str(e)))
+
+
+    def confirm_delete(self, ids_clients, names):
+        '''Pide confirmación y elimina los clientes seleccionados (ids leídos por delete_client)'''
+        if ids_clients is None:
+            QMessageBox.information(self, "Advertencia", "La tabla cambió mientras se leía la selección, vuelve a seleccionar los clientes que deseas eliminar.")
+            self.model.check_external_changes()
+            return
+        num_selected_clients = len(ids_clients)
+        if not num_selected_clients:
+            return
+        selected_client_names = ", ".join(names)
+        if len(names) < num_selected_clients:
+            selected_client_names += f" y {num_selected_clients - len(names)} más" if names else f"{num_selected_clients} cliente(s)"
 
         message_msg = (f"¿Estás seguro de que deseas eliminar al cliente: <b>{selected_client_names}</b>?"
                     if num_selected_clients == 1
@@ -470,21 +1097,21 @@ class MainWindow(QMainWindow):
                                         message=message_msg,
                                         yes_text="Eliminar",
                                         no_text="Cancelar"):
-            try:
-                ids_clients = [self.model.index(row, 0).data() for row in unique_selected_rows]
-                delete_client_connection(ids_clients, self.db.databaseName())
-                self.model.select()
-                # Actualizar el modelo de la tabla para reflejar los cambios
-                QMessageBox.information(self, "Cliente(s) eliminado(s)",
-                                        f"Cliente(s): '<b>{selected_client_names}</b>' eliminado(s) correctamente.")
-            except RuntimeError as e:
-                QMessageBox.warning(self, "Error al eliminar cliente(s)", str(e))
+            # El modelo quita las filas eliminadas con el aviso de cambio de connection_manager
+            self.worker.submit(delete_client_connection, ids_clients, self.database_path,
+                            description="Eliminando cliente(s)",
+                            callback=lambda deleted: QMessageBox.information(self, "Cliente(s) eliminado(s)",
+                                f"{deleted} cliente(s): '<b>{selected_client_names}</b>' eliminado(s) correctamente.<br><br>"
+                                "Puedes restaurarlos desde la papelera."),
+                            error_callback=lambda e: QMessageBox.warning(self, "Error al eliminar cliente(s)", str(e)))
 
 
     def reset_table(self):
         """Function usada para volver a cargar la tabla."""
-        if not self.db.databaseName():
+        if self.database_path is None:
             return
+        self.search_timer.stop()
+        self.ui.in_search_name.clear() # El texto de la búsqueda ya no se aplica a la tabla
         self.setup_model()  # Configurar el modelo
         self.setup_table()  # Configurar la tabla
         self.ui.lbl_table_order.setText("<b>Orden de la tabla:</b>  Añadido (\u2193)")
@@ -515,43 +1142,129 @@ class MainWindow(QMainWindow):
         self.animation_group.finished.connect(lambda: self.ui.lbl_table_filter.setText(""))
 
 
+    def live_search(self):
+        '''Busca mientras se escribe en in_search_name (sin mensajes ni limpiar el texto).
+        Cada búsqueda reemplaza a la anterior en el hilo de la base de datos: si la anterior
+        aún se está ejecutando se interrumpe y su resultado no se muestra.'''
+        if self.database_path is None:
+            return
+        search_name = self.ui.in_search_name.text()
+        client_filter = live_name_filter(search_name, LIVE_SEARCH_LIMIT)
+        if client_filter is None: # Texto borrado, se vuelve a mostrar la tabla completa
+            self.model.apply_filter(NO_FILTER)
+            self.model.select()
+            self.ui.lbl_table_filter.setText(" ")
+            return
+        self.model.apply_filter(client_filter)
+        self.model.select(lambda: self.live_search_finished(search_name))
+
+
+    def live_search_finished(self, search_name):
+        '''Muestra en la etiqueta del filtro cuántos clientes encontró la búsqueda mientras se escribe'''
+        if self.model.last_error is not None:
+            self.ui.lbl_table_filter.setText(f"<b>Error al buscar:</b> {self.model.last_error}")
+        elif self.model.rowCount() == 0:
+            self.ui.lbl_table_filter.setText(f"<b>Sin coincidencias:</b> {search_name} (Enter busca nombres parecidos)")
+        elif self.model.rowCount() >= LIVE_SEARCH_LIMIT:
+            self.ui.lbl_table_filter.setText(f"<b>Filtro de busqueda:</b> {search_name} "
+                                            f"(los {LIVE_SEARCH_LIMIT} más recientes, Enter muestra todos)")
+        else:
+            self.ui.lbl_table_filter.setText(f"<b>Filtro de busqueda:</b> {search_name} ({self.model.rowCount()})")
+
+
     def search(self, search_type):
         '''Función usada para buscar el nombre de un cliente'''
-        if not self.db.databaseName():
+        if self.database_path is None:
             QMessageBox.warning(self, "Advertencia", "Seleccione una base de datos antes de buscar un cliente.")
             return
-        
+        self.search_timer.stop() # La búsqueda completa reemplaza a la búsqueda mientras se escribe
         if search_type == "name":
             # Obtener el valor de búsqueda del nombre
             search_name = self.ui.in_search_name.text()
             if not search_name:
                 QMessageBox.information(self, "Advertencia", "Escriba un nombre para buscarlo.")
                 return
-            # Actualizar el modelo de la tabla con los resultados encontrados
-            self.model.setFilter(f"nombre LIKE '%{search_name}%'")
-            # Limpiar el QLineEdit y 
-            self.ui.in_search_name.clear()
+            client_filter = name_filter(search_name)
+            if client_filter is None:
+                QMessageBox.information(self, "Advertencia", "Escriba un nombre para buscarlo.")
+                return
+            # Actualizar el modelo de la tabla con los nombres que empiezan por el texto o que
+            # contienen todas sus palabras, primero los que empiezan por el texto y después por relevancia
+            self.model.apply_filter(client_filter)
+            # El texto se conserva para poder seguir escribiendo y acotar la búsqueda
             self.ui.lbl_table_filter.setText(f"<b>Filtro de busqueda:</b> {search_name}") # Establece el orden de busqueda en la etiqueta
 
         elif search_type == "date":
             search_date_str = self.ui.in_search_date.date().toString("dd/MM/yyyy")
-            self.model.setFilter(f"fecha = '{search_date_str}'")
+            self.model.apply_filter(date_filter(self.ui.in_search_date.date().toString(Qt.ISODate)))
             self.ui.lbl_table_filter.setText(f"<b>Filtro de busqueda: </b> {search_date_str}")
         else:
             QMessageBox.information(self, "Error", "Surgió un error inesperado al realizar la busqueda.")
-        
-        self.model.select()
+            return
+        # La búsqueda se ejecuta en el hilo de la base de datos, el resultado se revisa al terminar
+        search_text = search_name if search_type == "name" else search_date_str
+        self.model.select(lambda: self.search_finished(search_type, search_text))
+
+
+    def advanced_search(self):
+        '''Busca con los criterios combinados del diálogo de búsqueda avanzada'''
+        if self.database_path is None:
+            QMessageBox.warning(self, "Advertencia", "Seleccione una base de datos antes de buscar un cliente.")
+            return
+        if self.advanced_search_dialog.exec_() != QDialog.Accepted:
+            return
+        self.search_timer.stop()
+        self.ui.in_search_name.clear()
+        # Se conserva el orden actual de la tabla
+        self.model.apply_filter(self.advanced_search_dialog.client_filter())
+        description = self.advanced_search_dialog.description()
+        self.ui.lbl_table_filter.setText(f"<b>Búsqueda avanzada:</b> {description}")
+        self.model.select(lambda: self.search_finished("advanced", description))
+
+
+    def search_finished(self, search_type, search_text):
+        '''Revisa el resultado de la búsqueda cuando el modelo termina de cargarla'''
+        if self.model.last_error is not None:
+            QMessageBox.warning(self, "Error al buscar", str(self.model.last_error))
+            return
         # Verificar si hay coincidencias
-        if self.model.rowCount() == 0:
-            # Si no hay coincidencias, mostrar un mensaje en el QTableView
-            QMessageBox.information(self, "Sin coincidencias", f"No se encontraron coincidencias con la busqueda: '<b>{search_name if search_type == 'name' else search_date_str}<b/>'")
-            self.reset_table()
+        if self.model.rowCount() > 0:
+            return
+        if search_type == "name": # Antes de avisar se buscan nombres parecidos
+            self.show_similar_names(search_text)
+            return
+        self.show_no_matches(search_text)
 
 
+    def show_no_matches(self, search_text):
+        '''Avisa que la búsqueda no encontró clientes y vuelve a mostrar la tabla completa'''
+        QMessageBox.information(self, "Sin coincidencias", f"No se encontraron coincidencias con la busqueda: '<b>{search_text}<b/>'")
+        self.reset_table()
+
+
+    def show_similar_names(self, search_name):
+        '''Busca en el hilo de la base de datos los clientes con el nombre más parecido
+        al buscado (errores de escritura) y los muestra'''
+        self.worker.submit(fuzzy_search_clients, search_name, self.database_path,
+                        key="nombres_parecidos", description="Buscando nombres parecidos",
+                        callback=lambda similar: self.similar_names_found(search_name, similar),
+                        error_callback=lambda e: QMessageBox.warning(self, "Error al buscar", str(e)))
+
+
+    def similar_names_found(self, search_name, similar):
+        '''Muestra los nombres parecidos encontrados (o avisa que no hay coincidencias)'''
+        if not similar:
+            self.show_no_matches(search_name)
+            return
+        # Ordenados de mayor a menor parecido
+        self.model.apply_filter(ids_filter(client_id for client_id, _ in similar))
+        self.model.select()
+        self.ui.lbl_table_filter.setText(f"<b>Nombres parecidos a:</b> {search_name}")
+
 
     def sort_box(self, order_type, column_number=None):
         '''Ordena la tabla por columna seleccionada en el QComboBox'''
-        if not self.db.databaseName():
+        if self.database_path is None:
             return
         # Mapeo de las opciones del ComboBox a los índices de las columnas
         column_mapping = {
@@ -568,6 +1281,8 @@ class MainWindow(QMainWindow):
         order = self.ui.comboBox_order.currentText()
         # Obtener el índice de columna correspondiente a la opción seleccionada
         column_index = column_mapping.get(order, 0)  # Usa 0 como valor predeterminado
+        # El orden elegido reemplaza al orden por relevancia de la búsqueda
+        self.model.set_custom_order(None)
         # Verifica si el tipo de orden es "order" o "toggle"
         if order_type == "order":
             # Ordenar la tabla sin cambiar la dirección
@@ -591,6 +1306,19 @@ class MainWindow(QMainWindow):
         self.ui.lbl_table_order.setText("<b>Orden de la tabla:  </b>" + new_order + direction)
 
 
+    def closeEvent(self, event): # pylint: disable=invalid-name
+        '''Guarda los anchos de columna, detiene el hilo de la base de datos y cierra las conexiones
+        persistentes al cerrar la ventana'''
+        self.save_column_widths()
+        self.external_changes_timer.stop()
+        self.backup_timer.stop()
+        self.worker.stop()
+        self.background_canceled.set() # Un respaldo en curso se deshace en lugar de esperar a que termine
+        self.background_worker.stop()
+        connection_manager.close_all()
+        super().closeEvent(event)
+
+
     def hide_menu(self):
         '''Usado para ocultar o mostrar el widget lateral y actualizar el botón'''
         # Verifica si el widget está oculto o visible
@@ -638,7 +1366,7 @@ class EditDialog(QDialog):
         self.ui_edit.in_od_edit.setText(client_data[4])
         self.ui_edit.in_adede_edit.setText(client_data[5])
         self.ui_edit.in_observaciones_edit.setText(client_data[6])
-        self.ui_edit.in_fecha_edit.setDate(QDate.fromString(client_data[7], "dd/MM/yyyy"))
+        self.ui_edit.in_fecha_edit.setDate(QDate.fromString(client_data[7], Qt.ISODate))
         # Validador de enteros para el campo edad (Acepta solo numeros del 0 al 999)
         self.ui_edit.in_edad_edit.setValidator(QIntValidator(0, 999))
 
@@ -653,23 +1381,236 @@ class EditDialog(QDialog):
         od = self.ui_edit.in_od_edit.text().strip()
         adede = self.ui_edit.in_adede_edit.text().strip()
         observaciones = self.ui_edit.in_observaciones_edit.text().strip()
-        fecha = self.ui_edit.in_fecha_edit.date().toString("dd/MM/yyyy")
-        edad = edad.replace(",", "")
-        if not nombre:
-            QMessageBox.information(self, "Advertencia", "El nombre es obligatorio.")
+        fecha = self.ui_edit.in_fecha_edit.date().toString(Qt.ISODate)
+        try:
+            nombre, edad = validate_client(nombre, edad)
+        except ValueError as e:
+            QMessageBox.information(self, "Advertencia", str(e))
             return
-        if nombre and edad.isdigit():
-            edad = int(edad)
-        if edad and int(edad) < 0:
-            QMessageBox.information(self, "Advertencia", "La edad no puede ser un número negativo.")
+        updated_client = (nombre, edad, oi, od, adede, observaciones, fecha, self.id_cliente)
+        # Se guarda en el hilo de la base de datos; el botón se desactiva para no guardar dos veces
+        self.ui_edit.btn_guardar_datos.setEnabled(False)
+        self.ui_edit.btn_cancelar_datos.setEnabled(False)
+        self.main_window.worker.submit(edit_client_connection, updated_client, self.database_path,
+                                    description="Editando cliente",
+                                    callback=lambda row: self.data_saved(row, nombre),
+                                    error_callback=self.save_failed)
+
+
+    def data_saved(self, row, nombre):
+        '''Cierra el diálogo cuando el hilo de la base de datos guardó los cambios'''
+        if row is None:
+            QMessageBox.warning(self, "Error al editar cliente", "El cliente ya no existe, es posible que se haya eliminado desde otra computadora.")
+            self.reject()
             return
-        try:
-            updated_client = (nombre, edad, oi, od, adede, observaciones, fecha, self.id_cliente)
-            edit_client_connection(updated_client, self.database_path)
-            self.updated_name = nombre  # Guarda el nombre actualizado
-            self.accept()
-        except RuntimeError as e:
-            raise QMessageBox.warning(self, "Error al editar cliente", str(e)) from e
+        self.updated_name = nombre  # Guarda el nombre actualizado
+        self.accept()
+
+
+    def save_failed(self, error):
+        '''Muestra el error al guardar y permite volver a intentarlo'''
+        self.ui_edit.btn_guardar_datos.setEnabled(True)
+        self.ui_edit.btn_cancelar_datos.setEnabled(True)
+        QMessageBox.warning(self, "Error al editar cliente", str(error))
+
+
+class AdvancedSearchDialog(QDialog):
+    '''Diálogo de la búsqueda avanzada. Combina nombre, observaciones, rango de fechas y
+    rango de edades; los campos vacíos o sin marcar no se aplican.'''
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Búsqueda avanzada")
+        # Eliminar el botón de ayuda "?"
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.in_nombre = QLineEdit()
+        self.in_nombre.setPlaceholderText("Empieza con...")
+        self.in_observaciones = QLineEdit()
+        self.in_observaciones.setPlaceholderText("Contiene las palabras...")
+        self.in_fecha_desde = self.date_edit(QDate.currentDate().addMonths(-1))
+        self.in_fecha_hasta = self.date_edit(QDate.currentDate())
+        self.in_edad_min = QSpinBox()
+        self.in_edad_max = QSpinBox()
+        for spin_box in (self.in_edad_min, self.in_edad_max):
+            spin_box.setRange(0, 999) # Mismo rango que el campo de edad del formulario
+        self.in_edad_max.setValue(999)
+        layout = QFormLayout(self)
+        layout.addRow("Nombre:", self.in_nombre)
+        layout.addRow("Observaciones:", self.in_observaciones)
+        self.check_fecha_desde = self.add_optional_row(layout, "Fecha desde:", self.in_fecha_desde)
+        self.check_fecha_hasta = self.add_optional_row(layout, "Fecha hasta:", self.in_fecha_hasta)
+        self.check_edad_min = self.add_optional_row(layout, "Edad mínima:", self.in_edad_min)
+        self.check_edad_max = self.add_optional_row(layout, "Edad máxima:", self.in_edad_max)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.button(QDialogButtonBox.Ok).setText("Buscar")
+        buttons.button(QDialogButtonBox.Cancel).setText("Cancelar")
+        buttons.accepted.connect(self.accept_search)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    @staticmethod
+    def date_edit(date):
+        '''Selector de fecha con el mismo formato que la tabla'''
+        editor = QDateEdit(date)
+        editor.setDisplayFormat("dd/MM/yyyy")
+        editor.setCalendarPopup(True)
+        return editor
+
+    @staticmethod
+    def add_optional_row(layout, label, widget):
+        '''Agrega una fila con una casilla que activa el campo y devuelve la casilla'''
+        check = QCheckBox()
+        check.toggled.connect(widget.setEnabled)
+        widget.setEnabled(False)
+        row = QHBoxLayout()
+        row.addWidget(check)
+        row.addWidget(widget, 1)
+        layout.addRow(label, row)
+        return check
+
+    def values(self):
+        '''Criterios elegidos: (nombre, observaciones, fecha desde, fecha hasta, edad mínima, edad máxima).
+        Las fechas van en formato ISO y los criterios sin usar son None.'''
+        def checked(check, value):
+            return value if check.isChecked() else None
+        return (self.in_nombre.text().strip() or None,
+                self.in_observaciones.text().strip() or None,
+                checked(self.check_fecha_desde, self.in_fecha_desde.date().toString(Qt.ISODate)),
+                checked(self.check_fecha_hasta, self.in_fecha_hasta.date().toString(Qt.ISODate)),
+                checked(self.check_edad_min, self.in_edad_min.value()),
+                checked(self.check_edad_max, self.in_edad_max.value()))
+
+    def accept_search(self):
+        '''Revisa los criterios antes de cerrar el diálogo'''
+        nombre, observaciones, desde, hasta, edad_min, edad_max = self.values()
+        if all(value is None for value in self.values()):
+            QMessageBox.information(self, "Advertencia", "Escriba o marque al menos un criterio de búsqueda.")
+            return
+        if desde is not None and hasta is not None and desde > hasta:
+            QMessageBox.information(self, "Advertencia", "La fecha inicial no puede ser posterior a la fecha final.")
+            return
+        if edad_min is not None and edad_max is not None and edad_min > edad_max:
+            QMessageBox.information(self, "Advertencia", "La edad mínima no puede ser mayor que la edad máxima.")
+            return
+        if (nombre and name_prefix_filter(nombre) is None) or (observaciones and observaciones_filter(observaciones) is None):
+            QMessageBox.information(self, "Advertencia", "Escriba al menos una letra o número para buscar el texto.")
+            return
+        self.accept()
+
+    def client_filter(self):
+        '''Condición de búsqueda con todos los criterios elegidos'''
+        nombre, observaciones, desde, hasta, edad_min, edad_max = self.values()
+        return combine_filters(name_prefix_filter(nombre) if nombre else None,
+                            observaciones_filter(observaciones) if observaciones else None,
+                            date_range_filter(desde, hasta), age_range_filter(edad_min, edad_max))
+
+    def description(self):
+        '''Texto con los criterios elegidos para la etiqueta del filtro'''
+        nombre, observaciones, desde, hasta, edad_min, edad_max = self.values()
+        def date_text(fecha):
+            return QDate.fromString(fecha, Qt.ISODate).toString("dd/MM/yyyy")
+        parts = []
+        if nombre:
+            parts.append(f"nombre \"{nombre}...\"")
+        if observaciones:
+            parts.append(f"observaciones \"{observaciones}\"")
+        if desde and hasta:
+            parts.append(f"del {date_text(desde)} al {date_text(hasta)}")
+        elif desde or hasta:
+            parts.append(f"desde el {date_text(desde)}" if desde else f"hasta el {date_text(hasta)}")
+        if edad_min is not None and edad_max is not None:
+            parts.append(f"de {edad_min} a {edad_max} años")
+        elif edad_min is not None or edad_max is not None:
+            parts.append(f"{edad_min} años o más" if edad_min is not None else f"{edad_max} años o menos")
+        return ", ".join(parts)
+
+
+class TrashDialog(QDialog):
+    '''Clientes de la papelera (los eliminados más recientemente primero).
+    exec() devuelve QDialog.Accepted para restaurar los clientes elegidos o EMPTY para vaciar la papelera.'''
+    EMPTY = 2
+
+    def __init__(self, total, rows, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Papelera")
+        # Eliminar el botón de ayuda "?"
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.table_trash = QTableWidget(len(rows), 5)
+        self.table_trash.setHorizontalHeaderLabels(("ID", "Nombre", "Edad", "Fecha", "Eliminado"))
+        self.table_trash.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_trash.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_trash.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table_trash.verticalHeader().hide()
+        for row, (client_id, nombre, edad, fecha, eliminado) in enumerate(rows):
+            date = QDate.fromString(str(fecha), Qt.ISODate)
+            deleted = QDateTime.fromString(eliminado, "yyyy-MM-dd hh:mm:ss")
+            for column, value in enumerate((client_id, nombre, edad,
+                                            date.toString("dd/MM/yyyy") if date.isValid() else fecha,
+                                            deleted.toString("dd/MM/yyyy hh:mm"))):
+                self.table_trash.setItem(row, column, QTableWidgetItem("" if value is None else str(value)))
+        self.table_trash.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Close)
+        buttons.button(QDialogButtonBox.Ok).setText("Restaurar")
+        buttons.button(QDialogButtonBox.Ok).setEnabled(False)
+        buttons.button(QDialogButtonBox.Close).setText("Cerrar")
+        self.table_trash.itemSelectionChanged.connect(
+            lambda: buttons.button(QDialogButtonBox.Ok).setEnabled(bool(self.selected_ids())))
+        buttons.addButton("Vaciar papelera", QDialogButtonBox.ActionRole).clicked.connect(lambda: self.done(self.EMPTY))
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout = QVBoxLayout(self)
+        if not total:
+            message = "La papelera está vacía."
+        elif total > len(rows):
+            message = f"{total} cliente(s) eliminado(s), se muestran los {len(rows)} más recientes."
+        else:
+            message = f"{total} cliente(s) eliminado(s)."
+        layout.addWidget(QLabel(f"{message} Se eliminan definitivamente después de {TRASH_DAYS} días."))
+        layout.addWidget(self.table_trash)
+        layout.addWidget(buttons)
+        self.resize(620, 420)
+
+    def selected_ids(self):
+        '''Ids de los clientes elegidos'''
+        return [int(self.table_trash.item(index.row(), 0).text())
+                for index in self.table_trash.selectionModel().selectedRows()]
+
+
+class BackupDialog(QDialog):
+    '''Lista de respaldos de la base de datos abierta (el más reciente primero).
+    exec() devuelve QDialog.Accepted para restaurar el respaldo elegido o BACKUP_NOW para respaldar ahora.'''
+    BACKUP_NOW = 2
+
+    def __init__(self, backups, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Respaldos")
+        # Eliminar el botón de ayuda "?"
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.list_backups = QListWidget()
+        for backup_id, fecha, tamano, paginas_nuevas, tamano_pagina in backups:
+            date = QDateTime.fromString(fecha, Qt.ISODate).toString("dd/MM/yyyy hh:mm")
+            item = QListWidgetItem(f"{date}   {tamano / 1024 / 1024:.1f} MB   "
+                                f"({paginas_nuevas * tamano_pagina / 1024 / 1024:.1f} MB nuevos)")
+            item.setData(Qt.UserRole, (backup_id, fecha))
+            self.list_backups.addItem(item)
+        self.list_backups.setCurrentRow(0)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Close)
+        buttons.button(QDialogButtonBox.Ok).setText("Restaurar...")
+        buttons.button(QDialogButtonBox.Ok).setEnabled(bool(backups))
+        buttons.button(QDialogButtonBox.Close).setText("Cerrar")
+        buttons.addButton("Respaldar ahora", QDialogButtonBox.ActionRole).clicked.connect(
+            lambda: self.done(self.BACKUP_NOW))
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Sin respaldos todavía." if not backups else
+                                "Al restaurar se crea un archivo nuevo, la base de datos abierta no se modifica."))
+        layout.addWidget(self.list_backups)
+        layout.addWidget(buttons)
+        self.resize(460, 320)
+
+    def selected_backup(self):
+        '''(id, fecha) del respaldo elegido'''
+        return self.list_backups.currentItem().data(Qt.UserRole)
 
 
 # Código para iniciar la aplicación
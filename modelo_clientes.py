@@ -0,0 +1,773 @@
+'''
+Modelo de la tabla de clientes de la ventana principal.
+Lee y escribe con las conexiones sqlite3 de conexion.py (no abre una conexión propia de QtSql)
+y se actualiza con los cambios que avisa connection_manager en lugar de volver a consultar la tabla.
+Las filas se leen por páginas en el hilo de la base de datos (trabajador_bd.py) solo cuando la
+tabla las muestra, y solo se conservan en memoria las últimas MAX_CACHED_PAGES páginas usadas.
+Los resultados de los últimos filtros y órdenes se guardan en ResultCache para mostrarlos otra vez
+sin consultar la base de datos mientras esta no cambie.
+Los cambios hechos por otros programas (otra computadora con la misma base de datos) se buscan con
+check_external_changes() y se aplican igual que los propios, leyendo solo los clientes cambiados.
+'''
+import os
+import sys
+from collections import OrderedDict
+# pylint: disable=no-name-in-module (Linea añadida para eviatar un falso error dado por pylint en la importacion de modulos)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from conexion import (connection_manager, CLIENT_COLUMNS, CHANGE_COLUMNS, SORT_KEYS, CHANGE_INSERT, CHANGE_UPDATE, CHANGE_DELETE,
+                    CHANGE_RESET, validate_client, data_version_connection, count_clients_connection, select_clients_connection,
+                    select_clients_page_connection, get_clients_connection, edit_client_field_connection,
+                    snapshot_connection, change_version_connection, changes_since_connection, iter_clients_connection,
+                    select_client_ids_connection)
+
+# Títulos de las columnas en el mismo orden que CLIENT_COLUMNS
+CLIENT_HEADERS = ("ID", "Nombre", "Edad", "OI", "OD", "ADD", "Observs", "Fecha")
+PAGE_SIZE = 256 # Filas por página leída
+MAX_CACHED_PAGES = 64 # Páginas conservadas en memoria (las menos usadas se descartan y se vuelven a leer)
+RESULT_CACHE_ENTRIES = 16 # Resultados (filtro y orden) guardados en ResultCache
+RESULT_CACHE_ROWS = 50000 # Filas en total guardadas en ResultCache (se descartan los resultados menos usados)
+
+
+def sqlite_order(value):
+    '''Valor comparable en Python con el mismo orden que usa SQLite en ORDER BY:
+    primero NULL, después números, texto y al final datos binarios'''
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
+
+
+class ResultCache:
+    '''Resultados recientes del modelo de la menos a la más usada. Cada resultado es
+    (número de filas, páginas, inicios de página, versión de cambios) y se guarda con el PRAGMA data_version del
+    momento en que se leyó: si la base de datos cambió desde entonces ya no se usa.'''
+    def __init__(self, max_entries=RESULT_CACHE_ENTRIES, max_rows=RESULT_CACHE_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict() # {clave: (data_version, resultado, filas, bytes)}
+        self.hits = 0
+        self.lookups = 0
+
+    def take(self, key, data_version):
+        '''Saca y devuelve el resultado guardado con la clave (None si no existe o ya no es válido).
+        Los resultados de otra versión de la base de datos se descartan.'''
+        self.lookups += 1
+        for stale in [k for k, entry in self._entries.items() if entry[0] != data_version]:
+            del self._entries[stale]
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, data_version, result):
+        '''Guarda el resultado como el más usado y descarta los menos usados si se superan los límites'''
+        pages = result[1]
+        rows = sum(len(page) for page in pages.values())
+        if rows > self.max_rows:
+            return
+        self._entries[key] = (data_version, result, rows, self._estimate_bytes(pages, rows))
+        self._entries.move_to_end(key)
+        while (len(self._entries) > self.max_entries or
+            sum(entry[2] for entry in self._entries.values()) > self.max_rows):
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _estimate_bytes(pages, rows):
+        '''Memoria aproximada de las filas (se mide una muestra de filas)'''
+        sample = [row for page in list(pages.values())[:2] for row in page][:64]
+        if not sample:
+            return 0
+        size = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample)
+        return size * rows // len(sample)
+
+    def clear(self):
+        '''Descarta todos los resultados (los contadores de aciertos se conservan)'''
+        self._entries.clear()
+
+    def memory(self):
+        '''Memoria aproximada en bytes de los resultados guardados'''
+        return sum(entry[3] for entry in self._entries.values())
+
+    def hit_rate(self):
+        '''Porcentaje de consultas que se respondieron desde el caché'''
+        return 100 * self.hits / self.lookups if self.lookups else 0
+
+
+class ClientTableModel(QAbstractTableModel):
+    '''Modelo de solo una tabla (clientes) con filtro, orden y lectura por páginas.
+    El número de filas es el total del resultado (la barra de desplazamiento cubre toda la
+    tabla) y cada página se lee al mostrarse, saltando con el índice de la columna de orden
+    desde la página conocida más cercana (paginación por clave) en lugar de contar desde
+    el principio. Ordena los nombres sin importar acentos ni mayúsculas y permite un orden
+    propio para los resultados de búsqueda (en ese caso las páginas se leen con OFFSET).'''
+    cache_changed = pyqtSignal() # Cambió el contenido o los aciertos del caché de resultados
+    edit_failed = pyqtSignal(str) # No se pudo guardar un valor editado en la tabla (mensaje del error)
+
+    def __init__(self, worker, parent=None):
+        super().__init__(parent)
+        self.worker = worker # DatabaseWorker que ejecuta las lecturas
+        self.database_path = None
+        self.filter = None # Condición WHERE (con parámetros "?")
+        self.filter_parameters = ()
+        self.sort_column = 0
+        self.sort_order = Qt.DescendingOrder
+        self.custom_order = None # Cláusula ORDER BY propia (por ejemplo, por relevancia)
+        self.custom_order_parameters = ()
+        self.last_error = None # Último error de lectura o de edición en la tabla
+        self._count = 0 # Filas del resultado
+        # {página: filas} de la menos a la más usada. Cada fila tiene las columnas de
+        # CLIENT_COLUMNS y al final su valor de orden
+        self._pages = OrderedDict()
+        self._seeks = {} # {página: (incluida, valor de orden, id)} fila donde empieza cada página conocida
+        self._requested = {} # {página: clave de la petición} páginas que se están leyendo
+        self._failed = set() # Páginas que no se pudieron leer (no se reintentan hasta el siguiente select)
+        self._selecting = False # Hay un select() en curso
+        self._select_callback = None # Función que se llama al terminar el select() en curso
+        self._order = ("id", True) # (columna, descendente) del último select(); columna None con orden propio
+        self._read_page = self._page_reader()
+        self._generation = 0 # Aumenta con cada select() para descartar páginas de lecturas anteriores
+        self.cache = ResultCache()
+        self._cache_key = None # Clave del resultado mostrado (filtro y orden del último select())
+        self._data_version = None # PRAGMA data_version de cuando se leyó (None si no se puede guardar en caché)
+        self._change_version = None # Versión de TABLA_CAMBIOS que ya incluye el resultado mostrado
+        self._external_version = None # PRAGMA data_version de la última búsqueda de cambios externos
+        self._stale_pages = set() # Páginas leídas con cambios externos aún no aplicados (se vuelven a leer)
+        # Cambios avisados aún no aplicados, en orden: [(cambio, filas)]. Con filtro se pregunta en el hilo
+        # de la base de datos qué filas lo cumplen y los siguientes esperan para aplicarse en el mismo orden
+        self._changes = []
+        self.worker.data_changed.connect(self.database_changed)
+
+    def set_database(self, database_path):
+        '''Establece la base de datos leída por el modelo y quita el filtro y el orden propio'''
+        if database_path != self.database_path:
+            self.cache.clear()
+            self._data_version = None
+            self._external_version = None
+            self.cache_changed.emit()
+        self.database_path = database_path
+        self.filter = None
+        self.filter_parameters = ()
+        self.custom_order = None
+        self.custom_order_parameters = ()
+
+    def fieldIndex(self, name): # pylint: disable=invalid-name
+        '''Número de columna del campo indicado (-1 si no existe)'''
+        return CLIENT_COLUMNS.index(name) if name in CLIENT_COLUMNS else -1
+
+    def setFilter(self, where, parameters=()): # pylint: disable=invalid-name
+        '''Condición WHERE usada por select() (None muestra todos los clientes)'''
+        self.filter = where
+        self.filter_parameters = tuple(parameters)
+
+    def set_custom_order(self, clause, parameters=()):
+        '''Usa la cláusula ORDER BY indicada (con parámetros "?") en lugar del orden de setSort
+        (None vuelve al orden normal)'''
+        self.custom_order = clause
+        self.custom_order_parameters = tuple(parameters)
+
+    def apply_filter(self, client_filter):
+        '''Usa la condición y el orden propio de un ClientFilter de filtros.py'''
+        self.setFilter(client_filter.where, client_filter.parameters)
+        self.set_custom_order(client_filter.order_by, client_filter.order_parameters)
+
+    def setSort(self, column, order): # pylint: disable=invalid-name
+        '''Columna y dirección del orden usado por select()'''
+        self.sort_column = column
+        self.sort_order = order
+
+    def _sort_name(self):
+        '''Nombre de la columna de orden (el id si la columna no es válida)'''
+        return CLIENT_COLUMNS[self.sort_column] if 0 <= self.sort_column < len(CLIENT_COLUMNS) else "id"
+
+    def _model_row(self, row):
+        '''Convierte una fila de un aviso de cambio (columnas de CHANGE_COLUMNS) en una fila
+        del modelo (columnas de CLIENT_COLUMNS y al final su valor de orden)'''
+        sort_column = self._order[0]
+        value = row[CHANGE_COLUMNS.index(SORT_KEYS[sort_column])] if sort_column else None
+        return [*row[:len(CLIENT_COLUMNS)], value]
+
+    def _before(self, row, other):
+        '''True si la fila "row" va antes que "other" en el orden del último select()'''
+        key, other_key = (sqlite_order(row[-1]), row[0]), (sqlite_order(other[-1]), other[0])
+        return key > other_key if self._order[1] else key < other_key
+
+    def _cancel_requests(self):
+        '''Cancela las lecturas de páginas pendientes'''
+        for key in self._requested.values():
+            self.worker.cancel(key)
+        self._requested.clear()
+
+    def _page_reader(self):
+        '''Devuelve la función que lee una página con el filtro y orden actuales. Se ejecuta en
+        el hilo de la base de datos, por eso no consulta los atributos del modelo (que pueden
+        cambiar mientras tanto) sino los valores del momento del select().'''
+        path, where, parameters = self.database_path, self.filter, self.filter_parameters
+        custom_order, order_parameters = self.custom_order, self.custom_order_parameters
+        sort_name, descending = self._sort_name(), self.sort_order == Qt.DescendingOrder
+        def read_page(page, seek, offset):
+            if custom_order is not None:
+                rows = select_clients_connection(path, where, parameters, custom_order, PAGE_SIZE, page * PAGE_SIZE,
+                                                order_parameters)
+                return [(*row, None) for row in rows]
+            return select_clients_page_connection(path, where, parameters, sort_name, descending,
+                                                seek, PAGE_SIZE, offset)
+        return read_page
+
+    def iter_rows(self):
+        '''Generador de todas las filas del resultado con el filtro y orden actuales (por ejemplo,
+        para exportar la tabla). La consulta no empieza hasta pedir la primera fila, así el
+        generador se puede crear aquí y recorrer en el hilo de la base de datos.'''
+        return iter_clients_connection(self.database_path, self.filter, self.filter_parameters, self._sort_name(),
+                                    self.sort_order == Qt.DescendingOrder, self.custom_order,
+                                    self.custom_order_parameters)
+
+    def select_ids(self, ranges, callback, error_callback=None):
+        '''Lee en el hilo de la base de datos los ids de las filas en las posiciones "ranges"
+        [(primera, última)], aunque sus páginas ya no estén en memoria (por ejemplo, al eliminar
+        una selección muy grande). Llama "callback(ids)" en el orden de la tabla, o "callback(None)"
+        si otro programa cambió la tabla desde que se leyó y las posiciones ya no corresponden.'''
+        merged = [] # Sin posiciones repetidas (cada celda seleccionada puede traer su propio rango)
+        for first, last in sorted((first, last) for first, last in ranges if first <= last):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+            else:
+                merged.append((first, last))
+        ranges = merged
+        # Las filas en memoria deben seguir en la misma posición, así se comprueba que la
+        # tabla mostrada corresponde a la base de datos aunque haya cambios propios pendientes
+        known = {page * PAGE_SIZE + offset: row[0] for page, rows in self._pages.items()
+                for offset, row in enumerate(rows)
+                if any(first <= page * PAGE_SIZE + offset <= last for first, last in ranges)}
+        generation, version = self._generation, self._change_version
+        path, where, parameters = self.database_path, self.filter, self.filter_parameters
+        custom_order, order_parameters = self.custom_order, self.custom_order_parameters
+        sort_name, descending = self._sort_name(), self.sort_order == Qt.DescendingOrder
+        def read():
+            with snapshot_connection(path):
+                current = change_version_connection(path)
+                # Sin cambios de otros programas si todas las versiones posteriores son propias
+                covered = version
+                for first, last in sorted(connection_manager.own_changes(path, version)):
+                    if first > covered:
+                        break
+                    covered = max(covered, last)
+                if covered < current:
+                    return None
+                ids = select_client_ids_connection([(first, last - first + 1) for first, last in ranges], path,
+                                                where, parameters, sort_name, descending, custom_order,
+                                                order_parameters)
+            positions = [position for first, last in ranges for position in range(first, last + 1)]
+            if len(ids) != len(positions) or any(ids[index] != known.get(position, ids[index])
+                                                for index, position in enumerate(positions)):
+                return None
+            return ids
+        if not path or version is None or self._selecting:
+            callback(None)
+            return
+        self.worker.submit(read, description="Leyendo la selección",
+                        callback=lambda ids: callback(ids if generation == self._generation else None),
+                        error_callback=error_callback)
+
+    def _save_to_cache(self):
+        '''Guarda en el caché el resultado mostrado si está completo y no cambió desde que se leyó'''
+        if (self._cache_key is not None and self._data_version is not None and not self._selecting
+                and self.last_error is None):
+            self.cache.put(self._cache_key, self._data_version,
+                        (self._count, self._pages, self._seeks, self._change_version))
+        self._cache_key = None
+
+    def select(self, callback=None):
+        '''Vuelve a contar las filas y lee la primera página con el filtro y orden actuales.
+        Si el mismo filtro y orden están en el caché y la base de datos no cambió se muestran sin
+        consultarla; si no, la lectura termina después. "callback()" se llama cuando las filas ya
+        están en el modelo (si falla, el modelo queda vacío y el error en last_error).
+        Todas las consultas (también PRAGMA data_version) se hacen en el hilo de la base de datos.'''
+        self._save_to_cache()
+        self._generation += 1
+        self._stale_pages.clear()
+        self._changes.clear() # La nueva lectura ya incluye los cambios que faltaban por aplicar
+        self._cancel_requests()
+        self.last_error = None
+        if not self.database_path:
+            self._reset(0, [])
+            if callback is not None:
+                callback()
+            return
+        generation = self._generation
+        path, where, parameters = self.database_path, self.filter, self.filter_parameters
+        read_page = self._read_page = self._page_reader()
+        self._order = (None if self.custom_order is not None else self._sort_name(),
+                    self.sort_order == Qt.DescendingOrder)
+        self._cache_key = (path, where, parameters, self.custom_order, self.custom_order_parameters, *self._order)
+        self._selecting = True
+        self._select_callback = callback
+        def read_data_version():
+            # Se lee antes de la consulta: si otra conexión cambia la base de datos mientras
+            # tanto, el valor ya no coincidirá y este resultado no se usará desde el caché
+            try:
+                return data_version_connection(path)
+            except RuntimeError:
+                return None
+        def data_version_read(data_version):
+            if generation != self._generation:
+                return
+            self._data_version = data_version
+            cached = self.cache.take(self._cache_key, data_version) if data_version is not None else None
+            self.cache_changed.emit()
+            if cached is not None:
+                self._selecting = False
+                self._restore(*cached)
+                if callback is not None:
+                    callback()
+                return
+            self.worker.submit(load, key=("clientes", id(self)), description="Cargando clientes",
+                            callback=loaded, error_callback=failed)
+        def load():
+            # La versión de cambios corresponde exactamente a las filas leídas
+            with snapshot_connection(path):
+                return (change_version_connection(path), count_clients_connection(path, where, parameters),
+                        read_page(0, None, 0))
+        def loaded(result):
+            if generation == self._generation:
+                self._selecting = False
+                self._change_version = result[0]
+                self._reset(*result[1:])
+                if callback is not None:
+                    callback()
+        def failed(error):
+            if generation == self._generation:
+                self._selecting = False
+                self._change_version = None
+                self._reset(0, [])
+                self.last_error = error
+                if callback is not None:
+                    callback()
+        self.worker.submit(read_data_version, key=("clientes", id(self)), description="Cargando clientes",
+                        callback=data_version_read, error_callback=failed)
+
+    def _reset(self, count, first_page):
+        '''Reemplaza el resultado completo del modelo'''
+        self.beginResetModel()
+        self._count = count
+        # Se reemplazan (no se vacían) porque las anteriores pueden haber quedado en el caché
+        self._pages = OrderedDict()
+        self._seeks = {}
+        self._failed.clear()
+        if first_page:
+            self._store_page(0, [list(row) for row in first_page])
+        self.endResetModel()
+
+    def _restore(self, count, pages, seeks, change_version):
+        '''Muestra un resultado tomado del caché'''
+        self.beginResetModel()
+        self._change_version = change_version
+        self._count = count
+        self._pages = pages
+        self._seeks = seeks
+        self._failed.clear()
+        self.endResetModel()
+
+    def clear(self):
+        '''Deja el modelo vacío y sin base de datos'''
+        self._cache_key = None
+        self._change_version = None
+        self._generation += 1
+        self._cancel_requests()
+        self._changes.clear()
+        self._selecting = False
+        self.set_database(None)
+        self._reset(0, [])
+
+    def _store_page(self, page, rows):
+        '''Guarda la página como la más usada, anota dónde empiezan ella y la siguiente
+        y descarta las páginas menos usadas si se supera MAX_CACHED_PAGES'''
+        self._pages[page] = rows
+        self._pages.move_to_end(page)
+        if rows and self._order[0] is not None:
+            # Con un valor NULL no se puede saltar con el índice, esa página se lee con OFFSET
+            if rows[0][-1] is not None and page > 0:
+                self._seeks[page] = (True, rows[0][-1], rows[0][0])
+            if len(rows) == PAGE_SIZE and rows[-1][-1] is not None and page + 1 not in self._seeks:
+                self._seeks[page + 1] = (False, rows[-1][-1], rows[-1][0])
+        while len(self._pages) > MAX_CACHED_PAGES:
+            self._pages.popitem(last=False)
+
+    def _request_page(self, page, use_offset=False):
+        '''Pide al hilo de la base de datos la página indicada. Salta a la página conocida más
+        cercana anterior y cuenta solo las filas que faltan (ninguna si ya se conoce su inicio).'''
+        if page in self._requested or page in self._failed or self._selecting:
+            return
+        start = 0
+        if not use_offset and self._order[0] is not None:
+            start = max((known for known in self._seeks if known <= page), default=0)
+        seek = self._seeks.get(start) if start else None
+        offset = (page - start) * PAGE_SIZE
+        generation = self._generation
+        key = ("pagina", id(self), page)
+        self._requested[page] = key
+        path, read_page = self.database_path, self._read_page
+        def read():
+            with snapshot_connection(path):
+                return change_version_connection(path), read_page(page, seek, offset)
+        self.worker.submit(read, key=key, description="Cargando clientes",
+                        callback=lambda result: self._page_loaded(generation, page, *result, seek is not None),
+                        error_callback=lambda error: self._page_failed(generation, page, error))
+
+    def _page_loaded(self, generation, page, version, rows, used_seek):
+        '''Guarda la página leída y actualiza sus celdas en la tabla'''
+        if generation != self._generation:
+            return
+        self._requested.pop(page, None)
+        if version != self._change_version:
+            # La página ya tiene cambios posteriores al resultado mostrado (de otro programa o
+            # propios): se aplican primero los cambios externos y después se vuelve a leer
+            self._stale_pages.add(page)
+            self._external_version = None
+            self.check_external_changes()
+            return
+        expected = min(PAGE_SIZE, self._count - page * PAGE_SIZE)
+        if expected <= 0:
+            return
+        if used_seek and len(rows) < expected:
+            # La comparación por clave no incluye los valores NULL (al final en orden descendente)
+            self._request_page(page, use_offset=True)
+            return
+        self._store_page(page, [list(row) for row in rows[:expected]])
+        first = page * PAGE_SIZE
+        self.dataChanged.emit(self.index(first, 0), self.index(first + expected - 1, len(CLIENT_COLUMNS) - 1))
+
+    def _page_failed(self, generation, page, error):
+        '''Guarda el error de lectura de una página'''
+        if generation != self._generation:
+            return
+        self._requested.pop(page, None)
+        self._failed.add(page)
+        self.last_error = error
+
+    def _row(self, position):
+        '''Fila de la posición indicada o None si su página aún no se lee (se pide al hilo)'''
+        page, offset = divmod(position, PAGE_SIZE)
+        rows = self._pages.get(page)
+        if rows is None:
+            self._request_page(page)
+            return None
+        self._pages.move_to_end(page)
+        return rows[offset] if offset < len(rows) else None
+
+    def loaded_row(self, position):
+        '''Fila de la posición indicada si su página está en memoria (None si no, sin pedirla al hilo)'''
+        page, offset = divmod(position, PAGE_SIZE)
+        rows = self._pages.get(page)
+        return rows[offset] if rows is not None and offset < len(rows) else None
+
+    def loaded_rows(self, limit):
+        '''Primeras "limit" filas de las páginas en memoria (no pide páginas nuevas)'''
+        rows = []
+        for page in sorted(self._pages):
+            rows.extend(self._pages[page][:limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def rowCount(self, parent=QModelIndex()): # pylint: disable=invalid-name
+        '''Número total de filas del resultado'''
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QModelIndex()): # pylint: disable=invalid-name
+        '''Número de columnas de CLIENT_COLUMNS'''
+        return 0 if parent.isValid() else len(CLIENT_COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        '''Valor de la celda (vacía mientras se lee su página)'''
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        row = self._row(index.row())
+        return None if row is None else row[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole): # pylint: disable=invalid-name
+        '''Títulos de las columnas'''
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(CLIENT_HEADERS):
+            return CLIENT_HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        '''Todas las columnas se pueden editar en la tabla menos el id'''
+        flags = super().flags(index)
+        if index.isValid() and index.column() != self.fieldIndex("id"):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole): # pylint: disable=invalid-name
+        '''Guarda en la base de datos (en el hilo de la base de datos) el valor editado directamente
+        en la tabla. La fila se actualiza con el aviso de cambio de connection_manager; si no se
+        pudo guardar se emite edit_failed.'''
+        if not index.isValid() or role != Qt.EditRole or not self.flags(index) & Qt.ItemIsEditable:
+            return False
+        row = self._row(index.row())
+        if row is None:
+            return False
+        column = CLIENT_COLUMNS[index.column()]
+        try:
+            if column == "nombre":
+                value, _ = validate_client(value, None)
+            elif column == "edad":
+                _, value = validate_client(row[self.fieldIndex("nombre")], value)
+        except ValueError as e:
+            self.last_error = e
+            return False
+        def saved(edited):
+            if edited is None:
+                failed(RuntimeError("El cliente ya no existe, es posible que se haya eliminado desde otra computadora."))
+        def failed(error):
+            self.last_error = error
+            self.edit_failed.emit(str(error))
+        self.worker.submit(edit_client_field_connection, row[0], column, value, self.database_path,
+                        description="Guardando cambio", callback=saved, error_callback=failed)
+        return True
+
+    def _row_positions(self, ids):
+        '''{id: posición} de las filas en memoria con los ids indicados'''
+        ids = set(ids)
+        return {row[0]: page * PAGE_SIZE + offset for page, rows in self._pages.items()
+                for offset, row in enumerate(rows) if row[0] in ids}
+
+    def _splice(self, first_page, transform):
+        '''Aplica "transform(filas)" a las filas en memoria contiguas desde la página first_page
+        y las vuelve a dividir en páginas (las filas siguientes cambiaron de posición).
+        Se llama entre begin/end de insertar o quitar filas, con _count ya actualizado.'''
+        rows = []
+        page = first_page
+        while page in self._pages:
+            rows.extend(self._pages[page])
+            page += 1
+        rows = transform(rows)
+        for stale in [page for page in self._pages if page >= first_page]:
+            del self._pages[stale]
+        for stale in [page for page in self._seeks if page >= first_page]:
+            del self._seeks[stale]
+        self._failed.clear()
+        for start in range(0, len(rows), PAGE_SIZE):
+            chunk = rows[start:start + PAGE_SIZE]
+            first = first_page * PAGE_SIZE + start
+            # Una página incompleta solo es válida si es la última del resultado
+            if len(chunk) == PAGE_SIZE or first + len(chunk) == self._count:
+                self._store_page(first_page + start // PAGE_SIZE, chunk)
+
+    def _remove_positions(self, positions):
+        '''Quita las filas de las posiciones indicadas agrupando las consecutivas'''
+        positions = sorted(positions, reverse=True)
+        while positions:
+            last = first = positions.pop(0)
+            while positions and positions[0] == first - 1:
+                first = positions.pop(0)
+            page_offset = first // PAGE_SIZE * PAGE_SIZE
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self._count -= last - first + 1
+            self._splice(first // PAGE_SIZE,
+                        lambda rows, start=first - page_offset, end=last - page_offset: rows[:start] + rows[end + 1:])
+            self.endRemoveRows()
+
+    def _insert_rows(self, position, new_rows):
+        '''Inserta las filas nuevas en la posición indicada'''
+        page, offset = divmod(position, PAGE_SIZE)
+        self.beginInsertRows(QModelIndex(), position, position + len(new_rows) - 1)
+        self._count += len(new_rows)
+        self._splice(page, lambda rows: rows[:offset] + new_rows + rows[offset:])
+        self.endInsertRows()
+
+    def _position_for(self, row):
+        '''Posición que ocupa la fila en el orden actual según las páginas en memoria.
+        Devuelve (posición, exacta): si la fila cae entre páginas que no están en memoria la
+        posición es el inicio de ese hueco (sus filas se leerán de nuevo ya con el cambio).'''
+        previous = None # Última página en memoria que va antes de la fila
+        for page in sorted(self._pages):
+            rows = self._pages[page]
+            if not rows:
+                continue
+            if self._before(row, rows[0]) and (previous is None or previous != page - 1) and page > 0:
+                return (0 if previous is None else (previous + 1) * PAGE_SIZE), False
+            if not self._before(rows[-1], row):
+                low, high = 0, len(rows) # Búsqueda binaria de la primera fila que va después
+                while low < high:
+                    middle = (low + high) // 2
+                    if self._before(row, rows[middle]):
+                        high = middle
+                    else:
+                        low = middle + 1
+                return page * PAGE_SIZE + low, True
+            previous = page
+        if previous is not None and previous * PAGE_SIZE + len(self._pages[previous]) == self._count:
+            return self._count, True # Después de la última fila del resultado
+        if previous is None and self._count == 0:
+            return 0, True
+        return (0 if previous is None else (previous + 1) * PAGE_SIZE), False
+
+    def _apply_delete(self, rows):
+        '''Quita las filas eliminadas. Las que no están en memoria se quitan del hueco donde
+        estaban; con filtro o con orden propio no se sabe si estaban en el resultado y se vuelve a leer.'''
+        positions = self._row_positions(row[0] for row in rows)
+        self._remove_positions(positions.values())
+        missing = [self._model_row(row) for row in rows if row[0] not in positions]
+        if not missing:
+            return
+        if self.filter or self._order[0] is None:
+            self.select()
+            return
+        for row in missing:
+            position, exact = self._position_for(row)
+            if exact: # Debería haber estado en memoria, las páginas no coinciden con la tabla
+                self.select()
+                return
+            self._remove_positions([position])
+
+    def _apply_update(self, rows, matching):
+        '''Actualiza las filas editadas en su lugar. Si ya no cumplen el filtro (sus ids no están
+        en "matching") se quitan y si cambió su valor de orden se mueven a su nueva posición.'''
+        for change_row in rows:
+            row = self._model_row(change_row)
+            position = self._row_positions([row[0]]).get(row[0])
+            if position is None:
+                # Fuera de memoria su página se leerá ya editada, salvo que ahora caiga entre las filas en
+                # memoria. Con filtro no se sabe si antes lo cumplía (si cambió el número de filas)
+                if self.filter or (row[0] in matching and self._order[0] is not None and self._position_for(row)[1]):
+                    self.select()
+                    return
+                continue
+            if row[0] not in matching:
+                self._remove_positions([position])
+                continue
+            page, offset = divmod(position, PAGE_SIZE)
+            if self._order[0] is None or row[-1] == self._pages[page][offset][-1]:
+                self._pages[page][offset] = row
+                self.dataChanged.emit(self.index(position, 0), self.index(position, len(CLIENT_COLUMNS) - 1))
+                continue
+            self._remove_positions([position])
+            self._insert_rows(self._position_for(row)[0], [row])
+
+    def _apply_insert(self, rows, matching):
+        '''Inserta los clientes nuevos que cumplen el filtro (ids en "matching") en su posición del orden actual'''
+        new_rows = [self._model_row(row) for row in rows if row[0] in matching]
+        if not new_rows:
+            return
+        if self._order[0] is None: # La posición en un orden propio (relevancia) la decide la consulta
+            self.select()
+            return
+        for row in new_rows:
+            self._insert_rows(self._position_for(row)[0], [row])
+
+    def check_external_changes(self):
+        '''Busca los cambios hechos por otros programas en la base de datos abierta (se llama
+        periódicamente). PRAGMA data_version indica sin leer la tabla si otra conexión confirmó
+        cambios; solo entonces se leen los clientes cambiados después del resultado mostrado.
+        Todo se consulta en el hilo de la base de datos: con el perfil "seguro" el PRAGMA espera
+        a que otro programa termine de escribir y no debe detener la interfaz.'''
+        if not self.database_path or self._change_version is None or self._selecting:
+            return
+        generation, path = self._generation, self.database_path
+        external_version, change_version = self._external_version, self._change_version
+        def read():
+            data_version = data_version_connection(path)
+            if data_version == external_version:
+                return data_version, None
+            return data_version, changes_since_connection(change_version, path)
+        def loaded(result):
+            data_version, changes = result
+            if generation != self._generation:
+                return
+            self._external_version = data_version
+            if changes is not None:
+                self._merge_changes(generation, *changes)
+        def failed(error):
+            self._external_version = None # Se vuelve a intentar en la siguiente llamada
+            self.last_error = error
+        self.worker.submit(read, key=("cambios", id(self)), callback=loaded, error_callback=failed)
+
+    def _merge_changes(self, generation, version, changes):
+        '''Aplica los cambios externos leídos por check_external_changes()'''
+        if generation != self._generation: # Se volvió a leer la tabla, ya incluye los cambios
+            return
+        self._change_version = version
+        stale_pages, self._stale_pages = self._stale_pages, set()
+        if changes is None:
+            self.select()
+            return
+        previous = changes[CHANGE_DELETE] + changes[CHANGE_UPDATE]
+        if previous and self._order[0] != "id" and len(self._row_positions(row[0] for row in previous)) < len(previous):
+            # De los eliminados y editados fuera de memoria no se conoce el valor de orden que tenían,
+            # sin él no se sabe en qué hueco estaban (solo el id no cambia)
+            self.select()
+            return
+        database_path = os.path.abspath(self.database_path)
+        for change in (CHANGE_DELETE, CHANGE_UPDATE, CHANGE_INSERT):
+            if changes[change]:
+                self.database_changed(database_path, change, changes[change])
+                if generation != self._generation:
+                    return
+        # Las páginas se vuelven a leer después de aplicar los cambios (con filtro esperan la consulta)
+        self._changes.append((None, stale_pages))
+        if len(self._changes) == 1:
+            self._apply_changes()
+
+    def database_changed(self, database_path, change, rows):
+        '''Aplica al modelo los cambios avisados por connection_manager sin volver a leer la tabla.
+        Las filas llegan con el aviso, solo se consulta por id si hay filtro (para saber si lo cumplen),
+        así el costo de cada cambio no depende del tamaño de la tabla.'''
+        if not self.database_path or os.path.abspath(self.database_path) != database_path:
+            return
+        # Los resultados guardados ya no son válidos y el mostrado solo se actualiza en memoria
+        self.cache.clear()
+        self._data_version = None
+        self.cache_changed.emit()
+        if self._selecting: # La lectura en curso podría no incluir el cambio, se repite
+            self.select(self._select_callback)
+            return
+        self._changes.append((change, rows))
+        if len(self._changes) == 1: # Si no, se aplica cuando terminen los anteriores
+            self._apply_changes()
+
+    def _apply_changes(self):
+        '''Aplica en orden los cambios pendientes. Con filtro, las filas editadas o nuevas se consultan
+        por id en el hilo de la base de datos y los cambios siguientes esperan a que llegue el resultado.'''
+        while self._changes:
+            change, rows = self._changes[0]
+            if change in (CHANGE_UPDATE, CHANGE_INSERT) and self.filter:
+                self._request_matching(change, rows)
+                return
+            self._changes.pop(0)
+            if change is None: # Páginas con cambios externos que faltaba volver a leer
+                for page in rows:
+                    self._request_page(page)
+            elif change == CHANGE_DELETE:
+                self._apply_delete(rows)
+            elif change == CHANGE_UPDATE:
+                self._apply_update(rows, {row[0] for row in rows})
+            elif change == CHANGE_INSERT:
+                self._apply_insert(rows, {row[0] for row in rows})
+            elif change == CHANGE_RESET:
+                self.select()
+
+    def _request_matching(self, change, rows):
+        '''Pide al hilo de la base de datos los ids de las filas que cumplen el filtro actual
+        (por clave primaria) y aplica el cambio al llegar'''
+        generation = self._generation
+        def loaded(matching):
+            if generation != self._generation: # Se volvió a leer la tabla, ya incluye los cambios
+                return
+            self._changes.pop(0)
+            if change == CHANGE_UPDATE:
+                self._apply_update(rows, set(matching))
+            else:
+                self._apply_insert(rows, set(matching))
+            self._apply_changes()
+        def failed(error):
+            if generation != self._generation:
+                return
+            self.last_error = error
+            self.select()
+        self.worker.submit(get_clients_connection, [row[0] for row in rows], self.database_path,
+                        self.filter, self.filter_parameters, key=("coincidencias", id(self)),
+                        callback=loaded, error_callback=failed)
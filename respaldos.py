@@ -0,0 +1,225 @@
+'''
+Respaldos automáticos de la base de datos en un almacén deduplicado.
+Cada respaldo es una copia consistente de la base de datos (API de respaldo de SQLite) dividida en
+páginas; cada página se guarda una sola vez en el almacén (otra base de datos SQLite) con su hash
+como clave, así los respaldos siguientes solo agregan las páginas que cambiaron. Un respaldo guarda
+la lista de hashes de sus páginas y el SHA-256 del archivo completo, que se comprueban al restaurar.
+'''
+import os
+import uuid
+import zlib
+import sqlite3
+import hashlib
+import datetime
+
+from conexion import TABLA_CAMBIOS, connection_manager, copy_db_connection, change_version_connection
+
+TABLA_BLOQUES = "bloques" # {hash: página comprimida}
+TABLA_RESPALDOS = "respaldos"
+HASH_SIZE = 16 # Bytes del hash BLAKE2b de cada página (la lista de hashes es el índice del respaldo)
+COMPRESSION_LEVEL = 1 # Nivel de zlib de las páginas (el más rápido; el texto se reduce igual a menos de la mitad)
+BACKUP_INTERVAL = datetime.timedelta(hours=1) # Tiempo mínimo entre respaldos automáticos
+# Respaldos conservados: el más reciente de cada una de las últimas horas, días y semanas
+RETENTION = (("%Y-%m-%d %H", 24), ("%Y-%m-%d", 7), ("%G-%V", 4))
+READ_SIZE = 1 << 20 # Bytes leídos por vez del archivo del respaldo
+
+
+class _BackupCanceled(Exception):
+    '''Se lanza dentro de create_backup para deshacer el respaldo al cancelar'''
+
+
+def _open_store(store_path):
+    '''Conexión al almacén de respaldos del hilo actual (lo crea si no existe)'''
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    conn = connection_manager.get(store_path)
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {TABLA_BLOQUES} (
+                    hash BLOB PRIMARY KEY,
+                    datos BLOB NOT NULL
+                    ) WITHOUT ROWID''')
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {TABLA_RESPALDOS} (
+                    id INTEGER PRIMARY KEY,
+                    base_de_datos TEXT NOT NULL,
+                    fecha TEXT NOT NULL,
+                    version INTEGER,
+                    tamano INTEGER NOT NULL,
+                    tamano_pagina INTEGER NOT NULL,
+                    hash BLOB NOT NULL,
+                    paginas BLOB NOT NULL,
+                    paginas_nuevas INTEGER NOT NULL
+                    )''')
+    conn.execute(f'''CREATE INDEX IF NOT EXISTS idx_{TABLA_RESPALDOS}_base_de_datos
+                    ON {TABLA_RESPALDOS} (base_de_datos, fecha)''')
+    return conn
+
+
+def _page_hash(page):
+    '''Hash con el que se guarda la página en el almacén'''
+    return hashlib.blake2b(page, digest_size=HASH_SIZE).digest()
+
+
+def list_backups(store_path, database_path):
+    '''Respaldos de la base de datos del más reciente al más antiguo:
+    [(id, fecha, tamaño en bytes, páginas nuevas, tamaño de página)]'''
+    try:
+        conn = _open_store(store_path)
+        return conn.execute(f'''SELECT id, fecha, tamano, paginas_nuevas, tamano_pagina FROM {TABLA_RESPALDOS}
+                            WHERE base_de_datos = ? ORDER BY fecha DESC, id DESC''',
+                            (os.path.abspath(database_path),)).fetchall()
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error operativo al leer los respaldos: {e}") from e
+
+
+def backup_due(store_path, database_path, now=None, interval=BACKUP_INTERVAL):
+    '''True si el último respaldo de la base de datos tiene más de "interval" (o no hay ninguno)'''
+    backups = list_backups(store_path, database_path)
+    now = now or datetime.datetime.now()
+    return not backups or now - datetime.datetime.fromisoformat(backups[0][1]) >= interval
+
+
+def scheduled_backup(store_path, database_path, now=None, interval=BACKUP_INTERVAL, progress=None):
+    '''Respaldo automático: solo respalda si ya pasó "interval" desde el último respaldo.
+    Devuelve el id del respaldo o None si no se respaldó ("progress" igual que en create_backup).'''
+    if not backup_due(store_path, database_path, now, interval):
+        return None
+    return create_backup(store_path, database_path, now, progress)
+
+
+def create_backup(store_path, database_path, now=None, progress=None):
+    '''Respalda la base de datos en el almacén y aplica la política de conservación.
+    "progress(hechas, total)" se llama durante la copia (igual que en copy_db_connection) y después
+    al guardar las páginas en el almacén; si devuelve False se cancela sin guardar nada.
+    Devuelve el id del respaldo, o None si la base de datos no cambió desde el último respaldo
+    o si se canceló.'''
+    database_path = os.path.abspath(database_path)
+    now = now or datetime.datetime.now()
+    temporary_path = os.path.join(os.path.dirname(os.path.abspath(store_path)), f".respaldo-{uuid.uuid4().hex}.db")
+    try:
+        store = _open_store(store_path)
+        last = store.execute(f'''SELECT version FROM {TABLA_RESPALDOS} WHERE base_de_datos = ?
+                            ORDER BY fecha DESC, id DESC LIMIT 1''', (database_path,)).fetchone()
+        if last is not None and last[0] == change_version_connection(database_path):
+            return None # Sin clientes agregados, editados ni eliminados desde el último respaldo
+        # Copia consistente aunque se esté escribiendo (en modo WAL no detiene a los demás)
+        if not copy_db_connection(database_path, temporary_path, progress):
+            return None
+        copy = sqlite3.connect(temporary_path)
+        try:
+            page_size = copy.execute("PRAGMA page_size").fetchone()[0]
+            version = copy.execute(f"SELECT coalesce(max(version), 0) FROM {TABLA_CAMBIOS}").fetchone()[0]
+        finally:
+            copy.close()
+        with store: # Si se cancela se deshace todo lo guardado
+            store.execute("BEGIN IMMEDIATE")
+            backup_id = _store_pages(store, database_path, temporary_path, page_size, version, now, progress)
+            _apply_retention(store, database_path)
+        return backup_id
+    except _BackupCanceled:
+        return None
+    except (sqlite3.Error, OSError) as e:
+        raise RuntimeError(f"Error operativo al respaldar la base de datos: {e}") from e
+    finally:
+        for file_path in (temporary_path, f"{temporary_path}-wal", f"{temporary_path}-shm"):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+def _store_pages(store, database_path, file_path, page_size, version, now, progress=None):
+    '''Guarda las páginas del archivo que aún no están en el almacén y registra el respaldo.
+    "progress(páginas leídas, total)" se llama después de cada bloque de READ_SIZE bytes.'''
+    hashes = []
+    new_pages = 0
+    file_hash = hashlib.sha256()
+    total = os.path.getsize(file_path) // page_size
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(READ_SIZE - READ_SIZE % page_size), b""):
+            if progress is not None and progress(len(hashes), total) is False:
+                raise _BackupCanceled()
+            file_hash.update(block)
+            for start in range(0, len(block), page_size):
+                page = block[start:start + page_size]
+                page_hash = _page_hash(page)
+                hashes.append(page_hash)
+                # Sin contador de referencias: actualizarlo reescribiría cada fila con su página
+                if store.execute(f"SELECT 1 FROM {TABLA_BLOQUES} WHERE hash = ?", (page_hash,)).fetchone() is None:
+                    store.execute(f"INSERT INTO {TABLA_BLOQUES} (hash, datos) VALUES (?, ?)",
+                                (page_hash, zlib.compress(page, COMPRESSION_LEVEL)))
+                    new_pages += 1
+    return store.execute(f'''INSERT INTO {TABLA_RESPALDOS}
+                        (base_de_datos, fecha, version, tamano, tamano_pagina, hash, paginas, paginas_nuevas)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                        (database_path, now.isoformat(timespec="seconds"), version, os.path.getsize(file_path),
+                        page_size, file_hash.digest(), b"".join(hashes), new_pages)).lastrowid
+
+
+def backups_to_keep(dates, retention=RETENTION):
+    '''Índices de las fechas (datetime) que se conservan: el respaldo más reciente de cada uno de
+    los últimos periodos (horas, días y semanas) que tienen respaldos, y siempre el último.
+    Con fechas iguales se toma como más reciente la de mayor índice.'''
+    order = sorted(range(len(dates)), key=lambda index: (dates[index], index), reverse=True)
+    keep = set(order[:1])
+    for period_format, count in retention:
+        periods = set()
+        for index in order:
+            period = dates[index].strftime(period_format)
+            if period not in periods:
+                if len(periods) == count:
+                    break
+                periods.add(period)
+                keep.add(index)
+    return keep
+
+
+def _split_hashes(pages):
+    '''Hashes de las páginas de un respaldo (guardados uno tras otro en un solo BLOB)'''
+    return {pages[start:start + HASH_SIZE] for start in range(0, len(pages), HASH_SIZE)}
+
+
+def _apply_retention(store, database_path):
+    '''Elimina los respaldos que ya no se conservan y las páginas que ningún otro respaldo usa'''
+    backups = store.execute(f"SELECT id, fecha FROM {TABLA_RESPALDOS} WHERE base_de_datos = ? ORDER BY id",
+                            (database_path,)).fetchall()
+    keep = backups_to_keep([datetime.datetime.fromisoformat(fecha) for _, fecha in backups])
+    removed = set()
+    for index, (backup_id, _) in enumerate(backups):
+        if index not in keep:
+            pages = store.execute(f"SELECT paginas FROM {TABLA_RESPALDOS} WHERE id = ?", (backup_id,)).fetchone()[0]
+            removed |= _split_hashes(pages)
+            store.execute(f"DELETE FROM {TABLA_RESPALDOS} WHERE id = ?", (backup_id,))
+    if not removed:
+        return
+    # Las páginas se comparten también entre bases de datos (una copia guarda las mismas páginas)
+    for (pages,) in store.execute(f"SELECT paginas FROM {TABLA_RESPALDOS}").fetchall():
+        removed -= _split_hashes(pages)
+    store.executemany(f"DELETE FROM {TABLA_BLOQUES} WHERE hash = ?", ((page_hash,) for page_hash in removed))
+
+
+def restore_backup(store_path, backup_id, destination_path):
+    '''Escribe el respaldo indicado en "destination_path". Cada página se comprueba con su hash
+    y el archivo completo con su SHA-256 antes de reemplazar el destino; si algo no coincide se
+    lanza RuntimeError y el destino no se modifica.'''
+    temporary_path = f"{destination_path}.restaurando"
+    try:
+        store = _open_store(store_path)
+        row = store.execute(f"SELECT hash, paginas, tamano FROM {TABLA_RESPALDOS} WHERE id = ?",
+                            (backup_id,)).fetchone()
+        if row is None:
+            raise RuntimeError("El respaldo no existe.")
+        expected_hash, pages, size = row
+        file_hash = hashlib.sha256()
+        with open(temporary_path, "wb") as file:
+            for start in range(0, len(pages), HASH_SIZE):
+                page_hash = pages[start:start + HASH_SIZE]
+                data = store.execute(f"SELECT datos FROM {TABLA_BLOQUES} WHERE hash = ?", (page_hash,)).fetchone()
+                page = zlib.decompress(data[0]) if data is not None else None
+                if page is None or _page_hash(page) != page_hash:
+                    raise RuntimeError(f"La página {start // HASH_SIZE + 1} del respaldo está dañada o no existe.")
+                file_hash.update(page)
+                file.write(page)
+        if file_hash.digest() != expected_hash or os.path.getsize(temporary_path) != size:
+            raise RuntimeError("El respaldo restaurado no coincide con la suma de verificación del original.")
+        os.replace(temporary_path, destination_path)
+    except (sqlite3.Error, OSError, zlib.error) as e:
+        raise RuntimeError(f"Error operativo al restaurar el respaldo: {e}") from e
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
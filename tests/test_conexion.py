@@ -0,0 +1,50 @@
+'''
+Pruebas de las migraciones de conexion.py contra una base de datos temporal.
+
+Uso: python -m unittest discover tests
+'''
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import connection_manager, create_db_connection, invalid_dates_connection
+
+
+class IsoDatesMigrationTest(unittest.TestCase):
+    '''Conversión de las fechas dd/MM/yyyy de las bases de datos anteriores'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory() # pylint: disable=consider-using-with
+        self.database_path = os.path.join(self.folder.name, "clientes.db")
+        # Base de datos con solo la primera migración (la tabla clientes original)
+        conn = sqlite3.connect(self.database_path)
+        conn.execute('''CREATE TABLE clientes (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL,
+                        edad INTEGER, oi TEXT, od TEXT, adede TEXT, observaciones TEXT, fecha DATE)''')
+        conn.executemany("INSERT INTO clientes (nombre, fecha) VALUES (?, ?)",
+                        [("A", "05/03/2023"), ("B", "1/2/2023"), ("C", "15/7/2022"), ("D", "3/11/2021"),
+                        ("E", "2024-01-09"), ("F", ""), ("G", "ayer")])
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        connection_manager.close_all()
+        self.folder.cleanup()
+
+    def test_day_and_month_with_one_or_two_digits(self):
+        create_db_connection(self.database_path)
+        rows = connection_manager.get(self.database_path).execute("SELECT fecha FROM clientes ORDER BY id")
+        self.assertEqual([row[0] for row in rows],
+                        ["2023-03-05", "2023-02-01", "2022-07-15", "2021-11-03", "2024-01-09", "", "ayer"])
+
+    def test_counts_dates_not_converted(self):
+        create_db_connection(self.database_path)
+        self.assertEqual(invalid_dates_connection(self.database_path), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+'''
+Pruebas de las condiciones de búsqueda de filtros.py contra una base de datos temporal.
+
+Uso: python -m unittest discover tests
+'''
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from conexion import connection_manager, create_db_connection, add_client_connection, select_clients_connection
+from filtros import age_range_filter, date_range_filter, combine_filters
+
+
+class AgeRangeFilterTest(unittest.TestCase):
+    '''Rangos de edad con clientes sin edad (guardada como texto vacío)'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory() # pylint: disable=consider-using-with
+        self.database_path = os.path.join(self.folder.name, "clientes.db")
+        create_db_connection(self.database_path)
+        for cliente in (("Mayor", 70, "", "", "", "", "2024-03-10"),
+                        ("Sin edad", "", "", "", "", "", "2024-03-11"),
+                        ("Joven", 20, "", "", "", "", "2024-03-12"),
+                        ("Mayor en abril", 65, "", "", "", "", "2024-04-02")):
+            add_client_connection(cliente, self.database_path)
+
+    def tearDown(self):
+        connection_manager.close_all()
+        self.folder.cleanup()
+
+    def names(self, client_filter):
+        '''Nombres de los clientes que cumplen el filtro'''
+        rows = select_clients_connection(self.database_path, client_filter.where, client_filter.parameters,
+                                        "ORDER BY id")
+        return [row[1] for row in rows]
+
+    def test_minimum_excludes_empty_age(self):
+        self.assertEqual(self.names(age_range_filter(60, None)), ["Mayor", "Mayor en abril"])
+
+    def test_maximum_excludes_empty_age(self):
+        self.assertEqual(self.names(age_range_filter(None, 30)), ["Joven"])
+
+    def test_range_excludes_empty_age(self):
+        self.assertEqual(self.names(age_range_filter(0, 200)), ["Mayor", "Joven", "Mayor en abril"])
+
+    def test_dates_and_minimum_age(self):
+        client_filter = combine_filters(date_range_filter("2024-03-01", "2024-03-31"), age_range_filter(60, None))
+        self.assertEqual(self.names(client_filter), ["Mayor"])
+
+
+if __name__ == "__main__":
+    unittest.main()
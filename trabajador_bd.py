@@ -0,0 +1,136 @@
+'''
+Hilo de trabajo de la base de datos. Las consultas de la ventana se ejecutan en este hilo
+para que la interfaz no se congele con bases de datos grandes o en carpetas de red, y
+los resultados vuelven al hilo de la interfaz por medio de señales de Qt.
+'''
+import queue
+import threading
+from itertools import count
+# pylint: disable=no-name-in-module (Linea añadida para eviatar un falso error dado por pylint en la importacion de modulos)
+from PyQt5.QtCore import QThread, pyqtSignal
+from conexion import connection_manager
+
+
+class DatabaseWorker(QThread):
+    '''Ejecuta en orden las peticiones enviadas con submit(). Las peticiones con la misma
+    clave ("key") se reemplazan entre sí: al enviar una nueva se cancelan las anteriores
+    que aún no empiezan, se interrumpe la que se está ejecutando y solo se entrega el
+    resultado de la última (por ejemplo, al cambiar el orden antes de que termine el anterior).'''
+    result_ready = pyqtSignal(int, bool, object) # (id de la petición, sin error, resultado o excepción)
+    busy_changed = pyqtSignal(str) # Descripción de la tarea en curso ("" si el hilo está libre)
+    data_changed = pyqtSignal(str, str, list) # Aviso de cambio de connection_manager (ruta, cambio, filas)
+    failed = pyqtSignal(str) # Error de una petición sin función de error propia
+    progress_changed = pyqtSignal(int, int) # Avance de la petición en curso (hechos, total), ver report_progress
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = queue.Queue()
+        self._ids = count(1)
+        self._lock = threading.Condition()
+        self._callbacks = {} # {id: (callback, error_callback, clave)} (solo se usa en el hilo de la interfaz)
+        self._latest = {} # {clave: id de la última petición con esa clave}
+        self._canceled = set() # Ids de peticiones canceladas antes de empezar
+        self._running = None # (id, clave) de la petición en ejecución
+        self._pending = 0 # Peticiones en la cola o en ejecución
+        self._thread_id = None
+        # Los cambios pueden ocurrir en este hilo o en el de la interfaz, la señal los lleva
+        # siempre al hilo de la interfaz
+        connection_manager.add_listener(self._database_changed)
+        self.result_ready.connect(self._deliver)
+
+    def _database_changed(self, database_path, change, rows):
+        '''Reenvía los avisos de connection_manager como señal de Qt'''
+        self.data_changed.emit(database_path, change, rows)
+
+    def report_progress(self, done, total):
+        '''Avisa el avance de una petición larga desde este hilo al de la interfaz'''
+        self.progress_changed.emit(done, total)
+
+    def submit(self, function, *args, key=None, description="", callback=None, error_callback=None):
+        '''Ejecuta function(*args) en el hilo de la base de datos. "callback(resultado)" o
+        "error_callback(excepción)" se llaman después en el hilo de la interfaz.
+        Devuelve el id de la petición.'''
+        request_id = next(self._ids)
+        self._callbacks[request_id] = (callback, error_callback, key)
+        if key is not None:
+            self.cancel(key)
+            self._latest[key] = request_id
+        with self._lock:
+            self._pending += 1
+        self._queue.put((request_id, key, description, function, args))
+        return request_id
+
+    def cancel(self, key=None):
+        '''Cancela las peticiones con la clave indicada (o todas las que tienen clave si es None)
+        que aún no empiezan e interrumpe la que se está ejecutando. Las peticiones sin clave
+        (escrituras) nunca se cancelan.'''
+        keys = list(self._latest) if key is None else [key]
+        with self._lock:
+            for request_key in keys:
+                request_id = self._latest.pop(request_key, None)
+                if request_id is None:
+                    continue
+                self._canceled.add(request_id)
+                if self._running == (request_id, request_key):
+                    connection_manager.interrupt(self._thread_id)
+
+    def wait_idle(self):
+        '''Espera (bloqueando el hilo de la interfaz) a que termine la petición en curso y las de la cola.
+        Se usa antes de cerrar la conexión de una base de datos.'''
+        with self._lock:
+            self._lock.wait_for(lambda: self._pending == 0)
+
+    def is_idle(self):
+        '''True si no hay peticiones en la cola ni en ejecución'''
+        with self._lock:
+            return self._pending == 0
+
+    def stop(self):
+        '''Cancela las lecturas pendientes, termina las escrituras y detiene el hilo'''
+        self.cancel()
+        self._queue.put(None)
+        self.wait()
+        connection_manager.remove_listener(self._database_changed)
+
+    def run(self):
+        '''Ciclo del hilo: toma las peticiones de la cola y las ejecuta en orden'''
+        self._thread_id = threading.get_ident()
+        while True:
+            request = self._queue.get()
+            if request is None:
+                break
+            request_id, key, description, function, args = request
+            with self._lock:
+                canceled = request_id in self._canceled
+                self._canceled.discard(request_id)
+                self._running = None if canceled else (request_id, key)
+            result, ok = None, False
+            if not canceled:
+                self.busy_changed.emit(description)
+                try:
+                    result, ok = function(*args), True
+                except Exception as e: # pylint: disable=broad-except (el error se entrega al hilo de la interfaz)
+                    result = e
+            self.result_ready.emit(request_id, ok, result) # Las canceladas solo liberan su callback
+            with self._lock:
+                self._running = None
+                self._pending -= 1
+                idle = self._pending == 0
+                self._lock.notify_all()
+            if idle:
+                self.busy_changed.emit("")
+
+    def _deliver(self, request_id, ok, result):
+        '''Entrega el resultado en el hilo de la interfaz (se descarta si la petición fue reemplazada)'''
+        callback, error_callback, key = self._callbacks.pop(request_id, (None, None, None))
+        if key is not None:
+            if self._latest.get(key) != request_id:
+                return
+            del self._latest[key]
+        if ok:
+            if callback is not None:
+                callback(result)
+        elif error_callback is not None:
+            error_callback(result)
+        else:
+            self.failed.emit(str(result))